@@ -0,0 +1,330 @@
+"""End-to-end API benchmark: synthetic corpus -> upload -> analyze-batch -> aggregate, list and search.
+
+    python -m benchmarks.bench_api --rows 1k --out bench_1k.json
+    python -m benchmarks.bench_api --rows 100k --stub-latency-ms 200 --baseline bench_100k_before.json
+
+Requests go through the ASGI app in-process (no server or network) against a
+scratch SQLite database, with LLM_PROVIDER=stub standing in for OpenAI /
+Hugging Face: deterministic analyses after STUB_LLM_LATENCY_MS per request.
+The corpus comes from benchmarks.corpus, so equal arguments replay the same
+workload. The JSON report holds p50/p95 latency, throughput and peak RSS per
+scenario; --baseline prints the change of every number against an older report.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+SEARCH_QUERIES = ["onboarding", "podcast", '"real-time dashboards"', "audit*", "spreadsheet errors", "pilot"]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+def _max_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+class RssSampler:
+    """Highest resident set size seen since the last reset, sampled in a background thread"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = _rss_mb()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+
+    def start(self):
+        self._thread.start()
+
+    def reset(self) -> float:
+        peak, self.peak = self.peak, _rss_mb() or 0.0
+        return peak
+
+    def stop(self):
+        self._stop.set()
+
+def latency_summary(latencies_ms: List[float], elapsed: float, **extra) -> Dict:
+    return {
+        "requests": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 0.50), 2) if latencies_ms else None,
+        "p95_ms": round(percentile(latencies_ms, 0.95), 2) if latencies_ms else None,
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else None,
+        "requests_per_second": round(len(latencies_ms) / elapsed, 2) if elapsed > 0 else None,
+        "seconds": round(elapsed, 3),
+        **extra,
+    }
+
+async def timed(request: Awaitable):
+    start = time.perf_counter()
+    response = await request
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    response.raise_for_status()
+    return elapsed_ms, response
+
+async def run_concurrent(count: int, concurrency: int, request: Callable[[int], Awaitable]) -> Dict:
+    """count requests, at most concurrency in flight; request(index) builds each one"""
+    latencies: List[float] = []
+    indexes = iter(range(count))
+
+    async def worker():
+        for index in indexes:
+            elapsed_ms, _ = await timed(request(index))
+            latencies.append(elapsed_ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_summary(latencies, time.perf_counter() - start)
+
+async def bench_upload(client, args) -> Dict:
+    from benchmarks.corpus import generate_records, write_records
+
+    latencies = []
+    rows = 0
+    uploaded = 0
+    elapsed = 0.0
+    styles = args.styles
+    per_style = -(-args.rows // len(styles))
+    for style_index, style in enumerate(styles):
+        style_rows = min(per_style, args.rows - style_index * per_style)
+        records = generate_records(style_rows, args.seed, style)
+        while True:
+            # Files are built before the clock starts; only the request is timed
+            buffer = io.StringIO()
+            written = write_records(buffer, islice(records, args.upload_rows), "csv")
+            if not written:
+                break
+            payload = buffer.getvalue().encode("utf-8")
+            elapsed_ms, response = await timed(client.post(
+                "/api/upload/csv", params={"source": style},
+                files={"file": (f"{style}.csv", payload, "text/csv")}
+            ))
+            latencies.append(elapsed_ms)
+            elapsed += elapsed_ms / 1000
+            rows += written
+            uploaded += response.json()["uploaded"]
+    summary = latency_summary(latencies, elapsed, rows=rows, uploaded=uploaded)
+    summary["rows_per_second"] = round(rows / elapsed, 1) if elapsed > 0 else None
+    return summary
+
+async def bench_analyze(client, args) -> Dict:
+    from database import SessionLocal, AnalysisJobItem
+
+    start = time.perf_counter()
+    _, response = await timed(client.post("/api/analysis/analyze-batch", params={"limit": args.analyze}))
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/api/analysis/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "cancelled"):
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    try:
+        # Each item's latency is that of the analyzer call for its chunk of the job
+        latencies = [row[0] for row in db.query(AnalysisJobItem.latency_ms).filter(
+            AnalysisJobItem.job_id == job_id, AnalysisJobItem.latency_ms.isnot(None)
+        ).all()]
+    finally:
+        db.close()
+    processed = (job.get("analyzed") or 0) + (job.get("failed") or 0)
+    return {
+        "conversations": processed,
+        "analyzed": job.get("analyzed"),
+        "failed": job.get("failed"),
+        "seconds": round(elapsed, 3),
+        "conversations_per_second": round(processed / elapsed, 2) if elapsed > 0 else None,
+        "item_p50_ms": round(percentile(latencies, 0.50), 2) if latencies else None,
+        "item_p95_ms": round(percentile(latencies, 0.95), 2) if latencies else None,
+    }
+
+async def bench_aggregate(client, args) -> Dict:
+    variants = [{}] + [{"source": style} for style in args.styles]
+    return await run_concurrent(
+        args.requests, args.concurrency,
+        lambda index: client.get("/api/results/aggregate/summary", params=variants[index % len(variants)])
+    )
+
+async def bench_list(client, args) -> Dict:
+    """Walk every page of the results list, as an export would"""
+    latencies = []
+    rows = 0
+    cursor = None
+    start = time.perf_counter()
+    while True:
+        params = {"limit": args.page_size, **({"cursor": cursor} if cursor else {})}
+        elapsed_ms, response = await timed(client.get("/api/results/list/all", params=params))
+        latencies.append(elapsed_ms)
+        page = response.json()
+        rows += len(page["results"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    elapsed = time.perf_counter() - start
+    summary = latency_summary(latencies, elapsed, rows=rows)
+    summary["rows_per_second"] = round(rows / elapsed, 1) if elapsed > 0 else None
+    return summary
+
+async def bench_search(client, args) -> Dict:
+    variants = [{"q": query} for query in SEARCH_QUERIES]
+    variants += [{"q": query, "source": style} for query in SEARCH_QUERIES[:2] for style in args.styles]
+    return await run_concurrent(
+        args.requests, args.concurrency,
+        lambda index: client.get("/api/search", params=variants[index % len(variants)])
+    )
+
+SCENARIOS = {
+    "upload": bench_upload,
+    "analyze": bench_analyze,
+    "aggregate": bench_aggregate,
+    "list": bench_list,
+    "search": bench_search,
+}
+
+async def run_suite(args) -> Dict:
+    import httpx
+    # Imported here so the scratch database and stub provider settings are read from the environment
+    from main import app
+
+    sampler = RssSampler()
+    sampler.start()
+    scenarios = {}
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in args.scenarios:
+                sampler.reset()
+                print(f"Running {name}...", file=sys.stderr)
+                scenarios[name] = await SCENARIOS[name](client, args)
+                scenarios[name]["peak_rss_mb"] = round(max(sampler.reset(), _rss_mb() or 0.0), 1)
+    finally:
+        await app.router.shutdown()
+        sampler.stop()
+    return scenarios
+
+def _git_version() -> Dict:
+    def git(*command):
+        return subprocess.run(["git", *command], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "."))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+def compare(baseline: Dict, report: Dict) -> List[str]:
+    """One line per numeric result present in both reports: old -> new (change)"""
+    lines = []
+    for scenario, results in report["scenarios"].items():
+        old_results = baseline.get("scenarios", {}).get(scenario, {})
+        for key, value in results.items():
+            old = old_results.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+            lines.append(f"{scenario}.{key}: {old} -> {value} ({change})")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1k", help="Conversations to upload, or 1k / 100k / 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--styles", default="gong,salesforce", help="Corpus styles, one upload source each")
+    parser.add_argument("--upload-rows", type=int, default=10000, help="Rows per uploaded file")
+    parser.add_argument("--analyze", type=int, default=1000, help="Conversations in the analyze-batch job")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0, help="Latency of each stub LLM request")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per read scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight in read scenarios")
+    parser.add_argument("--page-size", type=int, default=100, help="Results per page in the list scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Scenarios to run, in order")
+    parser.add_argument("--no-response-cache", action="store_true", help="Measure reads without the response cache")
+    parser.add_argument("--workdir", help="Directory for the scratch database and caches (default: a new temp dir)")
+    parser.add_argument("--out", help="Also write the report to this file")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    args = parser.parse_args()
+    args.styles = [style.strip() for style in args.styles.split(",") if style.strip()]
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_api_")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "LLM_PROVIDER": "stub",
+        "STUB_LLM_LATENCY_MS": str(args.stub_latency_ms),
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, "analysis_cache.db"),
+        "INSIGHT_INDEX_DIR": os.path.join(workdir, "insight_index"),
+        "ANALYZER_PRELOAD": "false",
+        "RESPONSE_CACHE_ENABLED": "false" if args.no_response_cache else "true",
+    })
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    # Hashing embeddings: no model download, same clusters on every run
+    os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+    # Only now: the corpus shares the stub provider's module, which reads its settings on import
+    from benchmarks.corpus import SIZES, STYLES
+    args.rows = SIZES.get(args.rows.lower()) or int(args.rows)
+    unknown = [style for style in args.styles if style not in STYLES]
+    if unknown:
+        parser.error(f"Unknown style(s): {', '.join(unknown)}")
+
+    # The app's own log lines go to stderr so stdout is just the report
+    with redirect_stdout(sys.stderr):
+        scenarios = asyncio.run(run_suite(args))
+    report = {
+        "benchmark": "api",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "version": _git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "rows": args.rows, "seed": args.seed, "styles": args.styles, "upload_rows": args.upload_rows,
+            "analyze": args.analyze, "stub_latency_ms": args.stub_latency_ms, "requests": args.requests,
+            "concurrency": args.concurrency, "page_size": args.page_size,
+            "response_cache": not args.no_response_cache, "workdir": workdir,
+        },
+        "scenarios": scenarios,
+        "peak_rss_mb": round(_max_rss_mb(), 1),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for line in compare(baseline, report):
+            print(line, file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Parallel uploads plus analysis saves against a scratch SQLite database, per engine profile.
+
+    python -m benchmarks.bench_db_contention --uploaders 4 --savers 4
+
+"default" reproduces the engine settings before engine_config.py (rollback
+journal, synchronous=FULL, 5s busy timeout, small page cache); "tuned" uses
+the engine_config.py defaults. Each profile runs in its own process and database.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+PROFILES = {
+    "default": {
+        "SQLITE_JOURNAL_MODE": "delete",
+        "SQLITE_SYNCHRONOUS": "full",
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+    },
+    "tuned": {},
+}
+
+ANALYSIS = {
+    "pain_points": [{"point": "manual data entry", "severity": "high"}, {"point": "no visibility", "severity": "medium"}],
+    "media_consumption": [{"name": "Manufacturing Happy Hour", "type": "podcast"}],
+    "compelling_points": [{"point": "no-code apps", "context": "operators build their own apps"}],
+    "summary": "Customer tracks production on paper and wants shop floor visibility.",
+    "confidence_score": 0.85,
+}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+def run_profile(args):
+    # Imported here so DATABASE_URL and the profile's settings are read from this process's environment
+    from sqlalchemy.exc import OperationalError
+    from database import SessionLocal, Conversation, engine, init_db
+    from engine_config import engine_status
+    from services.analysis_store import save_analysis
+    from services.ingest import IngestStats, ingest_csv
+
+    init_db()
+    body = "Customer: our operators still track production on paper. " * 10
+    seed = SessionLocal()
+    try:
+        seed.add_all([
+            Conversation(conversation_id=f"seed_{index}", source="bench", transcript=body)
+            for index in range(args.savers * args.saves)
+        ])
+        seed.commit()
+        conversation_ids = [row[0] for row in seed.query(Conversation.id).order_by(Conversation.id).all()]
+    finally:
+        seed.close()
+
+    errors = {"locked": 0, "other": 0}
+    save_latencies, upload_latencies = [], []
+    lock = threading.Lock()
+
+    def record_error(e):
+        with lock:
+            errors["locked" if "locked" in str(e) else "other"] += 1
+
+    def uploader(worker):
+        lines = ["conversation_id,transcript,date,participants,industry,job_title"]
+        for index in range(args.rows):
+            lines.append(f'up_{worker}_{index},"{body}",2024-01-{index % 28 + 1:02d},"Sales Rep, Customer",Automotive,Plant Manager')
+        payload = "\n".join(lines).encode("utf-8")
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            ingest_csv(db, io.BytesIO(payload), "bench", IngestStats())
+            with lock:
+                upload_latencies.append(time.perf_counter() - start)
+        except OperationalError as e:
+            record_error(e)
+        finally:
+            db.close()
+
+    def saver(worker):
+        for conversation_id in conversation_ids[worker::args.savers]:
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                conversation = db.query(Conversation).filter(Conversation.id == conversation_id).one()
+                save_analysis(db, conversation, ANALYSIS)
+                db.commit()
+                with lock:
+                    save_latencies.append(time.perf_counter() - start)
+            except OperationalError as e:
+                db.rollback()
+                record_error(e)
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=uploader, args=(index,)) for index in range(args.uploaders)]
+    threads += [threading.Thread(target=saver, args=(index,)) for index in range(args.savers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(len(upload_latencies) * args.rows / elapsed),
+        "saves_per_second": round(len(save_latencies) / elapsed, 1),
+        "save_p50_ms": round(statistics.median(save_latencies) * 1000, 1) if save_latencies else None,
+        "save_p95_ms": round(percentile(save_latencies, 0.95) * 1000, 1) if save_latencies else None,
+        "locked_errors": errors["locked"],
+        "other_errors": errors["other"],
+        "pragmas": engine_status(engine).get("pragmas"),
+    }))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite write contention benchmark")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--uploaders", type=int, default=4, help="threads each uploading one CSV")
+    parser.add_argument("--rows", type=int, default=20000, help="rows per uploaded CSV")
+    parser.add_argument("--savers", type=int, default=4, help="threads saving analyses, one commit each")
+    parser.add_argument("--saves", type=int, default=250, help="analyses saved per saver thread")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_profile(args)
+        sys.exit(0)
+
+    print(f"{args.uploaders} uploaders x {args.rows} rows, {args.savers} savers x {args.saves} analyses")
+    print(f"{'profile':>8} {'seconds':>8} {'rows/s':>9} {'saves/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'locked':>7}")
+    for profile in args.profiles:
+        workdir = tempfile.mkdtemp(prefix="bench_db_contention_")
+        env = dict(
+            os.environ,
+            **PROFILES[profile],
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            INSIGHT_CLUSTERING_ENABLED="false",
+            INSIGHT_INDEX_DIR=os.path.join(workdir, "insight_index"),
+        )
+        command = [sys.executable, "-m", "benchmarks.bench_db_contention", "--worker",
+                   "--uploaders", str(args.uploaders), "--rows", str(args.rows),
+                   "--savers", str(args.savers), "--saves", str(args.saves)]
+        output = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+        if output.returncode != 0 or not lines:
+            print(f"{profile:>8} failed: {output.stderr.strip().splitlines()[-1:] or output.returncode}")
+            continue
+        report = json.loads(lines[-1])
+        print(f"{profile:>8} {report['seconds']:>8.2f} {report['rows_per_second']:>9,} "
+              f"{report['saves_per_second']:>8.1f} {report['save_p50_ms'] or 0:>8.1f} "
+              f"{report['save_p95_ms'] or 0:>8.1f} {report['locked_errors']:>7}")
@@ -0,0 +1,39 @@
+"""Conversations/sec of the Hugging Face provider at different micro-batch sizes.
+
+    LLM_PROVIDER=huggingface python -m benchmarks.bench_hf_batching --batch-sizes 1 4 8 16
+
+HUGGINGFACE_MAX_NEW_TOKENS bounds decode length (and run time) for a quicker comparison.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import services.analyzer
+from services.analyzer import ConversationAnalyzer
+
+SAMPLE_DATA = Path(__file__).resolve().parents[2] / "sample_data.csv"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hugging Face batched generation benchmark")
+    parser.add_argument("--model", default=None, help="defaults to HUGGINGFACE_MODEL")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--data", default=str(SAMPLE_DATA))
+    args = parser.parse_args()
+
+    transcripts = pd.read_csv(args.data)["transcript"].astype(str).tolist()
+    # Every batch size must generate, not read the previous run's analyses back
+    services.analyzer.analysis_cache = None
+    analyzer = ConversationAnalyzer(provider="huggingface", model_name=args.model)
+    # One throwaway call so lazy initialization is not billed to the first batch size
+    analyzer.analyze(transcripts[0])
+
+    print(f"{len(transcripts)} conversations from {args.data} on {analyzer.model_name}")
+    print(f"{'batch size':>10} {'seconds':>10} {'conv/s':>10}")
+    for batch_size in args.batch_sizes:
+        analyzer.llm.batch_size = batch_size
+        start = time.perf_counter()
+        analyzer.analyze_batch(transcripts)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>10} {elapsed:>10.2f} {len(transcripts) / elapsed:>10.2f}")
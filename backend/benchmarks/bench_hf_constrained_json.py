@@ -0,0 +1,50 @@
+"""Tokens generated, JSON validity and speed with and without schema-constrained decoding.
+
+    LLM_PROVIDER=huggingface python -m benchmarks.bench_hf_constrained_json
+
+Unconstrained generation runs until max_new_tokens unless the model emits EOS
+itself; constrained generation stops at the closing brace.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from services.analyzer import ConversationAnalyzer
+
+SAMPLE_DATA = Path(__file__).resolve().parents[2] / "sample_data.csv"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Constrained JSON decoding benchmark")
+    parser.add_argument("--model", default=None, help="defaults to HUGGINGFACE_MODEL")
+    parser.add_argument("--data", default=str(SAMPLE_DATA))
+    parser.add_argument("--limit", type=int, default=None, help="only the first N conversations")
+    args = parser.parse_args()
+
+    transcripts = pd.read_csv(args.data)["transcript"].astype(str).tolist()[:args.limit]
+    analyzer = ConversationAnalyzer(provider="huggingface", model_name=args.model)
+    llm = analyzer.llm
+    if not hasattr(llm, "json_automaton"):
+        from services.json_constraint import ANALYSIS_SCHEMA, SchemaAutomaton, get_vocabulary
+        llm.json_automaton = SchemaAutomaton(ANALYSIS_SCHEMA)
+        llm.json_vocabulary = get_vocabulary(llm.pipeline.tokenizer)
+
+    print(f"{len(transcripts)} conversations from {args.data} on {analyzer.model_name}, "
+          f"max_new_tokens={llm.max_new_tokens}")
+    print(f"{'constrained':>11} {'tokens/conv':>12} {'valid JSON':>11} {'seconds':>9} {'conv/s':>8}")
+    for constrained in (False, True):
+        llm.constrained_json = constrained
+        llm.generation_stats = {"generations": 0, "generated_tokens": 0}
+        start = time.perf_counter()
+        # Straight to the provider: no analysis cache, no chunk merging
+        results = llm.run_batch(transcripts)
+        elapsed = time.perf_counter() - start
+        valid = sum(1 for result in results if isinstance(result, dict))
+        tokens = llm.generation_stats["generated_tokens"] / max(1, llm.generation_stats["generations"])
+        print(f"{'yes' if constrained else 'no':>11} {tokens:>12.1f} {valid / len(results):>10.0%} "
+              f"{elapsed:>9.2f} {len(results) / elapsed:>8.2f}")
+        if constrained:
+            sample = next((result for result in results if isinstance(result, dict)), None)
+            print(f"sample: {json.dumps(sample)[:300]}")
@@ -0,0 +1,65 @@
+"""Prefill vs decode time per conversation, with and without the prompt prefix KV cache.
+
+    LLM_PROVIDER=huggingface python -m benchmarks.bench_hf_prefix_cache --new-tokens 32
+
+Prefill is timed as a one-token generation; decode is the rest of a generation
+of exactly --new-tokens tokens (greedy, batch size 1).
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import pandas as pd
+import torch
+
+from services.analyzer import ConversationAnalyzer
+
+SAMPLE_DATA = Path(__file__).resolve().parents[2] / "sample_data.csv"
+
+def timed_generate(llm, ids, new_tokens: int, use_prefix_cache: bool) -> float:
+    model = llm.pipeline.model
+    past = llm.prefix_past_key_values(1) if use_prefix_cache else None
+    start = time.perf_counter()
+    with torch.inference_mode():
+        model.generate(
+            input_ids=torch.tensor([ids], device=model.device),
+            attention_mask=torch.ones(1, len(ids), dtype=torch.long, device=model.device),
+            past_key_values=past,
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=llm.pipeline.tokenizer.pad_token_id,
+        )
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hugging Face prompt prefix cache benchmark")
+    parser.add_argument("--model", default=None, help="defaults to HUGGINGFACE_MODEL")
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--data", default=str(SAMPLE_DATA))
+    args = parser.parse_args()
+
+    transcripts = pd.read_csv(args.data)["transcript"].astype(str).tolist()
+    analyzer = ConversationAnalyzer(provider="huggingface", model_name=args.model)
+    llm = analyzer.llm
+    prompts = llm.tokenize_prompts(transcripts)
+    # Builds the prefix cache and warms up kernels outside the measurements
+    timed_generate(llm, prompts[0], 2, True)
+    timed_generate(llm, prompts[0], 2, False)
+
+    print(f"{len(transcripts)} conversations from {args.data} on {analyzer.model_name}")
+    print(f"prompt prefix: {len(llm.prefix_ids)} tokens, "
+          f"mean prompt: {statistics.mean(len(ids) for ids in prompts):.0f} tokens")
+    print(f"{'prefix cache':>12} {'prefill ms':>12} {'decode ms':>12} {'total ms':>12}")
+    for use_prefix_cache in (False, True):
+        prefill, decode = [], []
+        for ids in prompts:
+            first = timed_generate(llm, ids, 1, use_prefix_cache)
+            total = timed_generate(llm, ids, args.new_tokens, use_prefix_cache)
+            prefill.append(first)
+            decode.append(max(0.0, total - first))
+        mean_prefill = statistics.mean(prefill) * 1000
+        mean_decode = statistics.mean(decode) * 1000
+        print(f"{'on' if use_prefix_cache else 'off':>12} {mean_prefill:>12.1f} {mean_decode:>12.1f} "
+              f"{mean_prefill + mean_decode:>12.1f}")
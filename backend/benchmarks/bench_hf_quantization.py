@@ -0,0 +1,79 @@
+"""Load time, memory, decode speed and JSON validity of the Hugging Face provider per CPU quantization mode.
+
+    LLM_PROVIDER=huggingface python -m benchmarks.bench_hf_quantization --modes none bf16 dynamic
+
+Each mode runs in its own process so resident memory and thread settings are
+not shared between runs. Set TORCH_NUM_THREADS to compare at a fixed core count.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+SAMPLE_DATA = Path(__file__).resolve().parents[2] / "sample_data.csv"
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+def run_mode(args):
+    import services.analyzer
+    from services.analyzer import ConversationAnalyzer
+
+    transcripts = pd.read_csv(args.data)["transcript"].astype(str).tolist()[:args.limit]
+    services.analyzer.analysis_cache = None
+    start = time.perf_counter()
+    analyzer = ConversationAnalyzer(provider="huggingface", model_name=args.model)
+    load_seconds = time.perf_counter() - start
+    if hasattr(analyzer.llm, "constrained_json"):
+        analyzer.llm.constrained_json = args.constrained
+
+    start = time.perf_counter()
+    results = analyzer.llm.run_batch(transcripts)
+    elapsed = time.perf_counter() - start
+    valid = sum(1 for result in results if isinstance(result, dict))
+    report = dict(analyzer.inference_report)
+    report.update({
+        "load_seconds": round(load_seconds, 2),
+        "valid_json": valid / len(results),
+        "conversations_per_second": round(len(results) / elapsed, 2),
+    })
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hugging Face CPU quantization benchmark")
+    parser.add_argument("--model", default=None, help="defaults to HUGGINGFACE_MODEL")
+    parser.add_argument("--modes", nargs="+", default=["none", "bf16", "dynamic"])
+    parser.add_argument("--data", default=str(SAMPLE_DATA))
+    parser.add_argument("--limit", type=int, default=None, help="only the first N conversations")
+    parser.add_argument("--constrained", action="store_true", help="keep schema-constrained decoding on")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_mode(args)
+        sys.exit(0)
+
+    print(f"{args.model or os.getenv('HUGGINGFACE_MODEL', 'default model')} on {args.data}, "
+          f"constrained JSON {'on' if args.constrained else 'off'}")
+    print(f"{'mode':>8} {'load s':>8} {'RSS MB':>8} {'tokens/s':>9} {'valid JSON':>11} {'conv/s':>8}")
+    for mode in args.modes:
+        command = [sys.executable, "-m", "benchmarks.bench_hf_quantization", "--worker", "--data", args.data]
+        if args.model:
+            command += ["--model", args.model]
+        if args.limit:
+            command += ["--limit", str(args.limit)]
+        if args.constrained:
+            command.append("--constrained")
+        env = dict(os.environ, LLM_PROVIDER="huggingface", HUGGINGFACE_QUANTIZATION=mode)
+        output = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+        if output.returncode != 0 or not lines:
+            print(f"{mode:>8} failed: {output.stderr.strip().splitlines()[-1:] or output.returncode}")
+            continue
+        report = json.loads(lines[-1])
+        print(f"{mode:>8} {report['load_seconds']:>8.2f} {report['rss_mb'] or 0:>8.1f} "
+              f"{report['tokens_per_second'] or 0:>9.2f} {report['valid_json']:>10.0%} "
+              f"{report['conversations_per_second']:>8.2f}")
@@ -0,0 +1,57 @@
+"""Upload ingestion throughput (rows/sec) into a scratch SQLite database.
+
+    python -m benchmarks.bench_ingest --rows 200000 [--no-search]
+
+Rows are modeled on sample_data.csv (transcript plus date/participants/industry/job_title
+metadata). The database is set up as the API sets it up, full-text search index included,
+and transcripts go to the store TRANSCRIPT_STORE selects. pandas is imported before the
+clock starts: the API pays for that once per process, on its first CSV upload. Larger
+UPLOAD_BATCH_SIZE values mean fewer commits and index statements.
+
+The target is 100k rows/sec; see the README for the numbers measured and the gap.
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CSV ingestion benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--transcript-chars", type=int, default=200)
+    parser.add_argument("--no-search", action="store_true", help="leave out the full-text search index")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_ingest_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    # Imported after DATABASE_URL is set so the engine points at the scratch database
+    import pandas  # noqa: F401
+    from database import SessionLocal, engine, init_db
+    from services.ingest import IngestStats, ingest_csv, UPLOAD_BATCH_SIZE
+    from services.search import ensure_search_index
+    from services.transcript_store import status as transcript_store_status
+
+    init_db()
+    search = not args.no_search and ensure_search_index(engine)
+    body = ("Customer: our operators still track production on paper. " * 20)[:args.transcript_chars]
+    lines = ["conversation_id,transcript,date,participants,industry,job_title"]
+    for index in range(args.rows):
+        lines.append(f'bench_{index},"{body}",2024-01-{index % 28 + 1:02d},"Sales Rep, Customer",Automotive,Plant Manager')
+    payload = "\n".join(lines).encode("utf-8")
+
+    db = SessionLocal()
+    try:
+        stats = IngestStats()
+        start = time.perf_counter()
+        ingest_csv(db, io.BytesIO(payload), "bench", stats)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+
+    store = transcript_store_status(engine.dialect.name)["store"]
+    print(f"{stats.uploaded} rows ({len(payload) / 1e6:.1f} MB) in {elapsed:.2f}s: "
+          f"{stats.uploaded / elapsed:,.0f} rows/sec (UPLOAD_BATCH_SIZE={UPLOAD_BATCH_SIZE}, "
+          f"transcripts={store}, search={'on' if search else 'off'})")
+    print(f"scratch database: {workdir}")
@@ -0,0 +1,37 @@
+"""Throughput of the async OpenAI path against the stub server.
+
+    python -m benchmarks.stub_openai_server --port 8010 &
+    LLM_PROVIDER=openai OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8010/v1 \\
+        python -m benchmarks.bench_openai_concurrency --count 500
+"""
+import argparse
+import time
+
+import httpx
+
+from services.analyzer import ConversationAnalyzer
+
+TRANSCRIPT = (
+    "Sales Rep: What is slowing your operators down? Customer: Paper travelers and manual "
+    "data entry. Conversation {index} mentions the Manufacturing Today podcast."
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async OpenAI throughput benchmark")
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args()
+
+    analyzer = ConversationAnalyzer(provider="openai")
+    transcripts = [TRANSCRIPT.format(index=index) for index in range(args.count)]
+
+    start = time.perf_counter()
+    results = analyzer.analyze_batch(transcripts)
+    elapsed = time.perf_counter() - start
+
+    failures = sum(1 for result in results if result["confidence_score"] == 0.0)
+    print(f"{args.count} conversations in {elapsed:.2f}s ({args.count / elapsed:.1f} conv/s), {failures} failed")
+    base_url = str(analyzer.llm.backend.client.base_url).rstrip("/")
+    if base_url.endswith("/v1"):
+        stats = httpx.get(base_url[:-3] + "/stats").json()
+        print(f"stub: {stats['requests']} requests, max {stats['max_in_flight']} in flight, "
+              f"{stats['errors_injected']} injected 429s")
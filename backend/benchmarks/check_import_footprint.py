@@ -0,0 +1,162 @@
+"""Check that the API boots without importing model runtimes or provider SDKs.
+
+    python -m benchmarks.check_import_footprint [--providers huggingface openai stub] [--with-rollups] [--max-seconds 3]
+
+For each LLM_PROVIDER, a fresh interpreter runs `python -X importtime`, imports
+main and runs the app's startup and shutdown handlers (ANALYZER_PRELOAD off,
+insight clustering on, scratch SQLite database, cache and index files). The
+import tree is parsed, and the check exits 1 if any HEAVY_MODULES were imported,
+printing the chain of imports that pulled each one in, if the insight embedder
+was loaded, or if booting took longer than --max-seconds. With --with-rollups
+the scratch database first gets an analysis with recorded insights, so the
+startup backfills run against existing rows.
+Provider modules are loaded by services.providers on the first analysis.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Top-level packages that must only be imported once an analysis (or upload) needs them
+HEAVY_MODULES = ("torch", "transformers", "accelerate", "sentence_transformers", "openai", "tiktoken", "pandas")
+
+BOOT_SCRIPT = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+asyncio.run(main.app.router.startup())
+started = time.perf_counter()
+asyncio.run(main.app.router.shutdown())
+from services.embeddings import embedder_loaded
+print(json.dumps({
+    "import_seconds": imported - start, "startup_seconds": started - imported, "embedder_loaded": embedder_loaded()
+}))
+"""
+
+# An analyzed conversation with its insights recorded (and clustered), as on a database in use
+SEED_SCRIPT = """
+from database import AnalysisResult, Conversation, SessionLocal, init_db
+from services.insights import record_insights
+init_db()
+db = SessionLocal()
+conversation = Conversation(source="gong", conversation_id="footprint-1", transcript="Onboarding took weeks.")
+db.add(conversation)
+db.flush()
+result = AnalysisResult(
+    conversation_id=conversation.id, pain_points=[{"point": "slow onboarding", "severity": "high"}],
+    media_consumption=[{"name": "podcasts", "type": "audio"}], compelling_points=[{"point": "fast support"}],
+    summary="Onboarding was slow.", confidence_score=0.5
+)
+db.add(result)
+db.flush()
+record_insights(db, result, "gong")
+db.commit()
+db.close()
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def parse_importtime(stderr: str) -> List[Tuple[int, str, int]]:
+    """(depth, module, cumulative microseconds) per import, in the order -X importtime prints them"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((len(match.group(3)) // 2, match.group(4), int(match.group(2))))
+    return entries
+
+def import_chain(entries: List[Tuple[int, str, int]], index: int) -> List[str]:
+    """The modules that (transitively) imported entries[index], outermost first.
+
+    -X importtime prints a module after everything it imported, one level less indented.
+    """
+    depth, name, _ = entries[index]
+    chain = [name]
+    for parent_depth, parent, _ in entries[index + 1:]:
+        if parent_depth < depth:
+            chain.append(parent)
+            depth = parent_depth
+            if depth == 0:
+                break
+    return list(reversed(chain))
+
+def check_provider(provider: str, with_rollups: bool = False) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="import-footprint-") as scratch:
+        env = dict(os.environ)
+        env.update({
+            "LLM_PROVIDER": provider,
+            "ANALYZER_PRELOAD": "false",
+            "INSIGHT_CLUSTERING_ENABLED": "true",
+            "DATABASE_URL": f"sqlite:///{scratch}/footprint.db",
+            "ANALYSIS_CACHE_PATH": os.path.join(scratch, "analysis_cache.db"),
+            "INSIGHT_INDEX_DIR": os.path.join(scratch, "insight_index"),
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")])),
+        })
+        if with_rollups:
+            seeded = subprocess.run(
+                [sys.executable, "-c", SEED_SCRIPT], cwd=scratch, env=env, capture_output=True, text=True
+            )
+            if seeded.returncode != 0:
+                raise RuntimeError(f"{provider}: seeding the database failed:\n{seeded.stderr[-2000:]}")
+        # Files the app creates relative to the working directory land in scratch
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            cwd=scratch, env=env, capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"{provider}: booting the API failed:\n" + "\n".join(errors[-20:]))
+
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(completed.stderr)
+    offenders = {}
+    for index, (_, name, _) in enumerate(entries):
+        top = name.split(".")[0]
+        # Prefer the chain to the package itself over one to its first (innermost) submodule
+        if top in HEAVY_MODULES and (top not in offenders or name == top):
+            offenders[top] = " > ".join(import_chain(entries, index))
+    return {
+        "provider": provider,
+        "with_rollups": with_rollups,
+        "modules": len(entries),
+        "import_seconds": round(timings["import_seconds"], 3),
+        "startup_seconds": round(timings["startup_seconds"], 3),
+        "heavy_imports": offenders,
+        "embedder_loaded": timings["embedder_loaded"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", nargs="+", default=["huggingface", "openai", "stub"])
+    parser.add_argument("--with-rollups", action="store_true",
+                        help="boot a database that already holds recorded insights")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="also fail if importing main plus startup takes longer than this")
+    args = parser.parse_args()
+
+    failed = False
+    for provider in args.providers:
+        report = check_provider(provider, with_rollups=args.with_rollups)
+        print(json.dumps(report))
+        for module, chain in report["heavy_imports"].items():
+            print(f"FAIL {provider}: {module} imported at boot via {chain}", file=sys.stderr)
+            failed = True
+        if report["embedder_loaded"]:
+            print(f"FAIL {provider}: insight embedder loaded at boot", file=sys.stderr)
+            failed = True
+        boot_seconds = report["import_seconds"] + report["startup_seconds"]
+        if args.max_seconds is not None and boot_seconds > args.max_seconds:
+            print(f"FAIL {provider}: boot took {boot_seconds:.2f}s (budget {args.max_seconds:.2f}s)", file=sys.stderr)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Deterministic synthetic sales-call corpora, shaped like sample_data.csv / sample_data.json.
+
+    python -m benchmarks.corpus --rows 100000 --style gong --format csv --out /tmp/gong_100k.csv
+
+"gong" transcripts are timestamped speaker turns, one per line (call recorder
+exports); "salesforce" ones are single-paragraph call notes like the sample data.
+The same --rows/--seed/--style always writes byte-identical files. Transcripts
+mention the pain points, media and features the stub LLM provider recognizes.
+"""
+import argparse
+import csv
+import json
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, TextIO
+
+from services.stub_llm import COMPELLING_POINTS, MEDIA, PAIN_POINTS
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+STYLES = ("gong", "salesforce")
+CSV_COLUMNS = ("conversation_id", "transcript", "date", "participants", "industry", "job_title")
+
+FIRST_NAMES = ["Sarah", "Mike", "Priya", "Carlos", "Jen", "Tom", "Aisha", "Wei", "Laura", "Dmitri", "Grace", "Omar"]
+LAST_NAMES = ["Martinez", "Chen", "Johnson", "Patel", "Kowalski", "Nguyen", "Smith", "Okafor", "Rossi", "Larsen"]
+REPS = ["John Smith", "Emily Davis", "Raj Kumar", "Anna Lee", "Marco Bianchi"]
+INDUSTRIES = ["Automotive", "Pharmaceutical", "Aerospace", "Electronics", "Food & Beverage", "Medical Devices",
+              "Industrial Equipment", "Consumer Goods"]
+JOB_TITLES = ["Plant Manager", "VP Operations", "Quality Director", "Continuous Improvement Lead",
+              "Manufacturing Engineer", "Operations Manager", "CIO"]
+
+REP_OPENERS = [
+    "Hi {name}, thanks for taking the time today.",
+    "{name}, great to finally connect.",
+    "Thanks for joining, {name}. How are things at the plant?",
+]
+CUSTOMER_INTROS = [
+    "We're a {size} {industry} manufacturer and I run operations across {sites} sites.",
+    "I'm the {title} here, and we're growing faster than our processes can keep up with.",
+    "We've been looking at options for a while now.",
+]
+PAIN_LINES = [
+    "Honestly, {pain} is killing us right now.",
+    "Our biggest problem is {pain}; it costs us hours every week.",
+    "We keep running into {pain} and leadership is asking questions.",
+]
+MEDIA_LINES = [
+    "I heard about you on {media}.",
+    "Someone on my team saw you mentioned in {media}.",
+    "We follow {media} and your name keeps coming up.",
+]
+REP_RESPONSES = [
+    "That's really common. Our platform was built for exactly that.",
+    "Tell me more about how that plays out on the shop floor.",
+    "A lot of our customers started in the same place.",
+]
+INTEREST_LINES = [
+    "The {feature} part is what caught my attention.",
+    "If we could get {feature}, that would change a lot for us.",
+    "Can you show me the {feature} again?",
+]
+CLOSERS = [
+    "Let's set up a pilot on one line next month.",
+    "Send me the pricing and I'll loop in our CFO.",
+    "I need to talk to IT first, but this looks promising.",
+]
+
+def _turns(rng: random.Random, customer: str, industry: str, title: str):
+    """(speaker, text) pairs for one call"""
+    turns = [
+        ("Sales Rep", rng.choice(REP_OPENERS).format(name=customer.split()[0])),
+        ("Customer", rng.choice(CUSTOMER_INTROS).format(
+            size=rng.choice(["small", "mid-size", "large"]), industry=industry.lower(),
+            sites=rng.randint(1, 12), title=title)),
+    ]
+    for pain in rng.sample(PAIN_POINTS, rng.randint(1, 3)):
+        turns.append(("Customer", rng.choice(PAIN_LINES).format(pain=pain)))
+        turns.append(("Sales Rep", rng.choice(REP_RESPONSES)))
+    if rng.random() < 0.7:
+        media = rng.sample(MEDIA, rng.randint(1, 2))
+        turns.append(("Customer", " ".join(rng.choice(MEDIA_LINES).format(media=name) for name, _ in media)))
+    for feature, _ in rng.sample(COMPELLING_POINTS, rng.randint(1, 2)):
+        turns.append(("Customer", rng.choice(INTEREST_LINES).format(feature=feature)))
+    turns.append(("Customer", rng.choice(CLOSERS)))
+    return turns
+
+def generate_records(rows: int, seed: int = 0, style: str = "gong") -> Iterator[Dict]:
+    """rows conversations as upload records (the CSV columns of sample_data.csv)"""
+    if style not in STYLES:
+        raise ValueError(f"Unknown corpus style {style}; use one of {', '.join(STYLES)}")
+    rng = random.Random(f"{seed}:{style}")
+    start = date(2024, 1, 1)
+    for index in range(rows):
+        customer = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        industry = rng.choice(INDUSTRIES)
+        title = rng.choice(JOB_TITLES)
+        turns = _turns(rng, customer, industry, title)
+        if style == "gong":
+            seconds = 0
+            lines = []
+            for speaker, text in turns:
+                seconds += rng.randint(5, 90)
+                lines.append(f"[{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}] {speaker}: {text}")
+            transcript = "\n".join(lines)
+        else:
+            transcript = " ".join(f"{speaker}: {text}" for speaker, text in turns)
+        yield {
+            "conversation_id": f"{style}_{seed}_{index:07d}",
+            "transcript": transcript,
+            "date": (start + timedelta(days=rng.randint(0, 729))).isoformat(),
+            "participants": f"{rng.choice(REPS)} - {customer}",
+            "industry": industry,
+            "job_title": title,
+        }
+
+def write_records(handle: TextIO, records: Iterable[Dict], file_format: str = "csv") -> int:
+    """Write records as CSV (the upload columns) or JSON Lines; returns the rows written"""
+    written = 0
+    if file_format == "csv":
+        writer = csv.DictWriter(handle, fieldnames=CSV_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            written += 1
+    else:
+        for record in records:
+            handle.write(json.dumps(record) + "\n")
+            written += 1
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1k", help=f"Row count, or one of {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--style", choices=STYLES, default="gong")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    rows = SIZES.get(args.rows.lower()) or int(args.rows)
+    with open(args.out, "w", encoding="utf-8", newline="") as handle:
+        written = write_records(handle, generate_records(rows, args.seed, args.style), args.format)
+    print(json.dumps({"rows": written, "style": args.style, "format": args.format, "path": args.out,
+                      "bytes": Path(args.out).stat().st_size}))
+
+if __name__ == "__main__":
+    main()
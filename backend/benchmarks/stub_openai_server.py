@@ -0,0 +1,87 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Run from the backend directory:
+    python -m benchmarks.stub_openai_server --port 8010 --latency-ms 200 --error-rate 0.05
+
+then point the analyzer at it:
+    LLM_PROVIDER=openai OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8010/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Stub OpenAI API")
+
+settings = {"latency_ms": 200.0, "error_rate": 0.0}
+stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "errors_injected": 0}
+
+def fake_analysis(text: str) -> dict:
+    """Deterministic analysis derived from the prompt text"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return {
+        "pain_points": [{"point": f"pain point {digest[:4]}", "severity": "medium"}],
+        "media_consumption": [{"name": f"podcast {digest[4:6]}", "type": "podcast"}],
+        "compelling_points": [{"point": f"feature {digest[6:8]}", "category": "feature"}],
+        "summary": f"Stub summary {digest[:12]}"
+    }
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(settings["latency_ms"] / 1000)
+        if random.random() < settings["error_rate"]:
+            stats["errors_injected"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "0.1"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+        content = json.dumps(fake_analysis(prompt))
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-stub-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+    finally:
+        stats["in_flight"] -= 1
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    args = parser.parse_args()
+    settings["latency_ms"] = args.latency_ms
+    settings["error_rate"] = args.error_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
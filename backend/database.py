@@ -1,40 +1,311 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Float
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Float, Index, LargeBinary, UniqueConstraint, delete, func, inspect, select, text
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, relationship, sessionmaker
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Tuple
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Imported after load_dotenv so .env pool and pragma settings apply
+from engine_config import async_url, configure_engine, engine_options
+from services.search import register_sqlite_functions as register_search_functions
+from services.transcript_store import decode_transcript, register_sqlite_functions
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./qualitative_analysis.db")
+# Same database through an asyncio driver, for request handlers that must not block the event loop
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+engine = configure_engine(create_engine(DATABASE_URL, **engine_options(DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+try:
+    ASYNC_DATABASE_URL = ASYNC_DATABASE_URL or async_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+    configure_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+except (ImportError, ValueError) as e:
+    print(f"Warning: async database engine unavailable ({e}). Install with: pip install aiosqlite (or asyncpg for PostgreSQL)")
+    async_engine = None
+    AsyncSessionLocal = None
+
+def get_db() -> Iterator[Session]:
+    """FastAPI dependency: a blocking Session, for handlers that hand their work to a thread"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: an AsyncSession, so queries wait without holding the event loop"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database engine unavailable: pip install aiosqlite (or asyncpg), or set ASYNC_DATABASE_URL")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+class QueryCounter:
+    """Statements executed while a count_queries() block is active"""
+    
+    def __init__(self):
+        self.statements: List[str] = []
+    
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+_query_counters: ContextVar[Tuple[QueryCounter, ...]] = ContextVar("query_counters", default=())
+
+@contextmanager
+def count_queries():
+    """Count SQL statements issued from this context (including run_in_threadpool calls made from it).
+
+        with count_queries() as queries:
+            ...
+        assert queries.count <= 2, queries.statements
+    """
+    counter = QueryCounter()
+    token = _query_counters.set(_query_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _query_counters.reset(token)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in _query_counters.get():
+        counter.statements.append(statement)
+
+event.listen(engine, "before_cursor_execute", _count_query)
+if async_engine is not None:
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count_query)
+
+# transcript_text() and search_index_deferred() for the full-text search triggers
+# and view (see services/search.py)
+register_sqlite_functions(engine)
+register_search_functions(engine)
+if async_engine is not None:
+    register_sqlite_functions(async_engine.sync_engine)
+    register_search_functions(async_engine.sync_engine)
+
 class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(Integer, primary_key=True, index=True)
     source = Column(String, index=True)  # gong, salesforce, planhat, etc.
     conversation_id = Column(String, unique=True, index=True)
-    transcript = Column(Text)
+    # Text kept in the row: conversations stored before the transcript blob store
+    # (until migrated), added through the ORM, or with TRANSCRIPT_STORE=inline
+    inline_transcript = Column("transcript", Text)
+    transcript_hash = Column(String, index=True)  # TranscriptBlob.content_hash
     additional_data = Column(JSON)  # Additional data like date, participants, etc.
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    blob = relationship(
+        "TranscriptBlob", primaryjoin="foreign(Conversation.transcript_hash) == TranscriptBlob.content_hash",
+        viewonly=True
+    )
+    
+    __table_args__ = (Index("ix_conversations_source_id", "source", "id"),)
+    
+    @property
+    def transcript(self):
+        """The transcript text; a stored blob is loaded and decompressed on first access"""
+        if self.inline_transcript is not None or self.transcript_hash is None:
+            return self.inline_transcript
+        return self.blob.text if self.blob is not None else None
+    
+    @transcript.setter
+    def transcript(self, value):
+        self.inline_transcript = value
+        self.transcript_hash = None
+
+# One row per distinct transcript (see services/transcript_store.py)
+class TranscriptBlob(Base):
+    __tablename__ = "transcript_blobs"
+    
+    content_hash = Column(String, primary_key=True)  # SHA-256 of the UTF-8 text
+    codec = Column(String, nullable=False)  # zstd, zlib or raw
+    dictionary_id = Column(Integer)  # TranscriptDictionary the zstd frame was compressed with
+    size = Column(Integer)  # uncompressed bytes
+    data = Column(LargeBinary, nullable=False)
+    
+    @property
+    def text(self) -> str:
+        # Blobs are immutable, so the text is decompressed once per loaded instance
+        text = self.__dict__.get("_text")
+        if text is None:
+            text = self.__dict__["_text"] = decode_transcript(self.codec, self.dictionary_id, self.data)
+        return text
+
+class TranscriptDictionary(Base):
+    __tablename__ = "transcript_dictionaries"
+    
+    id = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)  # trained zstd dictionary
+    samples = Column(Integer)  # transcripts it was trained on
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
 class AnalysisResult(Base):
     __tablename__ = "analysis_results"
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, index=True)
+    conversation_id = Column(Integer, index=True, unique=True)  # one analysis per conversation
     pain_points = Column(JSON)  # List of pain points
     media_consumption = Column(JSON)  # List of media sources mentioned
     compelling_points = Column(JSON)  # List of compelling points
     summary = Column(Text)
     confidence_score = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Keyset pagination order for the results list
+    __table_args__ = (Index("ix_analysis_results_created_id", "created_at", "id"),)
+
+class Insight(Base):
+    __tablename__ = "insights"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    result_id = Column(Integer, index=True)
+    conversation_id = Column(Integer, index=True)
+    source = Column(String)
+    kind = Column(String)  # pain_point, media, compelling_point
+    text = Column(Text)
+    attribute = Column(String)  # severity, media type or category
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (Index("ix_insights_kind_source", "kind", "source"),)
+
+# Running count per (kind, source, text); source "__all__" holds the cross-source total
+class InsightRollup(Base):
+    __tablename__ = "insight_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    cluster_id = Column(Integer)  # semantic cluster of near-duplicate texts (see services/insight_clusters.py)
+    
+    __table_args__ = (
+        UniqueConstraint("kind", "source", "text", name="uq_insight_rollups_kind_source_text"),
+        Index("ix_insight_rollups_top", "kind", "source", "count"),
+        Index("ix_insight_rollups_cluster", "kind", "source", "cluster_id"),
+    )
+
+# Running count per (kind, source, semantic cluster) under the cluster's most
+# frequent phrasing; a text without a cluster is a group of its own, keyed by
+# the negated id of its InsightRollup row
+class ClusterRollup(Base):
+    __tablename__ = "cluster_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    cluster_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    label = Column(Text)
+    label_count = Column(Integer, nullable=False, default=0)  # rollup count of the label text
+    variants = Column(Integer, nullable=False, default=0)  # distinct texts in the group
+    
+    __table_args__ = (
+        UniqueConstraint("kind", "source", "cluster_id", name="uq_cluster_rollups_kind_source_cluster"),
+        Index("ix_cluster_rollups_top", "kind", "source", count.desc()),
+    )
+
+# Number of ClusterRollup groups per (kind, source), the aggregate's total_unique
+class InsightTotal(Base):
+    __tablename__ = "insight_totals"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    distinct_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (UniqueConstraint("kind", "source", name="uq_insight_totals_kind_source"),)
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, index=True, default="queued")  # queued, running, completed, cancelled
+    source = Column(String)  # source filter the batch was submitted with, if any
+    total = Column(Integer, default=0)
+    analyzed = Column(Integer, default=0)
+    already_analyzed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class AnalysisJobItem(Base):
+    __tablename__ = "analysis_job_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, index=True)
+    conversation_id = Column(Integer, index=True)
+    status = Column(String, default="pending")  # pending, running, analyzed, already_analyzed, failed, cancelled
+    result_id = Column(Integer)
+    error = Column(Text)
+    latency_ms = Column(Float)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (Index("ix_analysis_job_items_job_status", "job_id", "status"),)
+
+def _ensure_schema():
+    """Add columns and indexes introduced after a table was first created.
+
+    create_all only creates missing tables; new columns must be nullable.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+def _ensure_unique_analysis_results():
+    """Make the conversation_id index of analysis_results unique on databases created before it was.
+
+    Duplicate results (a conversation analyzed twice) are dropped, keeping the
+    first. The insight tables are cleared as well, so the startup backfill
+    recounts them from the remaining results.
+    """
+    inspector = inspect(engine)
+    if "analysis_results" not in inspector.get_table_names():
+        return
+    name = "ix_analysis_results_conversation_id"
+    existing = next((index for index in inspector.get_indexes("analysis_results") if index["name"] == name), None)
+    if existing is None or existing["unique"]:
+        return
+    results = AnalysisResult.__table__
+    with engine.begin() as connection:
+        first_ids = select(func.min(results.c.id)).where(results.c.conversation_id.isnot(None)).group_by(
+            results.c.conversation_id
+        )
+        duplicates = connection.execute(delete(results).where(
+            results.c.conversation_id.isnot(None), results.c.id.notin_(first_ids)
+        )).rowcount
+        if duplicates:
+            for table in (Insight, InsightRollup, ClusterRollup, InsightTotal):
+                connection.execute(delete(table.__table__))
+            print(f"Removed {duplicates} duplicate analysis results; insights will be recounted")
+        # Recreated as unique by _ensure_schema
+        next(index for index in results.indexes if index.name == name).drop(bind=connection)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _ensure_unique_analysis_results()
+    _ensure_schema()
 
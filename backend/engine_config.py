@@ -0,0 +1,110 @@
+"""Engine and connection-pool settings for SQLite and server databases.
+
+SQLite gets per-connection pragmas (WAL so readers never block the writer,
+synchronous=NORMAL, a busy timeout instead of failing on a locked database,
+mmap and page cache sizes). Server databases get pool sizing, pre-ping and
+recycling. Everything is overridable through the environment.
+"""
+import os
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal").upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection in KiB (SQLite's own default is about 2 MB)
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+# Connections kept open, extra connections allowed under load, and seconds to wait for one
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Reconnect connections older than this, before a server or proxy drops them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Async drivers for the AsyncEngine that serves the read-heavy routers
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+def async_url(url: str) -> str:
+    """The same database through its asyncio driver (sqlite+aiosqlite, postgresql+asyncpg)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}; set ASYNC_DATABASE_URL")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    # file:name?mode=memory&uri=true is a named in-memory database, shared with cache=shared
+    return not parsed.database or parsed.database == ":memory:" or parsed.query.get("mode") == "memory"
+
+def engine_options(url: str) -> Dict:
+    """Keyword arguments for create_engine() for this database URL"""
+    if is_sqlite(url):
+        options: Dict = {
+            # Sessions are used from the threadpool and from job worker threads
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+        if not _is_memory_sqlite(url):
+            # Opening a file connection is cheap, but pragmas and page cache are per connection
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+            if make_url(url).get_driver_name() == "aiosqlite":
+                # aiosqlite defaults to no pooling, and each new connection starts a thread
+                options["poolclass"] = AsyncAdaptedQueuePool
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def sqlite_pragmas(url: str) -> Dict[str, str]:
+    pragmas = {
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "busy_timeout": str(SQLITE_BUSY_TIMEOUT_MS),
+        "cache_size": str(-SQLITE_CACHE_SIZE_KB),  # negative means KiB rather than pages
+        "mmap_size": str(SQLITE_MMAP_SIZE),
+        "temp_store": "MEMORY",
+    }
+    if not _is_memory_sqlite(url):
+        pragmas = {"journal_mode": SQLITE_JOURNAL_MODE, **pragmas}
+    return pragmas
+
+def configure_engine(engine: Engine) -> Engine:
+    """Apply the SQLite pragmas to every new connection of the engine"""
+    url = str(engine.url)
+    if not is_sqlite(url):
+        return engine
+    pragmas = sqlite_pragmas(url)
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
+
+def engine_status(engine: Engine) -> Dict:
+    """Effective settings, for the config endpoint and benchmarks"""
+    status: Dict = {"dialect": engine.dialect.name, "pool": engine.pool.status()}
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            status["pragmas"] = {
+                name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")
+            }
+    return status
@@ -1,12 +1,28 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 from dotenv import load_dotenv
 import os
 
-from database import SessionLocal, init_db
-from routers import upload, analysis, results
+from database import SessionLocal, async_engine, engine, init_db
+from engine_config import engine_status
+from routers import upload, analysis, results, search
+from services.analyzer import resolve_model_name, PROMPT_VERSION
+from services.analysis_cache import analysis_cache
+from services.response_cache import ResponseCacheMiddleware, response_cache
+from services.registry import registry, ANALYZER_PRELOAD
+from services.jobs import job_manager
+from services.inference_workers import shutdown_worker_pools
+from services.insights import backfill_cluster_rollups, backfill_insights, backfill_insight_clusters
+from services.insight_clusters import cluster_status
+from services.search import ensure_search_index
+from services.transcript_store import load_dictionaries, status as transcript_store_status
+from services.metrics import (
+    ANALYZER_REPLICAS, CACHE_EVENTS, CONTENT_TYPE as METRICS_CONTENT_TYPE, DB_POOL_CONNECTIONS,
+    METRICS_ENABLED, MetricsMiddleware, registry as metrics_registry
+)
 
 load_dotenv()
 
@@ -16,6 +32,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Cached GET responses with ETags; added before CORS so it sits inside it and
+# never stores one origin's CORS headers for another
+if response_cache:
+    app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -25,13 +46,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database
-init_db()
+# Outermost, so request latency includes the response cache and CORS
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Set by init_database (and read by routers/search.py). Database setup runs at
+# startup rather than on import: spawned worker processes re-import the parent's
+# __main__, which is this file under `python main.py`
+app.state.search_available = False
+
+def _backfill_insights():
+    db = SessionLocal()
+    try:
+        backfill_insights(db)
+        reclustered = backfill_insight_clusters(db)
+        backfill_cluster_rollups(db, reclustered)
+    finally:
+        db.close()
+
+def _init_database() -> bool:
+    init_db()
+    load_dictionaries(engine)
+    # Full-text index over transcripts and analyses, built from existing rows the first time
+    available = ensure_search_index(engine)
+    # Analyses saved before the insight rollup tables existed, rollup texts without
+    # a semantic cluster (new index or changed embedding model), and cluster groups
+    # of rollups saved before the cluster rollup table existed or since reclustered
+    _backfill_insights()
+    return available
+
+@app.on_event("startup")
+async def init_database():
+    """Create tables and indexes and run the backfills, before the other startup handlers"""
+    app.state.search_available = await run_in_threadpool(_init_database)
+
+@app.on_event("startup")
+async def load_analyzers():
+    """Load the analyzer pool up front when ANALYZER_PRELOAD=true (otherwise on first use)"""
+    if ANALYZER_PRELOAD:
+        try:
+            await run_in_threadpool(registry.preload)
+        except Exception as e:
+            print(f"Analyzer preload failed, will retry on first analysis: {e}")
+
+@app.on_event("startup")
+async def start_job_workers():
+    """Pick up batch analysis jobs left unfinished by a previous run"""
+    await run_in_threadpool(job_manager.start)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    job_manager.shutdown()
+    shutdown_worker_pools()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    # Pooled aiosqlite connections each hold a (non-daemon) thread open
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # Include routers
 app.include_router(upload.router, prefix="/api/upload", tags=["upload"])
 app.include_router(analysis.router, prefix="/api/analysis", tags=["analysis"])
 app.include_router(results.router, prefix="/api/results", tags=["results"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
 
 @app.get("/")
 async def root():
@@ -41,6 +119,35 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit rates of the HTTP response cache and the analysis cache"""
+    return {
+        "response_cache": response_cache.status() if response_cache else {"enabled": False},
+        "analysis_cache": analysis_cache.status() if analysis_cache else {"enabled": False}
+    }
+
+def _collect_metrics():
+    """Copy state kept by the caches, analyzer pools and engines into the metrics registry"""
+    for name, cache in (("response", response_cache), ("analysis", analysis_cache)):
+        if cache is not None:
+            for event, value in cache.stats.items():
+                CACHE_EVENTS.set_total(value, cache=name, event=event)
+    for pool in registry.status():
+        ANALYZER_REPLICAS.set(pool["replicas_in_use"], provider=pool["provider"], model=pool["model"], state="in_use")
+        ANALYZER_REPLICAS.set(pool["replicas_idle"], provider=pool["provider"], model=pool["model"], state="idle")
+    for name, db_engine in (("sync", engine), ("async", async_engine.sync_engine if async_engine else None)):
+        checkedout = getattr(db_engine.pool, "checkedout", None) if db_engine is not None else None
+        if checkedout is not None:
+            DB_POOL_CONNECTIONS.set(checkedout(), engine=name)
+
+metrics_registry.add_collector(_collect_metrics)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Stage timers, counters and histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/api/config")
 async def get_config():
     """Get current LLM configuration"""
@@ -50,10 +157,19 @@ async def get_config():
     }
     
     if provider == "openai":
-        config["model"] = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
+        config["model"] = resolve_model_name("openai")
         config["has_api_key"] = bool(os.getenv("OPENAI_API_KEY"))
-    elif provider == "huggingface":
-        config["model"] = os.getenv("HUGGINGFACE_MODEL", "microsoft/Phi-3-mini-4k-instruct")
+    elif provider in ("huggingface", "stub"):
+        config["model"] = resolve_model_name(provider)
+    
+    # Load time and replica state of the warm analyzer pools in this process
+    config["analyzers"] = registry.status()
+    config["prompt_version"] = PROMPT_VERSION
+    config["analysis_cache"] = analysis_cache.status() if analysis_cache else {"enabled": False}
+    config["insight_clusters"] = cluster_status()
+    config["database"] = engine_status(engine)
+    config["search"] = {"enabled": app.state.search_available}
+    config["transcript_store"] = transcript_store_status(engine.dialect.name)
         
     return config
 
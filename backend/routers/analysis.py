@@ -1,18 +1,44 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
-from database import SessionLocal, Conversation, AnalysisResult
-from services.analyzer import ConversationAnalyzer
+from database import SessionLocal, get_db, Conversation, AnalysisResult, AnalysisJob, AnalysisJobItem
+from services.analysis_store import save_analysis
+from services.metrics import ANALYSIS_CONVERSATIONS, DB_COMMIT_SECONDS
+from services.jobs import FINISHED_JOB_STATUSES, JobEventCursor, job_manager, job_to_dict
+from services.registry import get_analyzer_pool
 from typing import Optional, List
+import asyncio
+import json
 import os
+import time
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# How often a progress stream checks the job for finished conversations
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.5"))
+# Comment lines sent while nothing finishes, so proxies do not close an idle stream
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+def _analyze_with_pool(pool, conversation: Conversation):
+    # Read here, off the event loop: a stored blob is loaded and decompressed on first access
+    transcript = conversation.transcript
+    with pool.acquire() as analyzer:
+        return analyzer.analyze(transcript)
+
+def _already_analyzed(existing: AnalysisResult) -> dict:
+    ANALYSIS_CONVERSATIONS.inc(outcome="already_analyzed")
+    return {
+        "message": "Analysis already exists",
+        "result_id": existing.id,
+        "analysis": {
+            "pain_points": existing.pain_points,
+            "media_consumption": existing.media_consumption,
+            "compelling_points": existing.compelling_points,
+            "summary": existing.summary
+        }
+    }
 
 @router.post("/analyze/{conversation_id}")
 async def analyze_conversation(
@@ -32,40 +58,30 @@ async def analyze_conversation(
     ).first()
     
     if existing:
-        return {
-            "message": "Analysis already exists",
-            "result_id": existing.id,
-            "analysis": {
-                "pain_points": existing.pain_points,
-                "media_consumption": existing.media_consumption,
-                "compelling_points": existing.compelling_points,
-                "summary": existing.summary
-            }
-        }
+        return _already_analyzed(existing)
     
     # Perform analysis
     try:
-        analyzer = ConversationAnalyzer()
-        result = analyzer.analyze(conversation.transcript)
+        pool = await run_in_threadpool(get_analyzer_pool)
+        result = await run_in_threadpool(_analyze_with_pool, pool, conversation)
     except Exception as e:
+        ANALYSIS_CONVERSATIONS.inc(outcome="failed")
         raise HTTPException(
             status_code=500, 
             detail=f"Analysis failed: {str(e)}. Check your LLM configuration in .env file."
         )
     
     # Save result
-    analysis_result = AnalysisResult(
-        conversation_id=conversation_id,
-        pain_points=result["pain_points"],
-        media_consumption=result["media_consumption"],
-        compelling_points=result["compelling_points"],
-        summary=result["summary"],
-        confidence_score=result.get("confidence_score", 0.0)
-    )
-    
-    db.add(analysis_result)
-    db.commit()
+    with DB_COMMIT_SECONDS.time(operation="analysis_save"):
+        analysis_result = save_analysis(db, conversation, result)
+        db.commit()
+    if analysis_result is None:
+        # Another request or a batch job saved one while this analysis ran
+        return _already_analyzed(db.query(AnalysisResult).filter(
+            AnalysisResult.conversation_id == conversation_id
+        ).one())
     db.refresh(analysis_result)
+    ANALYSIS_CONVERSATIONS.inc(outcome="analyzed")
     
     return {
         "message": "Analysis completed",
@@ -83,86 +99,128 @@ async def analyze_batch(
     conversation_ids: Optional[List[int]] = None,
     source: Optional[str] = None,
     limit: int = 100,
-    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_db)
 ):
-    """Analyze multiple conversations in batch"""
+    """Queue a batch analysis job and return its id immediately"""
     # Get conversations to analyze
-    query = db.query(Conversation)
+    query = db.query(Conversation.id)
     
     if conversation_ids:
+        # Explicit ids are all recorded on the job; analyzed ones are marked as such
         query = query.filter(Conversation.id.in_(conversation_ids))
-    elif source:
-        query = query.filter(Conversation.source == source)
+    else:
+        if source:
+            query = query.filter(Conversation.source == source)
+        # Anti-join, so the limit counts only conversations that still need analysis
+        query = query.filter(
+            ~exists().where(AnalysisResult.conversation_id == Conversation.id)
+        )
     
-    conversations = query.limit(limit).all()
+    ids = [row[0] for row in query.order_by(Conversation.id).limit(limit).all()]
     
-    if not conversations:
-        raise HTTPException(status_code=404, detail="No conversations found")
+    if not ids:
+        detail = "No conversations found" if conversation_ids else "No unanalyzed conversations found"
+        raise HTTPException(status_code=404, detail=detail)
     
-    # Initialize analyzer once (creates/reuses model)
-    try:
-        analyzer = ConversationAnalyzer()
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to initialize analyzer: {str(e)}. Check your LLM configuration in .env file."
-        )
+    job = await run_in_threadpool(job_manager.submit, db, ids, source)
+    
+    return {
+        "message": f"Queued {job.total} conversations for analysis",
+        **job_to_dict(job)
+    }
+
+@router.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(default=50, le=500),
+    db: Session = Depends(get_db)
+):
+    """List batch analysis jobs, newest first"""
+    query = db.query(AnalysisJob)
+    if status:
+        query = query.filter(AnalysisJob.status == status)
+    jobs = query.order_by(AnalysisJob.id.desc()).limit(limit).all()
+    return {"jobs": [job_to_dict(job) for job in jobs]}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Poll the progress of a batch analysis job"""
+    job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    results = []
-    errors = []
-    
-    for conversation in conversations:
-        try:
-            # Check if analysis already exists
-            existing = db.query(AnalysisResult).filter(
-                AnalysisResult.conversation_id == conversation.id
-            ).first()
-            
-            if existing:
-                results.append({
-                    "conversation_id": conversation.id,
-                    "status": "already_analyzed",
-                    "result_id": existing.id
-                })
-                continue
-            
-            # Perform analysis
-            analysis = analyzer.analyze(conversation.transcript)
-            
-            # Save result
-            analysis_result = AnalysisResult(
-                conversation_id=conversation.id,
-                pain_points=analysis["pain_points"],
-                media_consumption=analysis["media_consumption"],
-                compelling_points=analysis["compelling_points"],
-                summary=analysis["summary"],
-                confidence_score=analysis.get("confidence_score", 0.0)
-            )
-            
-            db.add(analysis_result)
-            results.append({
-                "conversation_id": conversation.id,
-                "status": "analyzed",
-                "result_id": analysis_result.id
-            })
-            
-        except Exception as e:
-            errors.append({
-                "conversation_id": conversation.id,
-                "error": str(e)
-            })
-    
-    db.commit()
+    failed_items = db.query(AnalysisJobItem).filter(
+        AnalysisJobItem.job_id == job_id,
+        AnalysisJobItem.status == "failed"
+    ).limit(100).all()
     
     return {
-        "message": f"Analyzed {len(results)} conversations",
-        "analyzed": len([r for r in results if r["status"] == "analyzed"]),
-        "already_analyzed": len([r for r in results if r["status"] == "already_analyzed"]),
-        "results": results,
-        "errors": errors if errors else None
+        **job_to_dict(job),
+        "errors": [
+            {"conversation_id": item.conversation_id, "error": item.error}
+            for item in failed_items
+        ] or None
     }
 
+def _poll_job_events(cursor: JobEventCursor):
+    db = SessionLocal()
+    try:
+        return cursor.poll(db)
+    finally:
+        db.close()
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, request: Request):
+    """Stream a batch job's progress as server-sent events.
+
+    `progress` first, then one `item` event per conversation as it finishes (with
+    the job's running totals and throughput), and `done` when the job finishes.
+    """
+    cursor = JobEventCursor(job_id)
+    progress, _ = await run_in_threadpool(_poll_job_events, cursor)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        nonlocal progress
+        yield _sse("progress", progress)
+        last_sent = time.monotonic()
+        while progress["status"] not in FINISHED_JOB_STATUSES:
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            if await request.is_disconnected():
+                return
+            progress, items = await run_in_threadpool(_poll_job_events, cursor)
+            if progress is None:
+                return
+            for item in items:
+                yield _sse("item", {**item, "job": progress})
+                last_sent = time.monotonic()
+            if time.monotonic() - last_sent >= JOB_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+        yield _sse("done", progress)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # No caching, and no response buffering in nginx-style proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """Cancel a queued or running batch analysis job"""
+    job = await run_in_threadpool(job_manager.cancel, db, job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job_to_dict(job)
+
 @router.get("/status/{conversation_id}")
 async def get_analysis_status(conversation_id: int, db: Session = Depends(get_db)):
     """Check if a conversation has been analyzed"""
@@ -1,32 +1,44 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from database import SessionLocal, AnalysisResult, Conversation
-from typing import Optional, List
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, AnalysisResult, Conversation
+from typing import Optional, List, Tuple
+from sqlalchemy import and_, func, or_, select
+from datetime import datetime
+import base64
+import json
+import os
+import time
+from collections import OrderedDict
+from services.insights import top_insights
+from services.response_cache import data_version
 
-router = APIRouter()
+SUMMARY_PREVIEW_CHARS = 200
+# Seconds a list total is reused before it is counted again
+RESULTS_TOTAL_TTL = float(os.getenv("RESULTS_TOTAL_TTL", "30"))
+# Sources whose totals are kept (least recently used dropped first)
+RESULTS_TOTAL_CACHE_ITEMS = int(os.getenv("RESULTS_TOTAL_CACHE_ITEMS", "256"))
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+router = APIRouter()
 
 @router.get("/{result_id}")
-async def get_result(result_id: int, db: Session = Depends(get_db)):
+async def get_result(result_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific analysis result"""
-    result = db.query(AnalysisResult).filter(AnalysisResult.id == result_id).first()
+    # One round-trip: the result together with its conversation's source
+    row = (await db.execute(
+        select(AnalysisResult, Conversation.source).outerjoin(
+            Conversation, Conversation.id == AnalysisResult.conversation_id
+        ).where(AnalysisResult.id == result_id)
+    )).first()
     
-    if not result:
+    if not row:
         raise HTTPException(status_code=404, detail="Result not found")
     
-    conversation = db.query(Conversation).filter(Conversation.id == result.conversation_id).first()
+    result, conversation_source = row
     
     return {
         "result_id": result.id,
         "conversation_id": result.conversation_id,
-        "conversation_source": conversation.source if conversation else None,
+        "conversation_source": conversation_source,
         "pain_points": result.pain_points,
         "media_consumption": result.media_consumption,
         "compelling_points": result.compelling_points,
@@ -36,11 +48,11 @@ async def get_result(result_id: int, db: Session = Depends(get_db)):
     }
 
 @router.get("/conversation/{conversation_id}")
-async def get_result_by_conversation(conversation_id: int, db: Session = Depends(get_db)):
+async def get_result_by_conversation(conversation_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get analysis result for a specific conversation"""
-    result = db.query(AnalysisResult).filter(
-        AnalysisResult.conversation_id == conversation_id
-    ).first()
+    result = (await db.execute(
+        select(AnalysisResult).where(AnalysisResult.conversation_id == conversation_id).limit(1)
+    )).scalar()
     
     if not result:
         raise HTTPException(status_code=404, detail="Analysis not found for this conversation")
@@ -59,19 +71,16 @@ async def get_result_by_conversation(conversation_id: int, db: Session = Depends
 @router.get("/aggregate/summary")
 async def get_aggregate_summary(
     source: Optional[str] = None,
-    limit: int = Query(default=1000, le=10000),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(
+        default=None, le=10000, deprecated=True,
+        description="Ignored: counts are kept incrementally and always cover every analysis"
+    ),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get aggregated insights across all analyzed conversations"""
-    query = db.query(AnalysisResult)
-    
-    if source:
-        # Join with conversations to filter by source
-        query = query.join(Conversation).filter(Conversation.source == source)
+    total_analyzed = await _count_results(db, source)
     
-    results = query.limit(limit).all()
-    
-    if not results:
+    if not total_analyzed:
         return {
             "total_analyzed": 0,
             "pain_points": {},
@@ -80,88 +89,149 @@ async def get_aggregate_summary(
             "top_insights": []
         }
     
-    # Aggregate pain points
-    pain_points_count = {}
-    media_count = {}
-    compelling_points_count = {}
-    
-    for result in results:
-        # Count pain points
-        if result.pain_points:
-            for pain_point in result.pain_points:
-                if isinstance(pain_point, dict):
-                    text = pain_point.get("point", pain_point.get("text", str(pain_point)))
-                else:
-                    text = str(pain_point)
-                pain_points_count[text] = pain_points_count.get(text, 0) + 1
-        
-        # Count media consumption
-        if result.media_consumption:
-            for media in result.media_consumption:
-                if isinstance(media, dict):
-                    name = media.get("name", media.get("source", str(media)))
-                else:
-                    name = str(media)
-                media_count[name] = media_count.get(name, 0) + 1
-        
-        # Count compelling points
-        if result.compelling_points:
-            for point in result.compelling_points:
-                if isinstance(point, dict):
-                    text = point.get("point", point.get("text", str(point)))
-                else:
-                    text = str(point)
-                compelling_points_count[text] = compelling_points_count.get(text, 0) + 1
-    
-    # Sort and get top items
-    top_pain_points = sorted(pain_points_count.items(), key=lambda x: x[1], reverse=True)[:20]
-    top_media = sorted(media_count.items(), key=lambda x: x[1], reverse=True)[:20]
-    top_compelling = sorted(compelling_points_count.items(), key=lambda x: x[1], reverse=True)[:20]
+    # Counts are maintained incrementally as analyses are saved, so this is an
+    # index range scan over the rollup table rather than a pass over every result.
+    # Near-duplicate phrasings are merged into one entry per semantic cluster.
+    pain_points_unique, top_pain_points = await db.run_sync(top_insights, "pain_point", source)
+    media_unique, top_media = await db.run_sync(top_insights, "media", source)
+    compelling_unique, top_compelling = await db.run_sync(top_insights, "compelling_point", source)
     
     return {
-        "total_analyzed": len(results),
+        "total_analyzed": total_analyzed,
         "pain_points": {
-            "total_unique": len(pain_points_count),
-            "top": [{"point": point, "count": count} for point, count in top_pain_points]
+            "total_unique": pain_points_unique,
+            "top": [_insight_entry("point", insight) for insight in top_pain_points]
         },
         "media_consumption": {
-            "total_unique": len(media_count),
-            "top": [{"media": media, "count": count} for media, count in top_media]
+            "total_unique": media_unique,
+            "top": [_insight_entry("media", insight) for insight in top_media]
         },
         "compelling_points": {
-            "total_unique": len(compelling_points_count),
-            "top": [{"point": point, "count": count} for point, count in top_compelling]
+            "total_unique": compelling_unique,
+            "top": [_insight_entry("point", insight) for insight in top_compelling]
         }
     }
 
+async def _count_results(db: AsyncSession, source: Optional[str]) -> int:
+    query = select(func.count(AnalysisResult.id))
+    if source:
+        # Join with conversations to filter by source
+        query = query.join(Conversation, Conversation.id == AnalysisResult.conversation_id).where(
+            Conversation.source == source
+        )
+    return (await db.execute(query)).scalar()
+
+def _insight_entry(label_key: str, insight: dict) -> dict:
+    """Cluster count under the cluster's representative phrasing"""
+    return {
+        label_key: insight["label"],
+        "count": insight["count"],
+        "variants": insight["variants"],
+        "cluster_id": insight["cluster_id"]
+    }
+
+def _encode_cursor(created_at: datetime, result_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), result_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, result_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(result_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+# source -> (data version, counted at, total)
+_total_cache: "OrderedDict[Optional[str], Tuple[int, float, int]]" = OrderedDict()
+
+async def _cached_total(db: AsyncSession, source: Optional[str]) -> int:
+    """Result count, recounted after RESULTS_TOTAL_TTL seconds or once data changes in this process"""
+    now = time.monotonic()
+    version = data_version.value
+    cached = _total_cache.get(source)
+    if cached is not None and cached[0] == version and now - cached[1] < RESULTS_TOTAL_TTL:
+        _total_cache.move_to_end(source)
+        return cached[2]
+    total = await _count_results(db, source)
+    _total_cache[source] = (version, now, total)
+    _total_cache.move_to_end(source)
+    while len(_total_cache) > RESULTS_TOTAL_CACHE_ITEMS:
+        _total_cache.popitem(last=False)
+    return total
+
 @router.get("/list/all")
 async def list_all_results(
-    skip: int = Query(default=0, ge=0),
-    limit: int = Query(default=100, le=1000),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
     source: Optional[str] = None,
-    db: Session = Depends(get_db)
+    include_total: Optional[bool] = None,
+    skip: Optional[int] = Query(
+        default=None, ge=0, deprecated=True,
+        description="Offset pagination, kept for existing clients: O(skip) per page, use cursor instead"
+    ),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all analysis results with pagination"""
-    query = db.query(AnalysisResult)
+    """List analysis results oldest first, one page at a time.
+
+    Pass the returned next_cursor to get the following page; it is null on the
+    last page. The total is included unless the request pages by cursor, and is
+    exact on requests without one; include_total overrides that either way.
+    """
+    if cursor and skip is not None:
+        raise HTTPException(status_code=400, detail="Pass either cursor or skip, not both")
+    if include_total is None:
+        # Requests without a cursor include clients written for the offset API, which read the total
+        include_total = not cursor
+    
+    # Only the listed columns, and just enough of the summary to know if it was cut
+    query = select(
+        AnalysisResult.id,
+        AnalysisResult.conversation_id,
+        func.substr(AnalysisResult.summary, 1, SUMMARY_PREVIEW_CHARS + 1).label("summary"),
+        AnalysisResult.created_at
+    )
     
     if source:
-        query = query.join(Conversation).filter(Conversation.source == source)
+        query = query.join(Conversation, Conversation.id == AnalysisResult.conversation_id).where(
+            Conversation.source == source
+        )
     
-    total = query.count()
-    results = query.offset(skip).limit(limit).all()
+    if cursor:
+        # Keyset: seek past the last row of the previous page on the (created_at, id) index
+        created_at, result_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            AnalysisResult.created_at > created_at,
+            and_(AnalysisResult.created_at == created_at, AnalysisResult.id > result_id)
+        ))
+    
+    query = query.order_by(AnalysisResult.created_at, AnalysisResult.id)
+    if skip:
+        query = query.offset(skip)
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    if not include_total:
+        total = None
+    elif cursor:
+        total = await _cached_total(db, source)
+    else:
+        # Exact, as offset clients have always had it, including right after their own writes
+        total = await _count_results(db, source)
     
     return {
         "total": total,
-        "skip": skip,
+        "skip": None if cursor else (skip or 0),
         "limit": limit,
+        "next_cursor": _encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
         "results": [
             {
                 "result_id": r.id,
                 "conversation_id": r.conversation_id,
-                "summary": r.summary[:200] + "..." if r.summary and len(r.summary) > 200 else r.summary,
+                "summary": r.summary[:SUMMARY_PREVIEW_CHARS] + "..." if r.summary and len(r.summary) > SUMMARY_PREVIEW_CHARS else r.summary,
                 "created_at": r.created_at.isoformat()
             }
-            for r in results
+            for r in rows
         ]
     }
-
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from services.search import SEARCH_ENABLED, SearchQueryError, search_conversations
+
+router = APIRouter()
+
+@router.get("")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=500, description="Words, \"phrases\" and prefix* terms"),
+    source: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search transcripts, summaries and extracted insights, best matches first, with highlighted snippets"""
+    if not SEARCH_ENABLED:
+        raise HTTPException(status_code=404, detail="Full-text search is disabled (SEARCH_ENABLED=false)")
+    if not getattr(request.app.state, "search_available", False):
+        # ensure_search_index found no FTS5 (SQLite) or could not set up text search (PostgreSQL)
+        raise HTTPException(
+            status_code=503, detail="Full-text search is not available on this database (see the startup log)"
+        )
+    try:
+        total, results = await db.run_sync(search_conversations, q, source, limit, offset, include_total)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "query": q,
+        "source": source,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        # A full page means there may be more
+        "next_offset": offset + limit if len(results) == limit else None,
+        "results": results
+    }
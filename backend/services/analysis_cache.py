@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "./analysis_cache.db")
+ANALYSIS_CACHE_MEMORY_ITEMS = int(os.getenv("ANALYSIS_CACHE_MEMORY_ITEMS", "2048"))
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+def normalize_transcript(transcript: str) -> str:
+    """Whitespace-insensitive form of a transcript, so re-exports with different line endings still match"""
+    return " ".join(transcript.split())
+
+def cache_key(transcript: str, prompt_version: str, provider: str, model_name: Optional[str]) -> str:
+    """Content address of one analysis: transcript hash + prompt version + provider/model"""
+    transcript_hash = hashlib.sha256(normalize_transcript(transcript).encode("utf-8")).hexdigest()
+    return f"{provider}:{model_name}:{prompt_version}:{transcript_hash}"
+
+class AnalysisCache:
+    """Two-tier cache of finished analyses: an in-memory LRU in front of a SQLite file.
+
+    The disk tier is shared by every process pointing at the same file and is
+    trimmed back under max_bytes by least-recent access. Its size is a one-row
+    table updated in the same write transaction as each store and eviction, so
+    every process sees the total the others left.
+    """
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, memory_items: int = ANALYSIS_CACHE_MEMORY_ITEMS,
+                 max_bytes: int = ANALYSIS_CACHE_MAX_BYTES):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _disk(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_analysis_cache_last_access ON analysis_cache (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache_size (id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL)"
+            )
+            # Files written before the size table existed start from their current contents
+            conn.execute("INSERT OR IGNORE INTO analysis_cache_size SELECT 1, COALESCE(SUM(size), 0) FROM analysis_cache")
+            conn.commit()
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, value: str):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return json.loads(value)
+
+            conn = self._disk()
+            row = conn.execute("SELECT value FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self._remember(key, row[0])
+            self.stats["disk_hits"] += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, analysis: Dict):
+        value = json.dumps(analysis)
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, value)
+            conn = self._disk()
+            # Take the write lock before reading, so no other process changes the size in between
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = conn.execute("SELECT size FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time())
+                )
+                disk_bytes = self._add_disk_bytes(conn, size - (previous[0] if previous else 0))
+                if disk_bytes > self.max_bytes:
+                    self._evict(conn, disk_bytes)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self.stats["stores"] += 1
+
+    @staticmethod
+    def _add_disk_bytes(conn: sqlite3.Connection, delta: int) -> int:
+        conn.execute("UPDATE analysis_cache_size SET bytes = bytes + ? WHERE id = 1", (delta,))
+        return conn.execute("SELECT bytes FROM analysis_cache_size WHERE id = 1").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, disk_bytes: int):
+        """Drop least recently used entries until the disk tier is back under 90% of max_bytes"""
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        while disk_bytes - freed > target:
+            rows = conn.execute(
+                "SELECT key, size FROM analysis_cache ORDER BY last_access LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if disk_bytes - freed <= target:
+                    break
+                conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                freed += size
+                self.stats["evictions"] += 1
+        self._add_disk_bytes(conn, -freed)
+
+    def status(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            disk_bytes = self._disk().execute("SELECT bytes FROM analysis_cache_size WHERE id = 1").fetchone()[0]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "memory_items": len(self._memory),
+                "disk_bytes": disk_bytes,
+                "max_bytes": self.max_bytes,
+                "path": self.path
+            }
+
+analysis_cache = AnalysisCache() if ANALYSIS_CACHE_ENABLED else None
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, make_transient_to_detached
+from database import AnalysisResult, Conversation
+from services.insights import record_insights
+from services.response_cache import mark_data_changed
+
+def _insert_result(db: Session, values: Dict) -> Optional[int]:
+    """Insert an analysis result unless its conversation already has one. Returns the new id."""
+    table = AnalysisResult.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table).values(**values).on_conflict_do_nothing(
+            index_elements=["conversation_id"]
+        ).returning(table.c.id)
+        return db.execute(statement).scalar()
+
+    # Elsewhere the unique index still rejects a concurrent duplicate, at commit
+    if db.query(AnalysisResult.id).filter(AnalysisResult.conversation_id == values["conversation_id"]).first():
+        return None
+    return db.execute(insert(table).values(**values)).inserted_primary_key[0]
+
+def save_analysis(db: Session, conversation: Conversation, analysis: Dict) -> Optional[AnalysisResult]:
+    """Stage an AnalysisResult and its insight rows for a conversation (caller commits).
+
+    Returns None, staging nothing, when the conversation already has a result
+    (analyzed meanwhile by another request or job chunk).
+    """
+    values = {
+        "conversation_id": conversation.id,
+        "pain_points": analysis["pain_points"],
+        "media_consumption": analysis["media_consumption"],
+        "compelling_points": analysis["compelling_points"],
+        "summary": analysis["summary"],
+        "confidence_score": analysis.get("confidence_score", 0.0),
+        "created_at": datetime.utcnow(),
+    }
+    result_id = _insert_result(db, values)
+    if result_id is None:
+        return None
+    # The row was inserted in Core; attach it to the session without reading it back
+    analysis_result = AnalysisResult(id=result_id, **values)
+    make_transient_to_detached(analysis_result)
+    db.add(analysis_result)
+    record_insights(db, analysis_result, conversation.source)
+    mark_data_changed(db)
+    return analysis_result
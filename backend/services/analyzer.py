@@ -1,280 +1,190 @@
 import os
 import json
-import re
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from services.analysis_cache import analysis_cache, cache_key
+from services.chunking import chunk_transcript, merge_chunk_analyses
+from services.inference_workers import get_worker_pool, uses_inference_workers
+from services.metrics import ANALYSIS_CACHE_REQUESTS, ANALYZER_CHUNKS, ANALYZER_STAGE_SECONDS
+from services.prompts import PROMPT_VERSION
+from services.providers import load_provider
+
 load_dotenv()
 
-# Determine which provider to use
+# Determine which provider to use. Its module, and torch / transformers or the OpenAI
+# SDK behind it, is imported when the first analyzer is created rather than at startup.
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "huggingface").lower()
 
-if LLM_PROVIDER == "openai":
-    from openai import OpenAI
-elif LLM_PROVIDER == "huggingface":
-    try:
-        from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-        import torch
-    except ImportError:
-        print("Warning: Hugging Face transformers not installed. Install with: pip install transformers torch accelerate")
-        LLM_PROVIDER = None
+def resolve_model_name(provider: Optional[str] = None) -> Optional[str]:
+    """Return the configured model name for a provider (defaults to LLM_PROVIDER)"""
+    provider = provider or LLM_PROVIDER
+    if provider == "openai":
+        return os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
+    if provider == "huggingface":
+        return os.getenv("HUGGINGFACE_MODEL", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+    if provider == "stub":
+        from services.stub_llm import STUB_LLM_MODEL
+        return STUB_LLM_MODEL
+    return None
 
 class ConversationAnalyzer:
-    def __init__(self):
-        self.provider = LLM_PROVIDER
+    def __init__(self, provider: Optional[str] = None, model_name: Optional[str] = None,
+                 use_workers: Optional[bool] = None):
+        self.provider = provider or LLM_PROVIDER
+        if use_workers is None:
+            use_workers = uses_inference_workers(self.provider)
+        self.workers = None
+        self.llm = None
         
-        if self.provider == "openai":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY not found in environment variables. Set LLM_PROVIDER=openai and provide OPENAI_API_KEY")
-            self.client = OpenAI(api_key=api_key)
-            self.model = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
-            self.hf_model = None
-            self.hf_tokenizer = None
-            self.pipeline = None
-            
-        elif self.provider == "huggingface":
-            # Load Hugging Face model
-            import torch
-            model_name = os.getenv("HUGGINGFACE_MODEL", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            
-            print(f"Loading Hugging Face model: {model_name} on {device}")
-            
-            try:
-                # Use pipeline for easier text generation
-                self.pipeline = pipeline(
-                    "text-generation",
-                    model=model_name,
-                    tokenizer=model_name,
-                    device=0 if device == "cuda" else -1,
-                    torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-                    trust_remote_code=True,
-                    model_kwargs={"attn_implementation": "eager"}  # Fix for compatibility
-                )
-                self.model_name = model_name
-                print(f"Model {model_name} loaded successfully!")
-            except Exception as e:
-                print(f"Error loading model {model_name}: {e}")
-                print("Falling back to GPT-2...")
-                # Fallback to a smaller, more stable model
-                try:
-                    self.pipeline = pipeline(
-                        "text-generation",
-                        model="gpt2",
-                        device=-1,
-                        model_kwargs={"pad_token_id": 50256}
-                    )
-                    self.model_name = "gpt2"
-                    print("Using GPT-2 as fallback")
-                except Exception as fallback_error:
-                    raise ValueError(f"Could not load any Hugging Face model. Error: {fallback_error}")
-            
-            self.client = None
-            self.model = None
+        if use_workers:
+            # Thin client: INFERENCE_WORKERS processes own the model, chunk and generate;
+            # this process only checks the cache and dispatches
+            self.workers = get_worker_pool(self.provider, model_name or resolve_model_name(self.provider))
+            self.model_name = self.workers.model_name
         else:
-            raise ValueError(f"Invalid LLM_PROVIDER: {self.provider}. Use 'openai' or 'huggingface'")
+            self.llm = load_provider(self.provider)(model_name or resolve_model_name(self.provider))
+            # A Hugging Face model that fails to load falls back to GPT-2
+            self.model_name = self.llm.model_name
     
-    def _extract_json_from_text(self, text: str) -> Optional[Dict]:
-        """Extract JSON from text, handling cases where model adds extra text"""
-        # Try to find JSON object in the text
-        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except json.JSONDecodeError:
-                pass
-        
-        # If no JSON found, try parsing the whole text
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            return None
+    @property
+    def generation_stats(self) -> Optional[Dict]:
+        return self.llm.generation_stats if self.llm is not None else None
     
-    def _analyze_with_openai(self, transcript: str) -> Dict:
-        """Analyze using OpenAI"""
-        prompt = f"""Analyze the following customer conversation transcript and extract key insights. 
-Return a JSON object with the following structure:
-{{
-    "pain_points": [{{"point": "description", "severity": "high/medium/low"}}],
-    "media_consumption": [{{"name": "media source", "type": "podcast/blog/social/etc"}}],
-    "compelling_points": [{{"point": "what made them interested", "category": "feature/benefit/use_case"}}],
-    "summary": "brief 2-3 sentence summary of the conversation"
-}}
-
-Focus on:
-- Pain points: What problems, challenges, or frustrations did the customer mention?
-- Media consumption: What podcasts, blogs, social media, newsletters, or other media did they mention consuming or following?
-- Compelling points: What features, benefits, or aspects of the product/service seemed to interest or excite them?
-
-Transcript:
-{transcript[:8000]}
-
-Return ONLY valid JSON, no additional text."""
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an expert at analyzing customer conversations and extracting actionable insights. Always return valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        
-        result_text = response.choices[0].message.content
-        return json.loads(result_text)
+    @property
+    def inference_report(self) -> Optional[Dict]:
+        return self.llm.inference_report if self.llm is not None else None
     
-    def _analyze_with_huggingface(self, transcript: str) -> Dict:
-        """Analyze using Hugging Face model"""
-        # Create a detailed prompt
-        system_prompt = """You are an expert at analyzing customer conversations and extracting actionable insights. 
-Always return valid JSON without any additional text or explanation."""
-
-        user_prompt = f"""Analyze this customer conversation and return a JSON object with:
-{{
-    "pain_points": [{{"point": "description", "severity": "high/medium/low"}}],
-    "media_consumption": [{{"name": "media source", "type": "podcast/blog/social/etc"}}],
-    "compelling_points": [{{"point": "what made them interested", "category": "feature/benefit/use_case"}}],
-    "summary": "brief 2-3 sentence summary"
-}}
-
-Focus on:
-- Pain points: Problems, challenges, frustrations mentioned
-- Media consumption: Podcasts, blogs, social media, newsletters mentioned
-- Compelling points: Features, benefits, aspects that interested them
-
-Conversation:
-{transcript[:4000]}
-
-Return ONLY the JSON object:"""
-
-        # Format prompt based on model type
-        if "chat" in self.model_name.lower() or "tinyllama" in self.model_name.lower():
-            # Chat-based models (TinyLlama, etc.)
-            full_prompt = f"<|system|>\n{system_prompt}<|end|>\n<|user|>\n{user_prompt}<|end|>\n<|assistant|>\n"
-        elif "instruct" in self.model_name.lower() or "phi" in self.model_name.lower():
-            # Instruction-tuned models (Phi-3, etc.)
-            full_prompt = f"<|system|>\n{system_prompt}<|end|>\n<|user|>\n{user_prompt}<|end|>\n<|assistant|>\n"
-        elif "mistral" in self.model_name.lower() or "mixtral" in self.model_name.lower():
-            full_prompt = f"<s>[INST] {system_prompt}\n\n{user_prompt} [/INST]"
-        else:
-            # Generic format (GPT-2, etc.)
-            full_prompt = f"{system_prompt}\n\n{user_prompt}\n\nJSON Response:\n"
-
-        try:
-            # Generate response with compatibility fixes
-            generation_kwargs = {
-                "max_new_tokens": 800,
-                "temperature": 0.3,
-                "do_sample": True,
-                "top_p": 0.95,
-                "return_full_text": False,
-                "truncation": True,
-            }
-            
-            # Add pad_token_id if available
-            if hasattr(self.pipeline.tokenizer, 'pad_token_id') and self.pipeline.tokenizer.pad_token_id is not None:
-                generation_kwargs["pad_token_id"] = self.pipeline.tokenizer.pad_token_id
-            elif hasattr(self.pipeline.tokenizer, 'eos_token_id'):
-                generation_kwargs["pad_token_id"] = self.pipeline.tokenizer.eos_token_id
-            
-            outputs = self.pipeline(full_prompt, **generation_kwargs)
-            
-            generated_text = outputs[0]["generated_text"]
-            
-            # Extract JSON from response
-            result = self._extract_json_from_text(generated_text)
-            
-            if result is None:
-                # If JSON extraction failed, try to construct basic structure
-                return {
-                    "pain_points": [],
-                    "media_consumption": [],
-                    "compelling_points": [],
-                    "summary": generated_text[:500] if generated_text else "Analysis completed"
-                }
-            
-            return result
-            
-        except Exception as e:
-            print(f"Error in Hugging Face generation: {e}")
-            # Return fallback structure
-            return {
-                "pain_points": [],
-                "media_consumption": [],
-                "compelling_points": [],
-                "summary": f"Error during analysis: {str(e)}"
-            }
+    def _chunk(self, transcript: str) -> List[str]:
+        """Split a transcript on speaker turns into pieces that fit the model's context"""
+        return chunk_transcript(transcript, self.llm.token_counter, self.llm.chunk_tokens)
     
-    def analyze(self, transcript: str) -> Dict:
-        """
-        Analyze a conversation transcript and extract:
-        - Pain points
-        - Media consumption
-        - Compelling points
-        """
-        if not transcript or len(transcript.strip()) < 50:
-            return {
-                "pain_points": [],
-                "media_consumption": [],
-                "compelling_points": [],
-                "summary": "Transcript too short or empty",
-                "confidence_score": 0.0
-            }
-        
-        try:
-            # Use appropriate provider
-            if self.provider == "openai":
-                result = self._analyze_with_openai(transcript)
-            elif self.provider == "huggingface":
-                result = self._analyze_with_huggingface(transcript)
-            else:
-                raise ValueError(f"Unknown provider: {self.provider}")
-            
-            # Ensure all required fields exist
-            analysis_result = {
-                "pain_points": result.get("pain_points", []),
-                "media_consumption": result.get("media_consumption", []),
-                "compelling_points": result.get("compelling_points", []),
-                "summary": result.get("summary", "Analysis completed"),
-                "confidence_score": 0.85  # Default confidence
-            }
-            
-            # Calculate confidence based on extracted data
-            extracted_items = (
-                len(analysis_result["pain_points"]) +
-                len(analysis_result["media_consumption"]) +
-                len(analysis_result["compelling_points"])
-            )
-            
-            if extracted_items > 0:
-                analysis_result["confidence_score"] = min(0.95, 0.7 + (extracted_items * 0.05))
-            
-            return analysis_result
-            
-        except json.JSONDecodeError as e:
+    def _run_provider_batch(self, transcripts: List[str]) -> List:
+        """Raw provider output per transcript: a parsed dict, or the exception it raised"""
+        return self.llm.run_batch(transcripts)
+    
+    def _finalize_result(self, result) -> Dict:
+        """Normalize provider output into the stored analysis shape"""
+        if isinstance(result, json.JSONDecodeError):
             # Fallback if JSON parsing fails
             return {
                 "pain_points": [],
                 "media_consumption": [],
                 "compelling_points": [],
-                "summary": f"Error parsing analysis: {str(e)}",
+                "summary": f"Error parsing analysis: {str(result)}",
                 "confidence_score": 0.0
             }
-        except Exception as e:
+        if isinstance(result, Exception):
             # Fallback for any other errors
             return {
                 "pain_points": [],
                 "media_consumption": [],
                 "compelling_points": [],
-                "summary": f"Analysis error: {str(e)}",
+                "summary": f"Analysis error: {str(result)}",
                 "confidence_score": 0.0
             }
+        
+        # Ensure all required fields exist
+        analysis_result = {
+            "pain_points": result.get("pain_points", []),
+            "media_consumption": result.get("media_consumption", []),
+            "compelling_points": result.get("compelling_points", []),
+            "summary": result.get("summary", "Analysis completed"),
+            "confidence_score": 0.85  # Default confidence
+        }
+        
+        # Calculate confidence based on extracted data
+        extracted_items = (
+            len(analysis_result["pain_points"]) +
+            len(analysis_result["media_consumption"]) +
+            len(analysis_result["compelling_points"])
+        )
+        
+        if extracted_items > 0:
+            analysis_result["confidence_score"] = min(0.95, 0.7 + (extracted_items * 0.05))
+        
+        return analysis_result
+    
+    def analyze(self, transcript: str) -> Dict:
+        """
+        Analyze a conversation transcript and extract:
+        - Pain points
+        - Media consumption
+        - Compelling points
+        """
+        return self.analyze_batch([transcript])[0]
     
     def analyze_batch(self, transcripts: List[str]) -> List[Dict]:
-        """Analyze multiple transcripts"""
-        results = []
-        for transcript in transcripts:
-            results.append(self.analyze(transcript))
+        """Analyze multiple transcripts (concurrently where the provider supports it)"""
+        results: List[Optional[Dict]] = [None] * len(transcripts)
+        pending = []
+        for index, transcript in enumerate(transcripts):
+            if not transcript or len(transcript.strip()) < 50:
+                results[index] = {
+                    "pain_points": [],
+                    "media_consumption": [],
+                    "compelling_points": [],
+                    "summary": "Transcript too short or empty",
+                    "confidence_score": 0.0
+                }
+            else:
+                pending.append(index)
+        
+        # Serve repeats from the cache; identical transcripts in this batch are analyzed once
+        misses: Dict[str, List[int]] = {}
+        for index in pending:
+            key = cache_key(transcripts[index], PROMPT_VERSION, self.provider, self.model_name)
+            if key in misses:
+                misses[key].append(index)
+                ANALYSIS_CACHE_REQUESTS.inc(result="batch_duplicate")
+                continue
+            cached = analysis_cache.get(key) if analysis_cache else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                misses[key] = [index]
+            ANALYSIS_CACHE_REQUESTS.inc(result="miss" if cached is None else "hit")
+        
+        if misses:
+            keys = list(misses)
+            analyses = self._analyze_uncached([transcripts[misses[key][0]] for key in keys])
+            for key, (analysis, complete) in zip(keys, analyses):
+                # Errors (and partial results) are not cached so they are retried next time
+                if analysis_cache and complete:
+                    analysis_cache.set(key, analysis)
+                for index in misses[key]:
+                    results[index] = dict(analysis)
+        
         return results
+    
+    def _analyze_uncached(self, transcripts: List[str]) -> List[Tuple[Dict, bool]]:
+        """(analysis, whether every chunk succeeded) per transcript, bypassing the cache"""
+        if self.workers is not None:
+            try:
+                with ANALYZER_STAGE_SECONDS.time(provider=self.provider, stage="worker_roundtrip"):
+                    return self.workers.analyze(transcripts)
+            except Exception as e:
+                print(f"Error in inference worker: {e}")
+                return [(self._finalize_result(e), False) for _ in transcripts]
+        
+        # Map: every chunk of every transcript goes to the provider as one batch
+        with ANALYZER_STAGE_SECONDS.time(provider=self.provider, stage="chunk"):
+            chunks = [self._chunk(transcript) for transcript in transcripts]
+        flat = [chunk for transcript_chunks in chunks for chunk in transcript_chunks]
+        try:
+            flat_results = self._run_provider_batch(flat)
+        except Exception as e:
+            flat_results = [e] * len(flat)
+        
+        analyses = []
+        offset = 0
+        for transcript_chunks in chunks:
+            chunk_results = flat_results[offset:offset + len(transcript_chunks)]
+            offset += len(transcript_chunks)
+            # Reduce: merge what the chunks found; a transcript fails only if every chunk failed
+            succeeded = [raw for raw in chunk_results if not isinstance(raw, Exception)]
+            ANALYZER_CHUNKS.inc(len(succeeded), provider=self.provider, outcome="ok")
+            ANALYZER_CHUNKS.inc(len(chunk_results) - len(succeeded), provider=self.provider, outcome="error")
+            raw = merge_chunk_analyses(succeeded) if succeeded else chunk_results[0]
+            analyses.append((self._finalize_result(raw), len(succeeded) == len(chunk_results)))
+        return analyses
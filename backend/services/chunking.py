@@ -0,0 +1,174 @@
+import re
+from typing import Dict, List, Optional
+
+# Where a new speaker turn starts: "Customer: ...", "Sales Rep: ...", optionally
+# after a timestamp, at the start of a line or right after a sentence ends.
+# Exported call transcripts often put several turns on one line.
+TURN_START = re.compile(
+    r"(?:^|(?<=\n)|(?<=[.!?]\s)|(?<=[.!?][\"')\]]\s))"
+    r"(?=(?:\[?\d{1,2}:\d{2}(?::\d{2})?\]?\s+)?[A-Z][\w.'\-]*(?: [A-Za-z][\w.'\-]*){0,3}:\s)",
+    re.MULTILINE
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+PARAGRAPH = re.compile(r"\n\s*\n")
+
+class TokenCounter:
+    """Token counts from a real tokenizer (or a conservative estimate when none is available)"""
+
+    name = "chars"
+    chars_per_token = 3
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [-(-len(text) // self.chars_per_token) for text in texts]
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Hard-split text that has no usable boundaries into pieces of at most max_tokens"""
+        step = max_tokens * self.chars_per_token
+        return [text[start:start + step] for start in range(0, len(text), step)]
+
+class HuggingFaceTokenCounter(TokenCounter):
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.name = f"hf:{getattr(tokenizer, 'name_or_path', '')}"
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return [self.tokenizer.decode(ids[start:start + max_tokens]) for start in range(0, len(ids), max_tokens)]
+
+class TiktokenCounter(TokenCounter):
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = f"tiktoken:{encoding.name}"
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [len(ids) for ids in self.encoding.encode_ordinary_batch(texts)]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        ids = self.encoding.encode_ordinary(text)
+        return [self.encoding.decode(ids[start:start + max_tokens]) for start in range(0, len(ids), max_tokens)]
+
+def openai_token_counter(model: str) -> TokenCounter:
+    """tiktoken encoding for an OpenAI model; a 3-characters-per-token estimate if tiktoken is missing"""
+    try:
+        import tiktoken
+    except ImportError:
+        return TokenCounter()
+    try:
+        return TiktokenCounter(tiktoken.encoding_for_model(model))
+    except KeyError:
+        return TiktokenCounter(tiktoken.get_encoding("cl100k_base"))
+
+def split_turns(transcript: str) -> List[str]:
+    """Split a transcript into speaker turns; paragraphs/lines when there are no speaker labels"""
+    starts = [match.start() for match in TURN_START.finditer(transcript)]
+    if len(starts) > 1:
+        if starts[0] != 0:
+            starts.insert(0, 0)
+        pieces = [transcript[start:end] for start, end in zip(starts, starts[1:] + [len(transcript)])]
+    elif PARAGRAPH.search(transcript):
+        pieces = PARAGRAPH.split(transcript)
+    else:
+        pieces = transcript.splitlines()
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+def _pack(pieces: List[str], counts: List[int], budget: int, separator: str) -> List[str]:
+    """Greedily join consecutive pieces into chunks of at most budget tokens"""
+    chunks, current, used = [], [], 0
+    for piece, count in zip(pieces, counts):
+        # +1 for the separator between pieces
+        if current and used + count + 1 > budget:
+            chunks.append(separator.join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += count + 1
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def chunk_transcript(transcript: str, counter: TokenCounter, budget: int) -> List[str]:
+    """Split a transcript into chunks of at most budget tokens, breaking only between speaker turns.
+
+    A turn longer than the budget on its own is split between sentences, and
+    only a sentence longer than the budget is cut mid-text.
+    """
+    budget = max(16, budget)
+    if counter.count(transcript) <= budget:
+        return [transcript]
+
+    pieces: List[str] = []
+    turns = split_turns(transcript)
+    for turn, count in zip(turns, counter.count_many(turns)):
+        if count <= budget:
+            pieces.append(turn)
+            continue
+        sentences = [s for s in SENTENCE_END.split(turn) if s]
+        for sentence, sentence_count in zip(sentences, counter.count_many(sentences)):
+            if sentence_count <= budget:
+                pieces.append(sentence)
+            else:
+                pieces.extend(counter.split(sentence, budget))
+
+    # Pieces were re-measured individually; joining adds at most a token per boundary
+    return _pack(pieces, counter.count_many(pieces), budget, "\n")
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+# Analysis list field -> keys that hold an item's text
+MERGE_FIELDS = {
+    "pain_points": ("point", "text"),
+    "media_consumption": ("name", "source"),
+    "compelling_points": ("point", "text"),
+}
+
+def _dedupe_key(item, text_keys) -> str:
+    if isinstance(item, dict):
+        text = item.get(text_keys[0], item.get(text_keys[1], ""))
+    else:
+        text = item
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).casefold()).split())
+
+def merge_chunk_analyses(analyses: List[Dict]) -> Dict:
+    """Combine per-chunk analyses of one transcript, de-duplicating insights across chunks.
+
+    Duplicates keep their first wording; a pain point keeps the highest severity
+    any chunk gave it. Chunk summaries are joined in transcript order.
+    """
+    if len(analyses) == 1:
+        return analyses[0]
+
+    merged: Dict = {}
+    for field, text_keys in MERGE_FIELDS.items():
+        items: Dict[str, object] = {}
+        for analysis in analyses:
+            for item in analysis.get(field) or []:
+                key = _dedupe_key(item, text_keys)
+                if not key:
+                    continue
+                existing = items.get(key)
+                if existing is None:
+                    items[key] = dict(item) if isinstance(item, dict) else item
+                elif isinstance(existing, dict) and isinstance(item, dict) and "severity" in item:
+                    current = SEVERITY_RANK.get(str(existing.get("severity", "")).lower(), -1)
+                    if SEVERITY_RANK.get(str(item["severity"]).lower(), -1) > current:
+                        existing["severity"] = item["severity"]
+        merged[field] = list(items.values())
+
+    summaries = [str(analysis.get("summary")).strip() for analysis in analyses if analysis.get("summary")]
+    merged["summary"] = " ".join(summaries) if summaries else "Analysis completed"
+    return merged
+
+def chunk_budget(context_tokens: int, prompt_tokens: int, response_tokens: int,
+                 max_chunk_tokens: Optional[int] = None) -> int:
+    """Transcript tokens that fit next to the prompt and the reserved response"""
+    budget = context_tokens - prompt_tokens - response_tokens
+    if max_chunk_tokens:
+        budget = min(budget, max_chunk_tokens)
+    return max(16, budget)
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import torch
+
+# "none", "bf16" (bfloat16 weights) or "dynamic"/"int8" (dynamic int8 quantization of Linear layers)
+HUGGINGFACE_QUANTIZATION = os.getenv("HUGGINGFACE_QUANTIZATION", "none").lower()
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+
+QUANTIZATION_MODES = ("none", "bf16", "dynamic", "int8")
+
+_threads_lock = threading.Lock()
+_threads_configured = False
+
+def configure_threads():
+    """Apply TORCH_NUM_THREADS / TORCH_INTEROP_THREADS once per process"""
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        _threads_configured = True
+        if TORCH_NUM_THREADS > 0:
+            torch.set_num_threads(TORCH_NUM_THREADS)
+        if TORCH_INTEROP_THREADS > 0:
+            try:
+                torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+            except RuntimeError as e:
+                # Only settable before the first parallel op in the process
+                print(f"Could not set interop threads: {e}")
+
+def load_dtype(mode: str = HUGGINGFACE_QUANTIZATION) -> torch.dtype:
+    """Weight dtype to load a CPU model in"""
+    return torch.bfloat16 if mode == "bf16" else torch.float32
+
+def quantize_model(model, mode: str = HUGGINGFACE_QUANTIZATION):
+    """Apply post-load quantization in place and return the model"""
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Invalid HUGGINGFACE_QUANTIZATION: {mode}. Use one of {', '.join(QUANTIZATION_MODES)}")
+    if mode in ("dynamic", "int8"):
+        # int8 weights, activations quantized on the fly; Linear layers are nearly all of the compute
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+def resident_memory_mb() -> Optional[float]:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak, not current: kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        return None
+
+def measure_tokens_per_second(model, tokenizer, prompt: str, new_tokens: int = 16) -> Optional[float]:
+    """Greedy decode speed for a short generation (None if the model cannot generate this way)"""
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    with torch.inference_mode():
+        start = time.perf_counter()
+        try:
+            model.generate(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.pad_token_id,
+            )
+        except Exception as e:
+            print(f"Could not measure generation speed: {e}")
+            return None
+        elapsed = time.perf_counter() - start
+    return round(new_tokens / elapsed, 2)
+
+def inference_report(model, tokenizer, prompt: str, mode: str = HUGGINGFACE_QUANTIZATION) -> Dict:
+    return {
+        "quantization": mode,
+        "threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "rss_mb": resident_memory_mb(),
+        "tokens_per_second": measure_tokens_per_second(model, tokenizer, prompt),
+    }
@@ -0,0 +1,118 @@
+import hashlib
+import importlib.util
+import os
+import re
+import threading
+from typing import List
+
+import numpy as np
+
+# "auto" uses sentence-transformers when it is installed, otherwise the hashing embedder
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "auto").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+HASHING_EMBEDDING_DIM = 512
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to too was were "
+    "with we our they them very really lot lots".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _stem(word: str) -> str:
+    # Crude suffix stripping so "delays"/"delayed"/"delaying" land in the same bucket
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+class HashingEmbedder:
+    """Dependency-free embedder: hashed word and character trigram features.
+
+    Order-insensitive, so "slow onboarding" and "onboarding is slow" map to the
+    same vector; it does not know synonyms the way a sentence model does.
+    """
+
+    default_threshold = 0.6
+
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = [_stem(w) for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+        features = [f"w:{w}" for w in words]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                # Whole words weigh more than the trigrams that spell them
+                weight = 2.0 if feature.startswith("w:") else 0.5
+                vectors[row, value % self.dim] += weight if value >> 63 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+class SentenceTransformerEmbedder:
+    """Small CPU sentence-embedding model (all-MiniLM-L6-v2 by default)"""
+
+    default_threshold = 0.75
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """Process-wide embedder, loaded on first use"""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = _load_embedder(EMBEDDING_BACKEND)
+        return _embedder
+
+def configured_embedder_name() -> str:
+    """Name of the embedder get_embedder() returns, found without loading a model"""
+    if _embedder is not None:
+        return _embedder.name
+    if EMBEDDING_BACKEND == "sentence-transformers" or (
+        EMBEDDING_BACKEND == "auto" and importlib.util.find_spec("sentence_transformers") is not None
+    ):
+        return f"st-{EMBEDDING_MODEL}"
+    return HashingEmbedder().name
+
+def embedder_loaded() -> bool:
+    return _embedder is not None
+
+def _load_embedder(backend: str):
+    if backend in ("auto", "sentence-transformers"):
+        try:
+            embedder = SentenceTransformerEmbedder()
+            print(f"Loaded embedding model {EMBEDDING_MODEL} ({embedder.dim} dims)")
+            return embedder
+        except Exception as e:
+            if backend == "sentence-transformers":
+                raise
+            if not isinstance(e, ImportError):
+                print(f"Could not load embedding model {EMBEDDING_MODEL}, using hashing embedder: {e}")
+    return HashingEmbedder()
@@ -0,0 +1,337 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from typing import Dict, List, Optional, Tuple
+
+from services.metrics import registry as metrics_registry
+
+# Local generation in separate processes: each worker loads its own model and the
+# API process's ConversationAnalyzer only chunks, caches and dispatches.
+INFERENCE_WORKERS = max(0, int(os.getenv("INFERENCE_WORKERS", "0")))
+INFERENCE_WORKER_START_TIMEOUT = float(os.getenv("INFERENCE_WORKER_START_TIMEOUT", "600"))
+INFERENCE_WORKER_HEARTBEAT = float(os.getenv("INFERENCE_WORKER_HEARTBEAT", "5"))
+# A loaded worker silent for this long is considered hung and restarted
+INFERENCE_WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("INFERENCE_WORKER_HEARTBEAT_TIMEOUT", "60"))
+# Times a request is sent to another worker after the one running it died
+INFERENCE_WORKER_RETRIES = max(0, int(os.getenv("INFERENCE_WORKER_RETRIES", "1")))
+
+# OpenAI calls are network bound and already concurrent inside one process
+WORKER_PROVIDERS = ("huggingface",)
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+def uses_inference_workers(provider: Optional[str]) -> bool:
+    return INFERENCE_WORKERS > 0 and provider in WORKER_PROVIDERS
+
+def _worker_main(provider: str, model_name: Optional[str], connection, threads: int):
+    """Worker process: load one analyzer, then analyze whatever arrives on the connection"""
+    # N workers each using every core would only fight over them
+    os.environ.setdefault("TORCH_NUM_THREADS", str(threads))
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            connection.send(message)
+
+    try:
+        from services.analyzer import ConversationAnalyzer
+        analyzer = ConversationAnalyzer(provider=provider, model_name=model_name, use_workers=False)
+    except Exception as e:
+        send(("failed", repr(e)))
+        return
+
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(INFERENCE_WORKER_HEARTBEAT):
+            try:
+                send(("heartbeat", None))
+            except OSError:
+                return
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    send(("ready", {
+        "pid": os.getpid(),
+        "model_name": analyzer.model_name,
+        "inference": getattr(analyzer, "inference_report", None),
+    }))
+    # Stage timings and counters recorded here are merged into the API process's registry
+    send(("metrics", metrics_registry.take_delta()))
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        task_id, transcripts = message
+        try:
+            analyses = analyzer._analyze_uncached(transcripts)
+        except Exception as e:
+            send(("metrics", metrics_registry.take_delta()))
+            send(("error", (task_id, repr(e))))
+            continue
+        # Metrics first, so they are merged by the time the caller sees the result
+        send(("metrics", metrics_registry.take_delta()))
+        send(("result", (task_id, analyses, getattr(analyzer, "generation_stats", None))))
+    stopped.set()
+
+class _Task:
+    def __init__(self, transcripts: List[str]):
+        self.transcripts = transcripts
+        self.future: Future = Future()
+        self.attempts = 0
+
+class _Worker:
+    def __init__(self, index: int, process, connection):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.state = "starting"  # starting | ready | failed
+        self.error: Optional[str] = None
+        self.info: Dict = {}
+        self.tasks: Dict[int, _Task] = {}
+        self.served = 0
+        self.generation_stats: Optional[Dict] = None
+        self.started_at = time.monotonic()
+        self.last_seen = self.started_at
+        self.send_lock = threading.Lock()
+
+class InferenceWorkerPool:
+    """N model-owning worker processes behind least-loaded routing, with health checks and restarts"""
+
+    def __init__(self, provider: str, model_name: Optional[str], workers: int = INFERENCE_WORKERS):
+        self.provider = provider
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.restarts = 0
+        # spawn, not fork: a forked copy of a process that already imported torch can deadlock
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def _spawn(self, index: int) -> _Worker:
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.provider, self.model_name, child_connection, self.threads),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        # The parent sees EOF on its end once the child's copy is the only one and the child exits
+        child_connection.close()
+        return _Worker(index, process, parent_connection)
+
+    def start(self):
+        """Start every worker and wait until all have loaded their model"""
+        start = time.perf_counter()
+        self._workers = [self._spawn(index) for index in range(self.workers)]
+        threading.Thread(target=self._collect, daemon=True, name="inference-worker-collector").start()
+
+        deadline = time.monotonic() + INFERENCE_WORKER_START_TIMEOUT
+        while True:
+            with self._lock:
+                states = [worker.state for worker in self._workers]
+                errors = [worker.error for worker in self._workers if worker.error]
+            if errors:
+                self.shutdown()
+                raise RuntimeError(f"Inference worker failed to load: {errors[0]}")
+            if all(state == "ready" for state in states):
+                break
+            if time.monotonic() > deadline:
+                self.shutdown()
+                raise TimeoutError(f"Inference workers did not load within {INFERENCE_WORKER_START_TIMEOUT:.0f}s")
+            time.sleep(0.05)
+
+        # The model actually loaded (e.g. the GPT-2 fallback) is what results are cached under
+        self.model_name = self._workers[0].info.get("model_name", self.model_name)
+        self._started = True
+        print(f"Started {self.workers} inference worker(s) in {time.perf_counter() - start:.2f}s "
+              f"({self.threads} torch threads each)")
+
+    def submit(self, transcripts: List[str]) -> Future:
+        task = _Task(transcripts)
+        self._dispatch(task)
+        return task.future
+
+    def analyze(self, transcripts: List[str]) -> List[Tuple[Dict, bool]]:
+        return self.submit(transcripts).result()
+
+    def _dispatch(self, task: _Task):
+        with self._lock:
+            candidates = [worker for worker in self._workers if worker.state != "failed"]
+            if not candidates:
+                task.future.set_exception(WorkerCrashed("No inference worker is available"))
+                return
+            # Least loaded first; a worker still loading only gets work when every loaded one is busier
+            worker = min(candidates, key=lambda w: (len(w.tasks), w.state != "ready"))
+            task_id = next(self._task_ids)
+            worker.tasks[task_id] = task
+            task.attempts += 1
+        try:
+            with worker.send_lock:
+                worker.connection.send((task_id, task.transcripts))
+        except (OSError, ValueError):
+            # The collector notices the worker is gone and re-dispatches its tasks
+            pass
+
+    def _collect(self):
+        """Read worker messages, detect dead or hung workers and replace them"""
+        while not self._closed:
+            with self._lock:
+                by_connection = {worker.connection: worker for worker in self._workers}
+            try:
+                ready = wait(list(by_connection), timeout=INFERENCE_WORKER_HEARTBEAT)
+            except (OSError, ValueError):
+                # A connection was closed by a shutdown or restart in another thread
+                continue
+            for connection in ready:
+                worker = by_connection[connection]
+                try:
+                    kind, payload = connection.recv()
+                except (EOFError, OSError):
+                    if not self._closed:
+                        self._replace(worker, "exited")
+                    continue
+                self._handle(worker, kind, payload)
+            if not self._closed:
+                self._check_health()
+
+    def _handle(self, worker: _Worker, kind: str, payload):
+        if kind == "metrics":
+            metrics_registry.merge(payload)
+        with self._lock:
+            worker.last_seen = time.monotonic()
+            if kind == "ready":
+                worker.state = "ready"
+                worker.info = payload
+                return
+            if kind == "failed":
+                worker.state = "failed"
+                worker.error = payload
+                print(f"Inference worker {worker.index} failed to load: {payload}")
+                return
+            if kind not in ("result", "error"):
+                return
+            task = worker.tasks.pop(payload[0], None)
+            if kind == "result":
+                worker.served += 1
+                worker.generation_stats = payload[2]
+        if task is None:
+            return
+        if kind == "result":
+            task.future.set_result(payload[1])
+        else:
+            task.future.set_exception(RuntimeError(f"Inference worker error: {payload[1]}"))
+
+    def _check_health(self):
+        now = time.monotonic()
+        for worker in list(self._workers):
+            if not worker.process.is_alive():
+                self._replace(worker, f"exited with code {worker.process.exitcode}")
+            elif worker.state == "ready" and now - worker.last_seen > INFERENCE_WORKER_HEARTBEAT_TIMEOUT:
+                self._replace(worker, "stopped responding")
+            elif worker.state == "starting" and now - worker.started_at > INFERENCE_WORKER_START_TIMEOUT:
+                self._replace(worker, "did not finish loading")
+
+    def _replace(self, worker: _Worker, reason: str):
+        """Kill a worker, start a new one in its slot and re-dispatch (or fail) its tasks"""
+        if not self._started:
+            # During start() a dead worker is a load failure, not something to retry
+            with self._lock:
+                worker.state = "failed"
+                worker.error = worker.error or reason
+            return
+        print(f"Inference worker {worker.index} (pid {worker.process.pid}) {reason}; restarting")
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.connection.close()
+        replacement = self._spawn(worker.index)
+        with self._lock:
+            tasks = list(worker.tasks.values())
+            worker.tasks.clear()
+            self._workers[worker.index] = replacement
+            self.restarts += 1
+        for task in tasks:
+            if task.attempts > INFERENCE_WORKER_RETRIES:
+                task.future.set_exception(WorkerCrashed(f"Inference worker {reason} while analyzing"))
+            else:
+                # Sending blocks until the new worker has loaded and reads it; the collector must not wait
+                threading.Thread(target=self._dispatch, args=(task,), daemon=True).start()
+
+    def generation_totals(self) -> Tuple[int, int]:
+        """Generations and generated tokens across the current worker processes"""
+        stats = [worker.generation_stats or {} for worker in self._workers]
+        return sum(s.get("generations", 0) for s in stats), sum(s.get("generated_tokens", 0) for s in stats)
+
+    def inference_report(self) -> Optional[Dict]:
+        for worker in self._workers:
+            if worker.state == "ready":
+                return worker.info.get("inference")
+        return None
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            processes = [{
+                "index": worker.index,
+                "pid": worker.process.pid,
+                "state": worker.state,
+                "in_flight": len(worker.tasks),
+                "served": worker.served,
+                "seconds_since_heartbeat": round(now - worker.last_seen, 1),
+            } for worker in self._workers]
+        return {"workers": self.workers, "threads_per_worker": self.threads,
+                "restarts": self.restarts, "processes": processes}
+
+    def shutdown(self):
+        self._closed = True
+        for worker in self._workers:
+            try:
+                with worker.send_lock:
+                    worker.connection.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.connection.close()
+            with self._lock:
+                tasks = list(worker.tasks.values())
+                worker.tasks.clear()
+            for task in tasks:
+                task.future.set_exception(WorkerCrashed("Inference workers shut down"))
+
+_pools: Dict[Tuple[str, Optional[str]], InferenceWorkerPool] = {}
+_pools_lock = threading.Lock()
+
+def get_worker_pool(provider: str, model_name: Optional[str]) -> InferenceWorkerPool:
+    """Return the started worker pool for provider/model (started on first use)"""
+    key = (provider, model_name)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = InferenceWorkerPool(provider, model_name)
+            pool.start()
+            _pools[key] = pool
+    return pool
+
+def shutdown_worker_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
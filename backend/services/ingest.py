@@ -0,0 +1,330 @@
+import io
+import json
+import os
+import uuid
+from datetime import datetime
+from itertools import repeat
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import String, bindparam, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Conversation
+from services.metrics import DB_COMMIT_SECONDS
+from services.response_cache import mark_data_changed
+from services.search import deferred_conversation_index
+from services.transcript_store import blob_store_enabled, encode_batch, insert_blobs
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Rows parsed, de-duplicated and committed together. Memory use is bounded by
+# this, not by the size of the uploaded file.
+UPLOAD_BATCH_SIZE = max(1, int(os.getenv("UPLOAD_BATCH_SIZE", "1000")))
+JSON_READ_SIZE = 1 << 16
+# Largest single JSON item (array element or line) buffered while decoding; a
+# malformed item fails here instead of pulling the rest of the upload into memory
+JSON_MAX_ITEM_CHARS = max(JSON_READ_SIZE, int(os.getenv("JSON_MAX_ITEM_CHARS", str(64 << 20))))
+BATCH_COLUMNS = ("conversation_id", "transcript", "additional_data")
+MAX_REPORTED_ERRORS = 100
+
+class IngestError(ValueError):
+    """The upload as a whole is unusable (missing column, malformed JSON)"""
+
+class IngestStats:
+    def __init__(self):
+        self.uploaded = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors: List[str] = []
+
+    def add_error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def to_dict(self) -> Dict:
+        errors = self.errors
+        if self.error_count > len(errors):
+            errors = errors + [f"... and {self.error_count - len(errors)} more errors"]
+        return {
+            "message": f"Successfully uploaded {self.uploaded} conversations. Skipped {self.skipped} existing conversations.",
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "errors": errors if errors else None
+        }
+
+def _generated_id(source: str) -> str:
+    return f"{source}_{uuid.uuid4().hex[:8]}"
+
+def _metadata_json(frame: "pd.DataFrame") -> List[str]:
+    """Serialize metadata columns to one JSON object per row, column-wise (missing values become null)"""
+    if frame.shape[1] == 0:
+        return ["{}"] * len(frame)
+    as_text = frame.astype(str).astype(object).where(frame.notna().to_numpy(), None)
+    return as_text.to_json(orient="records", lines=True).splitlines()
+
+def iter_csv_batches(fileobj: BinaryIO, source: str, chunk_rows: int = UPLOAD_BATCH_SIZE) -> Iterator[Dict[str, List]]:
+    """Yield column-oriented batches of conversations from a CSV, reading chunk_rows rows at a time"""
+    # pandas (and numpy) load with the first CSV upload rather than at startup
+    import numpy as np
+    import pandas as pd
+    reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+    for chunk in reader:
+        # Expected columns: transcript, conversation_id (optional), metadata (optional)
+        if "transcript" not in chunk.columns:
+            raise IngestError("CSV must contain 'transcript' column")
+        metadata_columns = [col for col in chunk.columns if col not in ["transcript", "conversation_id"]]
+
+        if "conversation_id" in chunk.columns:
+            raw_ids = chunk["conversation_id"]
+            missing = (raw_ids.isna() | (raw_ids.astype(str) == "")).to_numpy()
+            conversation_ids = raw_ids.astype(str).to_numpy(dtype=object)
+        else:
+            missing = np.ones(len(chunk), dtype=bool)
+            conversation_ids = np.empty(len(chunk), dtype=object)
+        conversation_ids[missing] = [_generated_id(source) for _ in range(int(missing.sum()))]
+
+        yield {
+            "conversation_id": conversation_ids.tolist(),
+            "transcript": chunk["transcript"].astype(str).tolist(),
+            "additional_data": _metadata_json(chunk[metadata_columns])
+        }
+
+def iter_json_values(fileobj: BinaryIO, read_size: int = JSON_READ_SIZE,
+                     max_item_chars: int = JSON_MAX_ITEM_CHARS) -> Iterator:
+    """Incrementally decode a JSON array, a single JSON value, or JSON Lines / concatenated values"""
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8")
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = stream.read(read_size)
+        if not chunk:
+            eof = True
+            return False
+        # Drop what has already been decoded so the buffer stays about one item long
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(chars: str) -> Optional[str]:
+        """Advance past whitespace/separators; return the next character or None at end of input"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return None
+
+    def decode(json_lines: bool = False):
+        nonlocal pos
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                return value
+            except json.JSONDecodeError as e:
+                # Usually just an item split across reads; fatal once input is exhausted,
+                # once the item outgrows the buffer cap, or (JSON Lines) once its line is complete
+                if json_lines and buffer.find("\n", pos) != -1:
+                    raise IngestError(f"Invalid JSON line: {e}")
+                if len(buffer) - pos > max_item_chars:
+                    raise IngestError(f"Invalid JSON: item longer than {max_item_chars} characters ({e})")
+                if eof or not fill():
+                    raise IngestError(f"Invalid JSON: {e}")
+
+    try:
+        first = skip(" \t\r\n")
+        if first is None:
+            return
+        if first == "[":
+            pos += 1
+            while True:
+                next_char = skip(" \t\r\n,")
+                if next_char is None:
+                    raise IngestError("Invalid JSON: unterminated array")
+                if next_char == "]":
+                    pos += 1
+                    if skip(" \t\r\n") is not None:
+                        raise IngestError("Invalid JSON: data after the top-level array")
+                    return
+                yield decode()
+        else:
+            start = pos
+            value = decode()
+            # A first value on a line of its own makes this JSON Lines: one value per line
+            json_lines = "\n" not in buffer[start:pos]
+            yield value
+            while skip(" \t\r\n") is not None:
+                yield decode(json_lines)
+    finally:
+        # Leave the underlying upload file open for the caller
+        stream.detach()
+
+def iter_json_records(fileobj: BinaryIO, source: str, stats: IngestStats) -> Iterator[Dict]:
+    """Yield conversation records from a JSON array, single object or JSON Lines upload"""
+    for idx, item in enumerate(iter_json_values(fileobj)):
+        try:
+            if not isinstance(item, dict):
+                stats.add_error(f"Item {idx}: Expected an object")
+                continue
+            transcript = item.get("transcript") or item.get("text") or item.get("content")
+            if not transcript:
+                stats.add_error(f"Item {idx}: Missing transcript field")
+                continue
+            yield {
+                "conversation_id": item.get("conversation_id") or _generated_id(source),
+                "transcript": str(transcript),
+                # Metadata is everything except transcript and conversation_id
+                "additional_data": json.dumps({k: v for k, v in item.items() if k not in ["transcript", "text", "content", "conversation_id"]})
+            }
+        except Exception as e:
+            stats.add_error(f"Item {idx}: {str(e)}")
+
+def _batched(records: Iterable[Dict], size: int) -> Iterator[Dict[str, List]]:
+    """Group row records into column-oriented batches of at most size rows"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield {column: [record[column] for record in batch] for column in BATCH_COLUMNS}
+            batch = []
+    if batch:
+        yield {column: [record[column] for record in batch] for column in BATCH_COLUMNS}
+
+_compiled_inserts: Dict[str, object] = {}
+
+def _compiled_insert(dialect):
+    """Core INSERT, compiled once per dialect, that leaves existing conversation_ids alone"""
+    # Keyed by driver too: paramstyles differ (e.g. psycopg2 vs asyncpg)
+    key = f"{dialect.name}+{dialect.driver}"
+    compiled = _compiled_inserts.get(key)
+    if compiled is None:
+        if dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            dialect_insert = insert
+        statement = dialect_insert(Conversation.__table__).values(
+            conversation_id=bindparam("conversation_id"),
+            source=bindparam("source"),
+            transcript=bindparam("transcript"),
+            transcript_hash=bindparam("transcript_hash"),
+            # Metadata arrives as JSON text already, so it is bound as plain text
+            additional_data=bindparam("additional_data", type_=String),
+            created_at=bindparam("created_at")
+        )
+        if dialect.name in ("sqlite", "postgresql"):
+            statement = statement.on_conflict_do_nothing(index_elements=["conversation_id"])
+        compiled = statement.compile(dialect=dialect)
+        _compiled_inserts[key] = compiled
+    return compiled
+
+def _insert_batch(db: Session, batch: Dict[str, List], source: str, stats: IngestStats):
+    connection = db.connection()
+    dialect = connection.dialect
+    total = len(batch["conversation_id"])
+
+    if dialect.name != "sqlite":
+        # One query per batch for conversations that already exist; SQLite's
+        # ON CONFLICT rowcount already tells us how many were skipped
+        existing_ids = {
+            row[0] for row in db.query(Conversation.conversation_id)
+            .filter(Conversation.conversation_id.in_(batch["conversation_id"]))
+            .all()
+        }
+        keep = []
+        for index, conversation_id in enumerate(batch["conversation_id"]):
+            # Also catches the same id repeated within this batch
+            if conversation_id not in existing_ids:
+                existing_ids.add(conversation_id)
+                keep.append(index)
+        batch = {column: [values[index] for index in keep] for column, values in batch.items()}
+
+    inserted = 0
+    count = len(batch["conversation_id"])
+    blobs = batch.pop("transcript_blob", None)
+    if count:
+        if blobs:
+            # Before the conversations: the search index trigger reads their text from the blob
+            insert_blobs(connection, [blob for blob in blobs if blob is not None])
+        # Values shared by the whole batch go through the column's bind processor once
+        created_at = datetime.utcnow()
+        processor = Conversation.__table__.c.created_at.type.dialect_impl(dialect).bind_processor(dialect)
+        columns = {
+            "transcript_hash": repeat(None, count),
+            **batch,
+            "source": repeat(source, count),
+            "created_at": repeat(processor(created_at) if processor else created_at, count)
+        }
+
+        # executemany straight to the driver: no per-row ORM objects, unit-of-work
+        # bookkeeping or per-row parameter processing
+        compiled = _compiled_insert(dialect)
+        if compiled.positional:
+            params = list(zip(*(columns[name] for name in compiled.positiontup)))
+        else:
+            names = list(columns)
+            params = [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+        # The batch is indexed for search in one statement rather than by a trigger per row
+        with deferred_conversation_index(connection):
+            result = connection.exec_driver_sql(str(compiled), params)
+        inserted = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else count
+        if inserted:
+            mark_data_changed(db)
+    with DB_COMMIT_SECONDS.time(operation="upload_batch"):
+        db.commit()
+    stats.uploaded += inserted
+    stats.skipped += total - inserted
+
+def ingest_batches(db: Session, batches: Iterable[Dict[str, List]], source: str, stats: IngestStats) -> IngestStats:
+    """Insert record batches, committing each batch before reading the next"""
+    if blob_store_enabled(db.get_bind().dialect.name):
+        batches = map(encode_batch, batches)
+    for batch in batches:
+        try:
+            _insert_batch(db, batch, source, stats)
+        except Exception:
+            db.rollback()
+            raise
+    return stats
+
+async def ingest_batches_async(db: AsyncSession, batches: Iterable[Dict[str, List]], source: str,
+                               stats: IngestStats) -> IngestStats:
+    """ingest_batches for request handlers: parsing runs in a worker thread, the
+    de-duplication and inserts on the AsyncSession, so the event loop never blocks"""
+    if blob_store_enabled(db.get_bind().dialect.name):
+        # Hashing and compression run with the parsing, in the worker thread
+        batches = map(encode_batch, batches)
+    iterator = iter(batches)
+    while True:
+        batch = await run_in_threadpool(next, iterator, None)
+        if batch is None:
+            return stats
+        try:
+            await db.run_sync(_insert_batch, batch, source, stats)
+        except Exception:
+            await db.rollback()
+            raise
+
+def ingest_csv(db: Session, fileobj: BinaryIO, source: str, stats: IngestStats) -> IngestStats:
+    return ingest_batches(db, iter_csv_batches(fileobj, source), source, stats)
+
+def ingest_json(db: Session, fileobj: BinaryIO, source: str, stats: IngestStats) -> IngestStats:
+    records = iter_json_records(fileobj, source, stats)
+    return ingest_batches(db, _batched(records, UPLOAD_BATCH_SIZE), source, stats)
+
+async def ingest_csv_async(db: AsyncSession, fileobj: BinaryIO, source: str, stats: IngestStats) -> IngestStats:
+    return await ingest_batches_async(db, iter_csv_batches(fileobj, source), source, stats)
+
+async def ingest_json_async(db: AsyncSession, fileobj: BinaryIO, source: str, stats: IngestStats) -> IngestStats:
+    records = iter_json_records(fileobj, source, stats)
+    return await ingest_batches_async(db, _batched(records, UPLOAD_BATCH_SIZE), source, stats)
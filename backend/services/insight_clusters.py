@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from services.embeddings import configured_embedder_name, get_embedder
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+INSIGHT_CLUSTERING_ENABLED = os.getenv("INSIGHT_CLUSTERING_ENABLED", "true").lower() == "true"
+INSIGHT_INDEX_DIR = os.getenv("INSIGHT_INDEX_DIR", "./insight_index")
+# Cosine similarity needed to join an existing cluster (default depends on the embedder)
+INSIGHT_CLUSTER_THRESHOLD = float(os.getenv("INSIGHT_CLUSTER_THRESHOLD", "0")) or None
+
+# Random-hyperplane LSH: each table hashes a centroid to LSH_BITS sign bits
+LSH_TABLES = 8
+LSH_BITS = 12
+# Below this many clusters a brute-force scan is cheaper than probing buckets
+EXACT_SEARCH_MAX = 4096
+INITIAL_CAPACITY = 1024
+
+@contextmanager
+def _file_lock(path: str):
+    """Serialize index writers across processes (worker pools share the files)"""
+    with open(path, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+class ClusterIndex:
+    """Incremental clustering of one insight kind.
+
+    Cluster centroids live in a memory-mapped float32 matrix (one row per
+    cluster, row number = cluster id) with member counts alongside, so the index
+    survives restarts and is shared by worker processes through the page cache.
+    New texts join the nearest centroid above the similarity threshold (which
+    moves it towards them) or start a new cluster; nothing is re-clustered.
+    """
+
+    def __init__(self, kind: str, embedder, directory: str = INSIGHT_INDEX_DIR,
+                 threshold: Optional[float] = INSIGHT_CLUSTER_THRESHOLD):
+        self.kind = kind
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.threshold = threshold or embedder.default_threshold
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._base = os.path.join(directory, kind)
+        self._lock = threading.Lock()
+
+        planes = np.random.default_rng(0).standard_normal((LSH_TABLES * LSH_BITS, self.dim))
+        self._planes = planes.astype(np.float32)
+        self._bit_weights = (1 << np.arange(LSH_BITS, dtype=np.int64))
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(LSH_TABLES)]
+        self._bucket_keys: Dict[int, np.ndarray] = {}
+
+        self.size = 0
+        self.capacity = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.counts: Optional[np.ndarray] = None
+        # True when this process started the index from scratch, so stored cluster ids are stale
+        self.created = False
+        with _file_lock(self._base + ".lock"):
+            meta = self._read_meta()
+            if meta is None or meta.get("embedder") != embedder.name or meta.get("dim") != self.dim:
+                # New index, or the embedding space changed and old centroids are meaningless
+                self._create(INITIAL_CAPACITY)
+            self._sync()
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self._base + ".json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self):
+        tmp = self._base + ".json.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"embedder": self.embedder.name, "dim": self.dim, "size": self.size,
+                       "capacity": self.capacity, "threshold": self.threshold}, f)
+        os.replace(tmp, self._base + ".json")
+
+    def _open(self, capacity: Optional[int] = None):
+        """Map the centroid and count files, creating them at capacity when given"""
+        if capacity is None:
+            self.centroids = np.lib.format.open_memmap(self._base + ".centroids.npy", mode="r+")
+            self.counts = np.lib.format.open_memmap(self._base + ".counts.npy", mode="r+")
+        else:
+            self.centroids = np.lib.format.open_memmap(
+                self._base + ".centroids.npy", mode="w+", dtype=np.float32, shape=(capacity, self.dim)
+            )
+            self.counts = np.lib.format.open_memmap(
+                self._base + ".counts.npy", mode="w+", dtype=np.int64, shape=(capacity,)
+            )
+        self.capacity = len(self.counts)
+
+    def _create(self, capacity: int):
+        self._open(capacity)
+        self.created = True
+        self.size = 0
+        self._buckets = [{} for _ in range(LSH_TABLES)]
+        self._bucket_keys = {}
+        self._write_meta()
+
+    def _grow(self):
+        """Double the matrix: copy into new files and swap them in"""
+        capacity = self.capacity * 2
+        for suffix, array, shape in (
+            (".centroids.npy", self.centroids, (capacity, self.dim)),
+            (".counts.npy", self.counts, (capacity,)),
+        ):
+            tmp = self._base + suffix + ".tmp"
+            grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=array.dtype, shape=shape)
+            grown[:self.size] = array[:self.size]
+            grown.flush()
+            del grown
+            os.replace(tmp, self._base + suffix)
+        self._open()
+        self._write_meta()
+
+    def _sync(self):
+        """Pick up clusters added by other processes since this one last looked"""
+        meta = self._read_meta()
+        if meta["capacity"] != self.capacity or self.centroids is None:
+            self._open()
+        if meta["size"] < self.size:
+            # The index was rebuilt underneath us
+            self._buckets = [{} for _ in range(LSH_TABLES)]
+            self._bucket_keys = {}
+            self.size = 0
+        for slot in range(self.size, meta["size"]):
+            self._add_to_buckets(slot)
+        self.size = meta["size"]
+
+    def _hash(self, vector: np.ndarray) -> np.ndarray:
+        bits = (self._planes @ vector > 0).reshape(LSH_TABLES, LSH_BITS)
+        return bits.astype(np.int64) @ self._bit_weights
+
+    def _add_to_buckets(self, slot: int):
+        keys = self._hash(self.centroids[slot])
+        for table, key in enumerate(keys):
+            self._buckets[table].setdefault(int(key), set()).add(slot)
+        self._bucket_keys[slot] = keys
+
+    def _remove_from_buckets(self, slot: int):
+        keys = self._bucket_keys.pop(slot, None)
+        if keys is None:
+            return
+        for table, key in enumerate(keys):
+            bucket = self._buckets[table].get(int(key))
+            if bucket is not None:
+                bucket.discard(slot)
+
+    def _nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        if self.size == 0:
+            return None, -1.0
+        if self.size <= EXACT_SEARCH_MAX:
+            similarities = self.centroids[:self.size] @ vector
+            best = int(np.argmax(similarities))
+            return best, float(similarities[best])
+
+        found: Set[int] = set()
+        for table, key in enumerate(self._hash(vector)):
+            found |= self._buckets[table].get(int(key), set())
+        if not found:
+            return None, -1.0
+        candidates = np.fromiter(found, dtype=np.int64)
+        similarities = self.centroids[candidates] @ vector
+        best = int(np.argmax(similarities))
+        return int(candidates[best]), float(similarities[best])
+
+    def assign(self, texts: List[str]) -> List[int]:
+        """Cluster id for each text, creating or moving clusters as needed"""
+        if not texts:
+            return []
+        vectors = self.embedder.encode(texts)
+        with self._lock, _file_lock(self._base + ".lock"):
+            self._sync()
+            cluster_ids = []
+            for vector in vectors:
+                slot, similarity = self._nearest(vector)
+                if slot is not None and similarity >= self.threshold:
+                    # Running mean of the members, kept unit length for cosine search
+                    count = int(self.counts[slot])
+                    centroid = self.centroids[slot] * count + vector
+                    norm = np.linalg.norm(centroid)
+                    self._remove_from_buckets(slot)
+                    self.centroids[slot] = centroid / norm if norm else vector
+                    self.counts[slot] = count + 1
+                else:
+                    if self.size == self.capacity:
+                        self._grow()
+                    slot = self.size
+                    self.centroids[slot] = vector
+                    self.counts[slot] = 1
+                    self.size += 1
+                self._add_to_buckets(slot)
+                cluster_ids.append(slot)
+            self.centroids.flush()
+            self.counts.flush()
+            self._write_meta()
+        return cluster_ids
+
+    def status(self) -> Dict:
+        return {"clusters": self.size, "capacity": self.capacity, "threshold": self.threshold}
+
+_indexes: Dict[str, ClusterIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_cluster_index(kind: str) -> Optional[ClusterIndex]:
+    """Process-wide index for one insight kind, or None when clustering is disabled"""
+    if not INSIGHT_CLUSTERING_ENABLED:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(kind)
+        if index is None:
+            index = ClusterIndex(kind, get_embedder())
+            _indexes[kind] = index
+        return index
+
+def index_is_current(kind: str, directory: str = INSIGHT_INDEX_DIR) -> bool:
+    """Whether opening the kind's index would keep its clusters: it exists and was
+    built with the configured embedder. Checked from the files, without loading the embedder."""
+    try:
+        with open(os.path.join(directory, kind) + ".json") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get("embedder") == configured_embedder_name()
+
+def cluster_status() -> Dict:
+    if not INSIGHT_CLUSTERING_ENABLED:
+        return {"enabled": False}
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    embedder = next(iter(indexes.values())).embedder.name if indexes else None
+    return {"enabled": True, "embedder": embedder, "kinds": {kind: index.status() for kind, index in indexes.items()}}
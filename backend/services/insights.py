@@ -0,0 +1,359 @@
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Table, and_, bindparam, case, delete, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from database import AnalysisResult, ClusterRollup, Conversation, Insight, InsightRollup, InsightTotal
+from services.insight_clusters import INSIGHT_CLUSTERING_ENABLED, get_cluster_index, index_is_current
+
+ALL_SOURCES = "__all__"
+
+# analysis field -> (insight kind, keys holding the text, key holding the attribute)
+INSIGHT_FIELDS = {
+    "pain_points": ("pain_point", ("point", "text"), "severity"),
+    "media_consumption": ("media", ("name", "source"), "type"),
+    "compelling_points": ("compelling_point", ("point", "text"), "category"),
+}
+
+def _item_text(item, text_keys: Tuple[str, str]) -> str:
+    if isinstance(item, dict):
+        return str(item.get(text_keys[0], item.get(text_keys[1], str(item))))
+    return str(item)
+
+def extract_insights(analysis: Dict) -> List[Tuple[str, str, Optional[str]]]:
+    """(kind, text, attribute) for every pain point, media item and compelling point"""
+    insights = []
+    for field, (kind, text_keys, attribute_key) in INSIGHT_FIELDS.items():
+        for item in analysis.get(field) or []:
+            attribute = item.get(attribute_key) if isinstance(item, dict) else None
+            insights.append((kind, _item_text(item, text_keys), str(attribute) if attribute is not None else None))
+    return insights
+
+def _cluster_ids(db: Session, texts_by_kind: Dict[str, Set[str]]) -> Dict[Tuple[str, str], int]:
+    """Cluster of each (kind, text): the one already on its rollup, else assigned by the index"""
+    if not INSIGHT_CLUSTERING_ENABLED:
+        return {}
+    clusters = {}
+    for kind, texts in texts_by_kind.items():
+        known = db.query(InsightRollup.text, InsightRollup.cluster_id).filter(
+            InsightRollup.kind == kind,
+            InsightRollup.source == ALL_SOURCES,
+            InsightRollup.text.in_(texts),
+            InsightRollup.cluster_id.isnot(None)
+        ).all()
+        clusters.update({(kind, text): cluster_id for text, cluster_id in known})
+        new_texts = sorted(text for text in texts if (kind, text) not in clusters)
+        if not new_texts:
+            continue
+        try:
+            assigned = get_cluster_index(kind).assign(new_texts)
+        except Exception as e:
+            # Left unclustered; backfill_insight_clusters picks them up on the next start
+            print(f"Insight clustering failed for {kind}: {e}")
+            continue
+        clusters.update({(kind, text): cluster_id for text, cluster_id in zip(new_texts, assigned)})
+    return clusters
+
+def _upsert(db: Session, table: Table, key_columns: List[str], rows: List[Dict], merge: Callable) -> None:
+    """Insert rows, or merge each into the existing row with the same key, without read-modify-write races.
+
+    merge(existing, new) returns the column values to set on a conflict; both
+    arguments expose columns as attributes, new holding the incoming row.
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(index_elements=key_columns, set_=merge(table.c, statement.excluded))
+        db.execute(statement, rows)
+        return
+
+    for row in rows:
+        new = SimpleNamespace(**{name: literal(value, table.c[name].type) for name, value in row.items()})
+        updated = db.execute(
+            update(table).where(*[table.c[name] == row[name] for name in key_columns]).values(merge(table.c, new))
+        ).rowcount
+        if not updated:
+            db.execute(insert(table), [row])
+
+def _upsert_rollups(db: Session, increments: Dict[Tuple[str, str, str], int], clusters: Dict[Tuple[str, str], int]):
+    """Add counts to rollup rows, creating them as needed"""
+    rows = [{"kind": kind, "source": source, "text": text, "count": count, "cluster_id": clusters.get((kind, text))}
+            for (kind, source, text), count in increments.items()]
+    _upsert(db, InsightRollup.__table__, ["kind", "source", "text"], rows, lambda existing, new: {
+        "count": existing.count + new.count,
+        "cluster_id": func.coalesce(new.cluster_id, existing.cluster_id)
+    })
+
+def _merge_cluster_rollup(existing, new) -> Dict:
+    # Counts only grow, so the most frequent phrasing so far is the better of
+    # the stored label and the texts just counted (the shorter one on a tie)
+    relabel = or_(
+        new.label_count > existing.label_count,
+        and_(new.label_count == existing.label_count, func.length(new.label) < func.length(existing.label))
+    )
+    return {
+        "count": existing.count + new.count,
+        "variants": existing.variants + new.variants,
+        "label": case((relabel, new.label), else_=existing.label),
+        "label_count": case((relabel, new.label_count), else_=existing.label_count),
+    }
+
+def _update_cluster_rollups(db: Session, increments: Dict[Tuple[str, str, str], int]):
+    """Fold rollup increments into their cluster groups and the distinct-group totals"""
+    kinds = {kind for kind, _, _ in increments}
+    sources = {source for _, source, _ in increments}
+    texts = {text for _, _, text in increments}
+    rollups = db.query(
+        InsightRollup.id, InsightRollup.kind, InsightRollup.source, InsightRollup.text,
+        InsightRollup.count, InsightRollup.cluster_id
+    ).filter(
+        InsightRollup.kind.in_(kinds), InsightRollup.source.in_(sources), InsightRollup.text.in_(texts)
+    ).all()
+
+    groups: Dict[Tuple[str, str, int], Dict] = {}
+    for rollup in rollups:
+        increment = increments.get((rollup.kind, rollup.source, rollup.text))
+        if increment is None:
+            continue
+        key = (rollup.kind, rollup.source, rollup.cluster_id if rollup.cluster_id is not None else -rollup.id)
+        group = groups.setdefault(key, {
+            "kind": key[0], "source": key[1], "cluster_id": key[2],
+            "count": 0, "variants": 0, "label": rollup.text, "label_count": rollup.count
+        })
+        group["count"] += increment
+        # Counts never go down, so a row holding exactly this increment was just created
+        if rollup.count == increment:
+            group["variants"] += 1
+        if (rollup.count, -len(rollup.text)) > (group["label_count"], -len(group["label"])):
+            group["label"], group["label_count"] = rollup.text, rollup.count
+    if not groups:
+        return
+    _upsert(db, ClusterRollup.__table__, ["kind", "source", "cluster_id"], list(groups.values()), _merge_cluster_rollup)
+
+    counts = db.query(ClusterRollup.kind, ClusterRollup.source, ClusterRollup.cluster_id, ClusterRollup.count).filter(
+        ClusterRollup.kind.in_(kinds),
+        ClusterRollup.source.in_(sources),
+        ClusterRollup.cluster_id.in_({cluster_id for _, _, cluster_id in groups})
+    ).all()
+    new_groups: Dict[Tuple[str, str], int] = {}
+    for kind, source, cluster_id, count in counts:
+        group = groups.get((kind, source, cluster_id))
+        if group is not None and count == group["count"]:
+            new_groups[(kind, source)] = new_groups.get((kind, source), 0) + 1
+    _upsert(db, InsightTotal.__table__, ["kind", "source"], [
+        {"kind": kind, "source": source, "distinct_count": count} for (kind, source), count in new_groups.items()
+    ], lambda existing, new: {"distinct_count": existing.distinct_count + new.distinct_count})
+
+def record_insights(db: Session, analysis_result: AnalysisResult, source: Optional[str]):
+    """Store one row per extracted insight and bump the rollups (caller commits)"""
+    source = source or ""
+    analysis = {
+        "pain_points": analysis_result.pain_points,
+        "media_consumption": analysis_result.media_consumption,
+        "compelling_points": analysis_result.compelling_points,
+    }
+    insights = extract_insights(analysis)
+    if not insights:
+        return
+
+    db.execute(insert(Insight.__table__), [
+        {
+            "result_id": analysis_result.id,
+            "conversation_id": analysis_result.conversation_id,
+            "source": source,
+            "kind": kind,
+            "text": text,
+            "attribute": attribute,
+        }
+        for kind, text, attribute in insights
+    ])
+
+    increments: Dict[Tuple[str, str, str], int] = {}
+    texts_by_kind: Dict[str, Set[str]] = {}
+    for kind, text, _ in insights:
+        texts_by_kind.setdefault(kind, set()).add(text)
+        for rollup_source in (source, ALL_SOURCES):
+            key = (kind, rollup_source, text)
+            increments[key] = increments.get(key, 0) + 1
+    _upsert_rollups(db, increments, _cluster_ids(db, texts_by_kind))
+    _update_cluster_rollups(db, increments)
+
+def top_insights(db: Session, kind: str, source: Optional[str], limit: int = 20) -> Tuple[int, List[Dict]]:
+    """(number of distinct insights, top insights by count) for one kind, served from the cluster rollup index.
+
+    Texts in the same semantic cluster are counted together under the cluster's
+    most frequent phrasing; texts not clustered yet count on their own.
+    """
+    rollup_source = source if source else ALL_SOURCES
+    total_unique = db.query(InsightTotal.distinct_count).filter(
+        InsightTotal.kind == kind,
+        InsightTotal.source == rollup_source
+    ).scalar() or 0
+    groups = db.query(ClusterRollup).filter(
+        ClusterRollup.kind == kind,
+        ClusterRollup.source == rollup_source
+    ).order_by(ClusterRollup.count.desc()).limit(limit).all()
+    return total_unique, [
+        {
+            "label": group.label,
+            "count": group.count,
+            "variants": group.variants,
+            "cluster_id": group.cluster_id if group.cluster_id >= 0 else None
+        }
+        for group in groups
+    ]
+
+def rebuild_cluster_rollups(db: Session, kind: str):
+    """Recompute the cluster groups and totals of one kind from its rollups (after clusters were reassigned)"""
+    rollups = InsightRollup.__table__
+    clusters = ClusterRollup.__table__
+    db.execute(delete(clusters).where(clusters.c.kind == kind))
+    group_key = func.coalesce(rollups.c.cluster_id, -rollups.c.id)
+    db.execute(insert(clusters).from_select(
+        ["kind", "source", "cluster_id", "count", "variants", "label_count"],
+        select(
+            rollups.c.kind, rollups.c.source, group_key, func.sum(rollups.c.count), func.count(), literal(0)
+        ).where(rollups.c.kind == kind).group_by(rollups.c.kind, rollups.c.source, group_key)
+    ))
+
+    # Unclustered texts label their own group; a cluster takes its most frequent phrasing
+    db.execute(update(clusters).where(clusters.c.kind == kind, clusters.c.cluster_id < 0).values(
+        label=select(rollups.c.text).where(rollups.c.id == -clusters.c.cluster_id).scalar_subquery(),
+        label_count=clusters.c.count
+    ))
+    def most_frequent(column):
+        return select(column).where(
+            rollups.c.kind == clusters.c.kind,
+            rollups.c.source == clusters.c.source,
+            rollups.c.cluster_id == clusters.c.cluster_id
+        ).order_by(rollups.c.count.desc(), func.length(rollups.c.text)).limit(1).scalar_subquery()
+    db.execute(update(clusters).where(clusters.c.kind == kind, clusters.c.cluster_id >= 0).values(
+        label=most_frequent(rollups.c.text),
+        label_count=most_frequent(rollups.c.count)
+    ))
+
+    db.execute(delete(InsightTotal.__table__).where(InsightTotal.kind == kind))
+    db.execute(insert(InsightTotal.__table__).from_select(
+        ["kind", "source", "distinct_count"],
+        select(clusters.c.kind, clusters.c.source, func.count()).where(clusters.c.kind == kind).group_by(
+            clusters.c.kind, clusters.c.source
+        )
+    ))
+    db.commit()
+
+def backfill_insights(db: Session, batch_size: int = 1000) -> int:
+    """Populate insight tables from analyses saved before they existed. Returns results processed."""
+    if db.query(InsightRollup.id).first() is not None:
+        return 0
+    if db.query(AnalysisResult.id).first() is None:
+        return 0
+
+    processed = 0
+    last_id = 0
+    while True:
+        rows = db.query(AnalysisResult, Conversation.source).outerjoin(
+            Conversation, Conversation.id == AnalysisResult.conversation_id
+        ).filter(AnalysisResult.id > last_id).order_by(AnalysisResult.id).limit(batch_size).all()
+        if not rows:
+            break
+        for analysis_result, source in rows:
+            record_insights(db, analysis_result, source)
+        db.commit()
+        processed += len(rows)
+        last_id = rows[-1][0].id
+    print(f"Backfilled insights for {processed} analysis results")
+    return processed
+
+def backfill_insight_clusters(db: Session, batch_size: int = 1000) -> Set[str]:
+    """Assign clusters to rollup texts that have none (new index, or clustering was off).
+
+    Returns the kinds whose cluster ids changed, so their cluster rollups can be rebuilt.
+    """
+    if not INSIGHT_CLUSTERING_ENABLED:
+        return set()
+    assigned = 0
+    kinds: Set[str] = set()
+    for kind, _, _ in INSIGHT_FIELDS.values():
+        if db.query(InsightRollup.id).filter(InsightRollup.kind == kind).first() is None:
+            continue
+        unassigned = db.query(InsightRollup.id).filter(
+            InsightRollup.kind == kind,
+            InsightRollup.source == ALL_SOURCES,
+            InsightRollup.cluster_id.is_(None)
+        ).first()
+        if unassigned is None and index_is_current(kind):
+            # Nothing to do: the embedder is left for the first analysis to load
+            continue
+        index = get_cluster_index(kind)
+        if index.created:
+            # Ids stored against a previous index (or embedding model) mean nothing now
+            db.query(InsightRollup).filter(InsightRollup.kind == kind).update(
+                {"cluster_id": None}, synchronize_session=False
+            )
+            db.commit()
+            kinds.add(kind)
+
+        kind_assigned = 0
+        last_id = 0
+        while True:
+            rows = db.query(InsightRollup.id, InsightRollup.text).filter(
+                InsightRollup.kind == kind,
+                InsightRollup.source == ALL_SOURCES,
+                InsightRollup.cluster_id.is_(None),
+                InsightRollup.id > last_id
+            ).order_by(InsightRollup.id).limit(batch_size).all()
+            if not rows:
+                break
+            cluster_ids = index.assign([text for _, text in rows])
+            db.connection().execute(
+                update(InsightRollup.__table__)
+                .where(InsightRollup.__table__.c.id == bindparam("row_id"))
+                .values(cluster_id=bindparam("new_cluster_id")),
+                [{"row_id": row_id, "new_cluster_id": cluster_id} for (row_id, _), cluster_id in zip(rows, cluster_ids)]
+            )
+            db.commit()
+            kind_assigned += len(rows)
+            last_id = rows[-1][0]
+        if not kind_assigned:
+            continue
+        assigned += kind_assigned
+        kinds.add(kind)
+
+        # Per-source rows take the cluster of their cross-source row
+        totals = aliased(InsightRollup)
+        db.query(InsightRollup).filter(
+            InsightRollup.kind == kind,
+            InsightRollup.source != ALL_SOURCES,
+            InsightRollup.cluster_id.is_(None)
+        ).update({
+            "cluster_id": db.query(totals.cluster_id).filter(
+                totals.kind == InsightRollup.kind,
+                totals.source == ALL_SOURCES,
+                totals.text == InsightRollup.text
+            ).scalar_subquery()
+        }, synchronize_session=False)
+        db.commit()
+    if assigned:
+        print(f"Clustered {assigned} insight texts")
+    return kinds
+
+def backfill_cluster_rollups(db: Session, reclustered: Iterable[str] = ()) -> int:
+    """Build the cluster groups of kinds that have rollups but no totals yet, and
+    rebuild those of the reclustered kinds (see backfill_insight_clusters). Returns kinds rebuilt."""
+    reclustered = set(reclustered)
+    rebuilt = 0
+    for kind, _, _ in INSIGHT_FIELDS.values():
+        if db.query(InsightRollup.id).filter(InsightRollup.kind == kind).first() is None:
+            continue
+        if kind not in reclustered and db.query(InsightTotal.id).filter(InsightTotal.kind == kind).first() is not None:
+            continue
+        rebuild_cluster_rollups(db, kind)
+        rebuilt += 1
+    return rebuilt
@@ -0,0 +1,416 @@
+import os
+import time
+import threading
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+
+from database import SessionLocal, engine, Conversation, AnalysisResult, AnalysisJob, AnalysisJobItem
+from services.analysis_store import save_analysis
+from services.metrics import ANALYSIS_CONVERSATIONS, DB_COMMIT_SECONDS, registry as metrics_registry
+from services.analyzer import LLM_PROVIDER
+from services.registry import ANALYZER_REPLICAS, get_analyzer_pool
+from services.response_cache import data_version
+
+# "thread" shares one warm analyzer pool inside the API process; "process" gives
+# each worker process its own pool (and its own GIL).
+ANALYSIS_WORKER_MODE = os.getenv("ANALYSIS_WORKER_MODE", "thread").lower()
+ANALYSIS_WORKERS = max(1, int(os.getenv("ANALYSIS_WORKERS", "2")))
+# Read here rather than from services.openai_async, which imports the OpenAI SDK
+OPENAI_MAX_CONCURRENCY = max(1, int(os.getenv("OPENAI_MAX_CONCURRENCY", "64")))
+
+def default_chunk_size(provider: str = LLM_PROVIDER, mode: str = ANALYSIS_WORKER_MODE,
+                       workers: int = ANALYSIS_WORKERS, replicas: int = ANALYZER_REPLICAS) -> int:
+    """Conversations per chunk when ANALYSIS_JOB_CHUNK_SIZE is not set.
+
+    The async OpenAI client overlaps every request of a chunk, up to
+    OPENAI_MAX_CONCURRENCY per process, so OpenAI chunks are sized to fill that
+    limit. A worker process runs one chunk at a time; thread workers share the
+    API process's limit between the chunks holding a replica at once.
+    """
+    if provider != "openai":
+        return 4
+    chunks_at_once = 1 if mode == "process" else max(1, min(workers, replicas))
+    return max(1, OPENAI_MAX_CONCURRENCY // chunks_at_once)
+
+# Conversations handed to the analyzer (and committed) together
+ANALYSIS_JOB_CHUNK_SIZE = max(1, int(os.getenv("ANALYSIS_JOB_CHUNK_SIZE") or default_chunk_size()))
+# Times a chunk that raised is queued again before its conversations are marked failed
+ANALYSIS_JOB_CHUNK_RETRIES = max(0, int(os.getenv("ANALYSIS_JOB_CHUNK_RETRIES", "2")))
+
+FINISHED_JOB_STATUSES = ("completed", "cancelled")
+FINISHED_ITEM_STATUSES = ("analyzed", "already_analyzed", "failed", "cancelled")
+
+def _init_worker_process():
+    # Connections inherited through fork must not be reused by the child
+    engine.dispose(close=False)
+
+def _job_is_cancelled(db: Session, job_id: int) -> bool:
+    status = db.query(AnalysisJob.status).filter(AnalysisJob.id == job_id).scalar()
+    return status is None or status == "cancelled"
+
+def _bump_job(db: Session, job_id: int, **increments):
+    """Increment job counters in SQL so concurrent workers never overwrite each other"""
+    db.query(AnalysisJob).filter(AnalysisJob.id == job_id).update(
+        {getattr(AnalysisJob, name): getattr(AnalysisJob, name) + value for name, value in increments.items()},
+        synchronize_session=False
+    )
+
+def _finalize_if_done(db: Session, job_id: int):
+    remaining = db.query(AnalysisJobItem.id).filter(
+        AnalysisJobItem.job_id == job_id,
+        AnalysisJobItem.status.in_(["pending", "running"])
+    ).first()
+    if remaining is None:
+        db.query(AnalysisJob).filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.status.in_(["queued", "running"])
+        ).update({"status": "completed", "finished_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+
+def run_chunk(job_id: int, item_ids: List[int]) -> int:
+    """Analyze one chunk of job items and commit their results. Runs inside a worker."""
+    db = SessionLocal()
+    try:
+        if _job_is_cancelled(db, job_id):
+            return 0
+
+        db.query(AnalysisJob).filter(AnalysisJob.id == job_id, AnalysisJob.status == "queued").update(
+            {"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False
+        )
+        items = db.query(AnalysisJobItem).filter(
+            AnalysisJobItem.id.in_(item_ids),
+            AnalysisJobItem.status == "pending"
+        ).all()
+        for item in items:
+            item.status = "running"
+        db.commit()
+        if not items:
+            return 0
+
+        # Compressed transcripts load in one query; they are decompressed only if analyzed
+        conversations = {
+            c.id: c for c in db.query(Conversation).options(selectinload(Conversation.blob)).filter(
+                Conversation.id.in_([item.conversation_id for item in items])
+            ).all()
+        }
+        analyzed_ids = {
+            row[0] for row in db.query(AnalysisResult.conversation_id).filter(
+                AnalysisResult.conversation_id.in_(list(conversations))
+            ).all()
+        }
+
+        to_analyze = []
+        for item in items:
+            item.finished_at = datetime.utcnow()
+            if item.conversation_id not in conversations:
+                item.status = "failed"
+                item.error = "Conversation not found"
+                _bump_job(db, job_id, failed=1)
+            elif item.conversation_id in analyzed_ids:
+                item.status = "already_analyzed"
+                _bump_job(db, job_id, already_analyzed=1)
+            else:
+                to_analyze.append(item)
+
+        if to_analyze:
+            start = time.perf_counter()
+            try:
+                with get_analyzer_pool().acquire() as analyzer:
+                    analyses = analyzer.analyze_batch(
+                        [conversations[item.conversation_id].transcript for item in to_analyze]
+                    )
+                error = None
+            except Exception as e:
+                analyses, error = None, str(e)
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            for index, item in enumerate(to_analyze):
+                item.latency_ms = latency_ms
+                item.finished_at = datetime.utcnow()
+                if analyses is None:
+                    item.status = "failed"
+                    item.error = error
+                    _bump_job(db, job_id, failed=1)
+                    continue
+                result = save_analysis(db, conversations[item.conversation_id], analyses[index])
+                if result is None:
+                    # Analyzed by a single-conversation request meanwhile
+                    item.status = "already_analyzed"
+                    _bump_job(db, job_id, already_analyzed=1)
+                    continue
+                item.status = "analyzed"
+                item.result_id = result.id
+                _bump_job(db, job_id, analyzed=1)
+
+        # Counted before the commit expires the items
+        for item in items:
+            ANALYSIS_CONVERSATIONS.inc(outcome=item.status)
+        with DB_COMMIT_SECONDS.time(operation="job_chunk"):
+            db.commit()
+        _finalize_if_done(db, job_id)
+        return len(items)
+    except Exception:
+        db.rollback()
+        # Put the chunk back so a later resume picks it up again
+        db.query(AnalysisJobItem).filter(
+            AnalysisJobItem.id.in_(item_ids),
+            AnalysisJobItem.status == "running"
+        ).update({"status": "pending"}, synchronize_session=False)
+        db.commit()
+        raise
+    finally:
+        db.close()
+
+def fail_chunk(job_id: int, item_ids: List[int], error: str):
+    """Mark the unfinished items of a chunk that kept raising as failed, so the job can finish"""
+    db = SessionLocal()
+    try:
+        failed = db.query(AnalysisJobItem).filter(
+            AnalysisJobItem.id.in_(item_ids),
+            AnalysisJobItem.status.in_(["pending", "running"])
+        ).update(
+            {"status": "failed", "error": error, "finished_at": datetime.utcnow()}, synchronize_session=False
+        )
+        if failed:
+            _bump_job(db, job_id, failed=failed)
+            ANALYSIS_CONVERSATIONS.inc(failed, outcome="failed")
+        db.commit()
+        _finalize_if_done(db, job_id)
+    finally:
+        db.close()
+
+def run_chunk_in_process(job_id: int, item_ids: List[int]) -> Tuple[int, Dict]:
+    """run_chunk in a worker process, also returning the metrics it recorded for the API process"""
+    return run_chunk(job_id, item_ids), metrics_registry.take_delta()
+
+class JobManager:
+    """Persists batch analysis jobs and fans their conversations out to a worker pool"""
+
+    def __init__(self, mode: str = ANALYSIS_WORKER_MODE, workers: int = ANALYSIS_WORKERS,
+                 chunk_size: int = ANALYSIS_JOB_CHUNK_SIZE):
+        self.mode = mode
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker_process)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-worker")
+            return self._executor
+
+    def start(self):
+        """Resume jobs that were queued or running when the process last stopped"""
+        db = SessionLocal()
+        try:
+            job_ids = [row[0] for row in db.query(AnalysisJob.id).filter(
+                AnalysisJob.status.in_(["queued", "running"])
+            ).all()]
+            if job_ids:
+                db.query(AnalysisJobItem).filter(
+                    AnalysisJobItem.job_id.in_(job_ids),
+                    AnalysisJobItem.status == "running"
+                ).update({"status": "pending"}, synchronize_session=False)
+                db.commit()
+                print(f"Resuming {len(job_ids)} unfinished analysis job(s)")
+        finally:
+            db.close()
+        for job_id in job_ids:
+            self.dispatch(job_id)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, db: Session, conversation_ids: List[int], source: Optional[str] = None) -> AnalysisJob:
+        """Persist a job with one item per conversation and start working on it"""
+        analyzed_ids = {
+            row[0] for row in db.query(AnalysisResult.conversation_id).filter(
+                AnalysisResult.conversation_id.in_(conversation_ids)
+            ).all()
+        }
+        job = AnalysisJob(
+            source=source,
+            total=len(conversation_ids),
+            already_analyzed=len(analyzed_ids),
+            status="queued"
+        )
+        db.add(job)
+        db.flush()
+        now = datetime.utcnow()
+        # One executemany; ORM objects would each be a separate INSERT ... RETURNING
+        db.execute(insert(AnalysisJobItem.__table__), [
+            {
+                "job_id": job.id,
+                "conversation_id": conversation_id,
+                "status": "already_analyzed" if conversation_id in analyzed_ids else "pending",
+                "finished_at": now if conversation_id in analyzed_ids else None
+            }
+            for conversation_id in conversation_ids
+        ])
+        if len(analyzed_ids) == len(conversation_ids):
+            job.status = "completed"
+            job.finished_at = now
+        db.commit()
+        db.refresh(job)
+
+        if job.status != "completed":
+            self.dispatch(job.id)
+        return job
+
+    def dispatch(self, job_id: int):
+        """Queue every pending item of a job onto the worker pool in chunks"""
+        db = SessionLocal()
+        try:
+            item_ids = [row[0] for row in db.query(AnalysisJobItem.id).filter(
+                AnalysisJobItem.job_id == job_id,
+                AnalysisJobItem.status == "pending"
+            ).order_by(AnalysisJobItem.id).all()]
+        finally:
+            db.close()
+
+        if not item_ids:
+            db = SessionLocal()
+            try:
+                _finalize_if_done(db, job_id)
+            finally:
+                db.close()
+            return
+
+        for start in range(0, len(item_ids), self.chunk_size):
+            self._submit_chunk(job_id, item_ids[start:start + self.chunk_size])
+
+    def _submit_chunk(self, job_id: int, item_ids: List[int], attempt: int = 0):
+        task = run_chunk_in_process if self.mode == "process" else run_chunk
+        executor = self.executor
+        future = executor.submit(task, job_id, item_ids)
+        future.add_done_callback(partial(self._chunk_done, executor, job_id, item_ids, attempt))
+
+    def cancel(self, db: Session, job_id: int) -> Optional[AnalysisJob]:
+        """Stop a job: pending items are cancelled, chunks already in flight finish"""
+        job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+        if job is None or job.status in FINISHED_JOB_STATUSES:
+            return job
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+        db.query(AnalysisJobItem).filter(
+            AnalysisJobItem.job_id == job_id,
+            AnalysisJobItem.status == "pending"
+        ).update({"status": "cancelled"}, synchronize_session=False)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def _chunk_done(self, executor: Executor, job_id: int, item_ids: List[int], attempt: int, future):
+        if self.mode == "process":
+            # Commits in worker processes are invisible to this process's response cache version
+            data_version.bump()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            if self.mode == "process":
+                metrics_registry.merge(future.result()[1])
+            return
+
+        # run_chunk put the chunk's items back to pending; nothing else picks them up
+        # until a restart, so the chunk is queued again or given up on
+        print(f"Analysis job chunk failed (attempt {attempt + 1}): {error}")
+        if isinstance(error, BrokenExecutor):
+            # A worker process died; later chunks need a new pool
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+        try:
+            if attempt < ANALYSIS_JOB_CHUNK_RETRIES:
+                self._submit_chunk(job_id, item_ids, attempt + 1)
+            else:
+                fail_chunk(job_id, item_ids, f"Analysis failed after {attempt + 1} attempts: {error}")
+        except Exception as e:
+            # Shutting down, or the database is gone: the items stay pending and resume on restart
+            print(f"Could not requeue analysis job chunk: {e}")
+
+class JobEventCursor:
+    """Remembers which items of a job a progress stream has not reported yet.
+
+    Items finish out of id order across workers, so the stream tracks the ids that
+    were unfinished when it started and reports each one once when it finishes.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.pending: Optional[Set[int]] = None
+
+    def poll(self, db: Session) -> Tuple[Optional[Dict], List[Dict]]:
+        """The job's current state and the items finished since the last poll"""
+        job = db.query(AnalysisJob).filter(AnalysisJob.id == self.job_id).first()
+        if job is None:
+            return None, []
+
+        finished: List[Dict] = []
+        if self.pending is None:
+            self.pending = {row[0] for row in db.query(AnalysisJobItem.id).filter(
+                AnalysisJobItem.job_id == self.job_id,
+                AnalysisJobItem.status.notin_(FINISHED_ITEM_STATUSES)
+            ).all()}
+        elif self.pending:
+            # Items below the lowest unreported id were all reported (or finished before the stream began)
+            items = db.query(AnalysisJobItem).filter(
+                AnalysisJobItem.job_id == self.job_id,
+                AnalysisJobItem.status.in_(FINISHED_ITEM_STATUSES),
+                AnalysisJobItem.id >= min(self.pending)
+            ).order_by(AnalysisJobItem.finished_at, AnalysisJobItem.id).all()
+            for item in items:
+                if item.id not in self.pending:
+                    continue
+                self.pending.discard(item.id)
+                # Cancelled items did not run; the final job state accounts for them
+                if item.status != "cancelled":
+                    finished.append(job_item_to_dict(item))
+
+        progress = job_to_dict(job)
+        processed = (job.analyzed or 0) + (job.failed or 0)
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds() if job.started_at else 0
+        progress["conversations_per_second"] = round(processed / elapsed, 3) if elapsed > 0 else None
+        return progress, finished
+
+def job_item_to_dict(item: AnalysisJobItem) -> Dict:
+    return {
+        "conversation_id": item.conversation_id,
+        "status": item.status,
+        "result_id": item.result_id,
+        # Time of the analyzer call the conversation was batched into
+        "latency_ms": round(item.latency_ms, 1) if item.latency_ms is not None else None,
+        "error": item.error,
+        "finished_at": item.finished_at.isoformat() if item.finished_at else None
+    }
+
+def job_to_dict(job: AnalysisJob) -> Dict:
+    done = (job.analyzed or 0) + (job.already_analyzed or 0) + (job.failed or 0)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "source": job.source,
+        "total": job.total,
+        "analyzed": job.analyzed,
+        "already_analyzed": job.already_analyzed,
+        "failed": job.failed,
+        "progress": round(done / job.total, 4) if job.total else 1.0,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+job_manager = JobManager()
@@ -0,0 +1,364 @@
+"""Schema-constrained JSON generation for local Hugging Face models.
+
+The analysis schema is compiled into a small character-level automaton. At
+every decoding step a logits processor masks out each token whose text cannot
+continue a schema-valid document, and once the closing brace is produced only
+EOS is allowed, so generation stops there instead of running to max_new_tokens.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import LogitsProcessor
+
+# What the prompts ask for, with bounds so a document always fits the token budget
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "pain_points": {
+            "type": "array",
+            "maxItems": 8,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "point": {"type": "string", "maxLength": 200},
+                    "severity": {"enum": ["high", "medium", "low"]},
+                },
+            },
+        },
+        "media_consumption": {
+            "type": "array",
+            "maxItems": 8,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "maxLength": 100},
+                    "type": {"type": "string", "maxLength": 30},
+                },
+            },
+        },
+        "compelling_points": {
+            "type": "array",
+            "maxItems": 8,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "point": {"type": "string", "maxLength": 200},
+                    "category": {"enum": ["feature", "benefit", "use_case"]},
+                },
+            },
+        },
+        "summary": {"type": "string", "maxLength": 600},
+    },
+}
+
+class _Node:
+    def __init__(self, kind: str, **fields):
+        self.kind = kind
+        self.__dict__.update(fields)
+
+class SchemaAutomaton:
+    """Character-level recognizer for compact JSON matching a schema subset.
+
+    Supports objects (all properties, in schema order), arrays, strings with
+    maxLength (no escapes or control characters) and string enums. States are
+    immutable tuples of frames, so testing a token never disturbs the real state.
+    """
+
+    def __init__(self, schema: Dict):
+        self.nodes: List[_Node] = []
+        self.root = self._compile(schema)
+        self._min_texts: Dict[int, str] = {}
+
+    def _add(self, node: _Node) -> int:
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def _compile(self, schema: Dict) -> int:
+        if "enum" in schema:
+            return self._add(_Node("enum", options=tuple(schema["enum"])))
+        if schema.get("type") == "string":
+            return self._add(_Node("str", max_length=schema.get("maxLength", 500)))
+        if schema.get("type") == "array":
+            return self._add(_Node("arr", item=self._compile(schema["items"]), max_items=schema.get("maxItems", 10)))
+        if schema.get("type") == "object":
+            children = []
+            for index, (name, property_schema) in enumerate(schema["properties"].items()):
+                separator = "{" if index == 0 else ", "
+                children.append(self._add(_Node("lit", text=f'{separator}"{name}": ')))
+                children.append(self._compile(property_schema))
+            children.append(self._add(_Node("lit", text="}")))
+            return self._add(_Node("seq", children=tuple(children)))
+        raise ValueError(f"Unsupported schema: {schema}")
+
+    # -- state transitions -------------------------------------------------
+
+    def initial(self) -> Tuple:
+        return self._push((), self.root)
+
+    def _push(self, stack: Tuple, node_id: int) -> Tuple:
+        node = self.nodes[node_id]
+        if node.kind == "seq":
+            return self._push(stack + (("seq", node_id, 0),), node.children[0])
+        if node.kind == "lit":
+            return stack + (("lit", node_id, 0),)
+        if node.kind == "str":
+            return stack + (("str", node_id, -1),)  # -1: opening quote not seen yet
+        if node.kind == "enum":
+            return stack + (("enum", node_id, None),)
+        return stack + (("arr", node_id, 0, "open"),)
+
+    def _finish(self, stack: Tuple) -> Tuple:
+        """Pop a completed frame and advance its parent"""
+        stack = stack[:-1]
+        if not stack:
+            return stack
+        parent = stack[-1]
+        if parent[0] == "seq":
+            children = self.nodes[parent[1]].children
+            index = parent[2] + 1
+            if index < len(children):
+                return self._push(stack[:-1] + (("seq", parent[1], index),), children[index])
+            return self._finish(stack)
+        # Array: an item just finished
+        return stack[:-1] + (("arr", parent[1], parent[2] + 1, "sep"),)
+
+    def step(self, stack: Tuple, char: str) -> Optional[Tuple]:
+        """State after one more character, or None if it is not allowed here"""
+        if not stack:
+            return None
+        frame = stack[-1]
+        node = self.nodes[frame[1]]
+        kind = frame[0]
+
+        if kind == "lit":
+            position = frame[2]
+            if node.text[position] != char:
+                return None
+            if position + 1 == len(node.text):
+                return self._finish(stack)
+            return stack[:-1] + (("lit", frame[1], position + 1),)
+
+        if kind == "str":
+            length = frame[2]
+            if length < 0:
+                return stack[:-1] + (("str", frame[1], 0),) if char == '"' else None
+            if char == '"':
+                return self._finish(stack)
+            if char == "\\" or char < " " or length >= node.max_length:
+                return None
+            return stack[:-1] + (("str", frame[1], length + 1),)
+
+        if kind == "enum":
+            typed = frame[2]
+            if typed is None:
+                return stack[:-1] + (("enum", frame[1], ""),) if char == '"' else None
+            if char == '"':
+                return self._finish(stack) if typed in node.options else None
+            typed += char
+            if not any(option.startswith(typed) for option in node.options):
+                return None
+            return stack[:-1] + (("enum", frame[1], typed),)
+
+        # Array phases: open -> first -> (in_item -> sep -> sep_space -> item -> in_item)* -> done
+        count, phase = frame[2], frame[3]
+        if phase == "open":
+            return stack[:-1] + (("arr", frame[1], 0, "first"),) if char == "[" else None
+        if phase in ("first", "sep") and char == "]":
+            return self._finish(stack)
+        if phase == "sep":
+            if char != "," or count >= node.max_items:
+                return None
+            return stack[:-1] + (("arr", frame[1], count, "sep_space"),)
+        if phase == "sep_space":
+            return stack[:-1] + (("arr", frame[1], count, "item"),) if char == " " else None
+        if phase in ("first", "item"):
+            if count >= node.max_items:
+                return None
+            item_stack = self._push(stack[:-1] + (("arr", frame[1], count, "in_item"),), node.item)
+            return self.step(item_stack, char)
+        return None
+
+    def step_text(self, stack: Tuple, text: str) -> Optional[Tuple]:
+        for char in text:
+            stack = self.step(stack, char)
+            if stack is None:
+                return None
+        return stack
+
+    # -- shortest way to a complete document ---------------------------------
+
+    def _min_text(self, node_id: int) -> str:
+        text = self._min_texts.get(node_id)
+        if text is None:
+            node = self.nodes[node_id]
+            if node.kind == "lit":
+                text = node.text
+            elif node.kind == "str":
+                text = '""'
+            elif node.kind == "enum":
+                text = '"' + min(node.options, key=len) + '"'
+            elif node.kind == "arr":
+                text = "[]"
+            else:
+                text = "".join(self._min_text(child) for child in node.children)
+            self._min_texts[node_id] = text
+        return text
+
+    def closing_text(self, stack: Tuple) -> str:
+        """Shortest text that completes the document from this state"""
+        parts = []
+        for frame in reversed(stack):
+            node = self.nodes[frame[1]]
+            kind = frame[0]
+            if kind == "lit":
+                parts.append(node.text[frame[2]:])
+            elif kind == "str":
+                parts.append('""' if frame[2] < 0 else '"')
+            elif kind == "enum":
+                if frame[2] is None:
+                    parts.append(self._min_text(frame[1]))
+                else:
+                    completions = [option for option in node.options if option.startswith(frame[2])]
+                    parts.append(min(completions, key=len)[len(frame[2]):] + '"')
+            elif kind == "seq":
+                parts.append("".join(self._min_text(child) for child in node.children[frame[2] + 1:]))
+            else:
+                phase = frame[3]
+                if phase == "open":
+                    parts.append("[]")
+                elif phase == "sep_space":
+                    parts.append(" " + self._min_text(node.item) + "]")
+                elif phase == "item":
+                    parts.append(self._min_text(node.item) + "]")
+                else:
+                    parts.append("]")
+        return "".join(parts)
+
+class TokenVocabulary:
+    """Decoded text of every token, indexed for fast allowed-token queries"""
+
+    def __init__(self, tokenizer):
+        size = len(tokenizer)
+        # Decoding after a reference token keeps leading spaces that decoding a
+        # lone token would strip (SentencePiece)
+        reference = tokenizer.encode("a", add_special_tokens=False)[-1:]
+        reference_text = tokenizer.decode(reference)
+        decoded = tokenizer.batch_decode([reference + [token_id] for token_id in range(size)])
+        special = set(tokenizer.all_special_ids)
+        self.texts: List[str] = [
+            "" if token_id in special or not text.startswith(reference_text) else text[len(reference_text):]
+            for token_id, text in enumerate(decoded)
+        ]
+        self.size = size
+        self.eos_token_id = tokenizer.eos_token_id
+
+        self.by_first_char: Dict[str, List[int]] = {}
+        quote_tokens = []
+        safe = torch.zeros(size, dtype=torch.bool)
+        lengths = torch.zeros(size, dtype=torch.long)
+        for token_id, text in enumerate(self.texts):
+            if not text:
+                continue
+            self.by_first_char.setdefault(text[0], []).append(token_id)
+            lengths[token_id] = len(text)
+            if '"' in text:
+                quote_tokens.append(token_id)
+            elif "\\" not in text and not any(char < " " for char in text):
+                safe[token_id] = True
+        # Tokens that can only ever extend the inside of a string
+        self.string_safe = safe
+        self.lengths = lengths
+        self.quote_tokens = quote_tokens
+
+_vocabularies: Dict[str, TokenVocabulary] = {}
+_vocabularies_lock = threading.Lock()
+
+def get_vocabulary(tokenizer) -> TokenVocabulary:
+    """Per-tokenizer vocabulary index, built once per process"""
+    key = f"{getattr(tokenizer, 'name_or_path', '')}:{len(tokenizer)}"
+    with _vocabularies_lock:
+        vocabulary = _vocabularies.get(key)
+        if vocabulary is None:
+            vocabulary = TokenVocabulary(tokenizer)
+            _vocabularies[key] = vocabulary
+        return vocabulary
+
+class JsonSchemaLogitsProcessor(LogitsProcessor):
+    """Restricts each row of a generate() call to tokens that keep its output schema-valid.
+
+    When the remaining token budget gets close to what is needed to close the
+    document, only tokens on the shortest closing path stay allowed, so the
+    output is complete JSON even when max_new_tokens is reached.
+    """
+
+    def __init__(self, automaton: SchemaAutomaton, vocabulary: TokenVocabulary, max_new_tokens: int):
+        self.automaton = automaton
+        self.vocabulary = vocabulary
+        self.max_new_tokens = max_new_tokens
+        self.states: Optional[List[Optional[Tuple]]] = None
+        self.steps = 0
+
+    def _allowed(self, state: Optional[Tuple], remaining_steps: int) -> torch.Tensor:
+        vocabulary = self.vocabulary
+        allowed = torch.zeros(vocabulary.size, dtype=torch.bool)
+        if not state:
+            # Document complete (or dead): end the sequence
+            allowed[vocabulary.eos_token_id] = True
+            return allowed
+
+        closing = self.automaton.closing_text(state)
+        if remaining_steps <= len(closing) + 1:
+            for token_id in vocabulary.by_first_char.get(closing[0], []):
+                if closing.startswith(vocabulary.texts[token_id]):
+                    allowed[token_id] = True
+            return self._never_empty(allowed, closing)
+
+        frame = state[-1]
+        if frame[0] == "str" and frame[2] >= 0:
+            # Inside a free string: any quote/escape-free token that fits, plus tokens that close it
+            room = self.automaton.nodes[frame[1]].max_length - frame[2]
+            allowed |= vocabulary.string_safe & (vocabulary.lengths <= room)
+            candidates = vocabulary.quote_tokens
+        else:
+            candidates = [
+                token_id
+                for char, token_ids in vocabulary.by_first_char.items()
+                if self.automaton.step(state, char) is not None
+                for token_id in token_ids
+            ]
+        for token_id in candidates:
+            if self.automaton.step_text(state, vocabulary.texts[token_id]) is not None:
+                allowed[token_id] = True
+        return self._never_empty(allowed, closing)
+
+    def _never_empty(self, allowed: torch.Tensor, closing: str) -> torch.Tensor:
+        """A row with every token masked samples NaN (or raises); fall back to the next
+        closing character as a token of its own, else end the sequence"""
+        if allowed.any():
+            return allowed
+        vocabulary = self.vocabulary
+        for token_id in vocabulary.by_first_char.get(closing[:1], []):
+            if vocabulary.texts[token_id] == closing[0]:
+                allowed[token_id] = True
+                return allowed
+        allowed[vocabulary.eos_token_id] = True
+        return allowed
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self.states is None:
+            self.states = [self.automaton.initial() for _ in range(input_ids.shape[0])]
+        else:
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                state = self.states[row]
+                if state:
+                    self.states[row] = self.automaton.step_text(state, self.vocabulary.texts[token_id])
+            self.steps += 1
+
+        remaining_steps = self.max_new_tokens - self.steps
+        mask = torch.zeros(scores.shape, dtype=torch.bool)
+        for row, state in enumerate(self.states):
+            # The model's output layer may be padded beyond the tokenizer's vocabulary
+            allowed = self._allowed(state, remaining_steps)[:scores.shape[1]]
+            mask[row, :allowed.shape[0]] = allowed
+        return scores.masked_fill(~mask.to(scores.device), float("-inf"))
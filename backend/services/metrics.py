@@ -0,0 +1,301 @@
+"""Counters, gauges and histograms for the analysis pipeline, exported as Prometheus text.
+
+Recording is a dict update under a lock (a few microseconds), so metrics stay on
+in production. Worker processes (inference workers, process-mode job workers)
+record into their own registry and ship the accumulated delta back with each
+result, where it is merged into the API process's registry.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; spans a JSON parse (sub-millisecond) to a CPU generation of a long transcript
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Starlette appends "; charset=utf-8" to text/ media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """For counters kept elsewhere (cache statistics), copied in by a collector"""
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> Iterable[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + "_total", self.labelnames, key, value
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, self.labelnames, key, value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                yield self.name + "_bucket", names, key + (_format_value(bound),), cumulative
+            yield self.name + "_sum", self.labelnames, key, state[-2]
+            yield self.name + "_count", self.labelnames, key, state[-1]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Called before every render, to refresh gauges from state kept elsewhere"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, labelvalues, value in metric.samples():
+                lines.append(f"{name}{_labels_text(labelnames, labelvalues)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def take_delta(self) -> Dict[str, List]:
+        """Everything recorded since the last call, as plain data; resets this registry"""
+        delta = {}
+        for name, metric in list(self._metrics.items()):
+            with metric._lock:
+                if metric._values:
+                    delta[name] = list(metric._values.items())
+                    metric._values = {}
+        return delta
+
+    def merge(self, delta: Optional[Dict[str, List]]):
+        """Add a delta taken in another process: counters and histograms add up, gauges take the new value"""
+        if not delta or not METRICS_ENABLED:
+            return
+        for name, values in delta.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            with metric._lock:
+                for key, value in values:
+                    key = tuple(key)
+                    if isinstance(metric, Histogram):
+                        state = metric._values.get(key)
+                        if state is None:
+                            metric._values[key] = list(value)
+                        else:
+                            for index, amount in enumerate(value):
+                                state[index] += amount
+                    elif isinstance(metric, Counter):
+                        metric._values[key] = metric._values.get(key, 0) + value
+                    else:
+                        metric._values[key] = value
+
+registry = MetricsRegistry()
+
+# Analyzer
+ANALYZER_STAGE_SECONDS = registry.histogram(
+    "analyzer_stage_seconds",
+    "Time per analyzer stage: model_load, chunk, tokenize, prefill, decode, request, parse_json, worker_roundtrip",
+    ("provider", "stage"),
+)
+ANALYZER_TOKENS = registry.counter(
+    "analyzer_tokens", "Prompt (in) and generated (out) tokens", ("provider", "direction")
+)
+ANALYZER_JSON_PARSE_FAILURES = registry.counter(
+    "analyzer_json_parse_failures", "Model outputs that held no parseable JSON object", ("provider",)
+)
+ANALYZER_MODEL_FALLBACKS = registry.counter(
+    "analyzer_model_fallbacks", "Hugging Face models that failed to load and fell back to GPT-2", ("model",)
+)
+ANALYZER_CHUNKS = registry.counter(
+    "analyzer_chunks", "Transcript chunks sent to the model, by outcome", ("provider", "outcome")
+)
+ANALYSIS_CACHE_REQUESTS = registry.counter(
+    "analysis_cache_requests", "Analysis cache lookups by result (hit, miss, batch_duplicate)", ("result",)
+)
+OPENAI_RETRIES = registry.counter(
+    "openai_retries", "OpenAI requests retried after a rate limit, connection or server error", ("error",)
+)
+
+# Jobs, routers and the database
+ANALYSIS_CONVERSATIONS = registry.counter(
+    "analysis_conversations", "Conversations processed by analysis endpoints and jobs, by outcome", ("outcome",)
+)
+DB_COMMIT_SECONDS = registry.histogram(
+    "db_commit_seconds", "Time to flush and commit writes", ("operation",)
+)
+UPLOAD_ROWS = registry.counter(
+    "upload_rows", "Uploaded conversations by outcome (inserted, skipped, error)", ("format", "outcome")
+)
+UPLOAD_SECONDS = registry.histogram(
+    "upload_seconds", "Duration of an upload request, parsing included", ("format",)
+)
+UPLOAD_ROWS_PER_SECOND = registry.gauge(
+    "upload_rows_per_second", "Rows per second of the most recent upload", ("format",)
+)
+CACHE_EVENTS = registry.counter(
+    "cache_events", "Response cache and analysis cache hits, misses, stores and evictions", ("cache", "event")
+)
+ANALYZER_REPLICAS = registry.gauge(
+    "analyzer_replicas", "Loaded analyzer replicas by state (in_use, idle)", ("provider", "model", "state")
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "db_pool_connections_checked_out", "Database connections currently in use", ("engine",)
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, labelled by route template so the cardinality stays bounded"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Routing records the matched route in the (shared) scope; responses served
+            # by the response cache never reach routing, but come from a fixed set of paths
+            route = getattr(scope.get("route"), "path", None)
+            if route is None:
+                route = scope["path"] if scope.get("response_cache_hit") else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=status
+            )
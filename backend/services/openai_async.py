@@ -0,0 +1,136 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from services.metrics import ANALYZER_STAGE_SECONDS, ANALYZER_TOKENS, OPENAI_RETRIES
+from services.rate_limiter import RateLimiter
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+OPENAI_MAX_RPM = float(os.getenv("OPENAI_MAX_RPM", "0")) or None
+OPENAI_MAX_TPM = float(os.getenv("OPENAI_MAX_TPM", "0")) or None
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+# Completion tokens reserved per request before the real usage is known
+OPENAI_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("OPENAI_COMPLETION_TOKEN_ESTIMATE", "600"))
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Rough prompt+completion token estimate (~4 characters per token)"""
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // 4 + OPENAI_COMPLETION_TOKEN_ESTIMATE
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class AsyncOpenAIBackend:
+    """Concurrent chat completions on a dedicated event loop thread.
+
+    One pooled HTTP client, concurrency semaphore and rate limiter are shared by
+    every analyzer replica in the process, so limits apply process-wide.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = OPENAI_BASE_URL,
+                 max_concurrency: int = OPENAI_MAX_CONCURRENCY):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="openai-async", daemon=True)
+        self._thread.start()
+        self._run(self._setup())
+
+    async def _setup(self):
+        self.http_client = httpx.AsyncClient(
+            timeout=OPENAI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=self.http_client,
+            max_retries=0  # retries are handled here, with jitter and rate limiting
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.limiter = RateLimiter(OPENAI_MAX_RPM, OPENAI_MAX_TPM)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _complete(self, model: str, messages: List[Dict], **kwargs) -> str:
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            async with self.semaphore:
+                await self.limiter.acquire(estimated)
+                start = time.perf_counter()
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        **kwargs
+                    )
+                except Exception as e:
+                    if not _is_retryable(e) or attempt >= OPENAI_MAX_RETRIES:
+                        raise
+                    OPENAI_RETRIES.inc(error=type(e).__name__)
+                    delay = _retry_after(e)
+                else:
+                    ANALYZER_STAGE_SECONDS.observe(time.perf_counter() - start, provider="openai", stage="request")
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        ANALYZER_TOKENS.inc(usage.prompt_tokens or 0, provider="openai", direction="in")
+                        ANALYZER_TOKENS.inc(usage.completion_tokens or 0, provider="openai", direction="out")
+                    self.limiter.record_usage(estimated, getattr(usage, "total_tokens", None))
+                    return response.choices[0].message.content
+            # Exponential backoff with full jitter, outside the semaphore
+            backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+            await asyncio.sleep(delay if delay is not None else random.uniform(0, backoff))
+            attempt += 1
+
+    async def _complete_many(self, model: str, requests: List[List[Dict]], **kwargs):
+        return await asyncio.gather(
+            *(self._complete(model, messages, **kwargs) for messages in requests),
+            return_exceptions=True
+        )
+
+    def complete_many(self, model: str, requests: List[List[Dict]], **kwargs) -> List[Union[str, Exception]]:
+        """Run many chat completions concurrently; failures are returned in place, not raised"""
+        return self._run(self._complete_many(model, requests, **kwargs))
+
+_backends: Dict[tuple, AsyncOpenAIBackend] = {}
+_backends_lock = threading.Lock()
+
+def get_openai_backend(api_key: str, base_url: Optional[str] = OPENAI_BASE_URL) -> AsyncOpenAIBackend:
+    """Process-wide backend per API key/base URL (recreated after fork)"""
+    key = (api_key, base_url)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None or backend.pid != os.getpid():
+            backend = AsyncOpenAIBackend(api_key, base_url)
+            _backends[key] = backend
+        return backend
@@ -0,0 +1,99 @@
+"""Prompt templates and generation settings shared by the LLM providers.
+
+Kept free of provider dependencies so PROMPT_VERSION (part of every analysis cache
+key) can be computed at startup without importing a model or SDK.
+"""
+import hashlib
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Prompts per padded micro-batch on the Hugging Face provider
+HUGGINGFACE_BATCH_SIZE = max(1, int(os.getenv("HUGGINGFACE_BATCH_SIZE", "4")))
+HUGGINGFACE_MAX_NEW_TOKENS = int(os.getenv("HUGGINGFACE_MAX_NEW_TOKENS", "800"))
+# Reuse the key/value cache of the fixed prompt text before the transcript
+HUGGINGFACE_PREFIX_CACHE = os.getenv("HUGGINGFACE_PREFIX_CACHE", "true").lower() == "true"
+# Mask tokens that would break the analysis JSON schema, and stop at its closing brace
+HUGGINGFACE_CONSTRAINED_JSON = os.getenv("HUGGINGFACE_CONSTRAINED_JSON", "true").lower() == "true"
+
+# Prompt templates. PROMPT_VERSION is derived from them, so editing a prompt
+# invalidates cached analyses produced with the old wording.
+OPENAI_SYSTEM_PROMPT = "You are an expert at analyzing customer conversations and extracting actionable insights. Always return valid JSON."
+
+OPENAI_PROMPT_TEMPLATE = """Analyze the following customer conversation transcript and extract key insights. 
+Return a JSON object with the following structure:
+{{
+    "pain_points": [{{"point": "description", "severity": "high/medium/low"}}],
+    "media_consumption": [{{"name": "media source", "type": "podcast/blog/social/etc"}}],
+    "compelling_points": [{{"point": "what made them interested", "category": "feature/benefit/use_case"}}],
+    "summary": "brief 2-3 sentence summary of the conversation"
+}}
+
+Focus on:
+- Pain points: What problems, challenges, or frustrations did the customer mention?
+- Media consumption: What podcasts, blogs, social media, newsletters, or other media did they mention consuming or following?
+- Compelling points: What features, benefits, or aspects of the product/service seemed to interest or excite them?
+
+Transcript:
+{transcript}
+
+Return ONLY valid JSON, no additional text."""
+
+HUGGINGFACE_SYSTEM_PROMPT = """You are an expert at analyzing customer conversations and extracting actionable insights. 
+Always return valid JSON without any additional text or explanation."""
+
+# One line, in json.dumps spacing: the form services.json_constraint accepts when
+# HUGGINGFACE_CONSTRAINED_JSON is on, and fewer tokens to generate either way
+HUGGINGFACE_PROMPT_TEMPLATE = """Analyze this customer conversation and return a JSON object on one line, formatted like:
+{{"pain_points": [{{"point": "description", "severity": "high/medium/low"}}], "media_consumption": [{{"name": "media source", "type": "podcast/blog/social/etc"}}], "compelling_points": [{{"point": "what made them interested", "category": "feature/benefit/use_case"}}], "summary": "brief 2-3 sentence summary"}}
+
+Focus on:
+- Pain points: Problems, challenges, frustrations mentioned
+- Media consumption: Podcasts, blogs, social media, newsletters mentioned
+- Compelling points: Features, benefits, aspects that interested them
+
+Conversation:
+{transcript}
+
+Return ONLY the JSON object:"""
+
+# Stands in for the transcript when splitting a prompt into its fixed prefix and suffix
+PROMPT_TRANSCRIPT_MARKER = "\x00transcript\x00"
+
+# Long transcripts are split on speaker turns into chunks that fill the model's
+# context window (measured with its tokenizer), analyzed in parallel and merged.
+OPENAI_CONTEXT_TOKENS = int(os.getenv("OPENAI_CONTEXT_TOKENS", "0")) or None  # default: by model name
+OPENAI_RESPONSE_TOKENS = int(os.getenv("OPENAI_RESPONSE_TOKENS", "1500"))
+OPENAI_MAX_CHUNK_TOKENS = int(os.getenv("OPENAI_MAX_CHUNK_TOKENS", "0")) or None
+HUGGINGFACE_CONTEXT_TOKENS = int(os.getenv("HUGGINGFACE_CONTEXT_TOKENS", "0")) or None  # default: model config
+
+# Longest matching prefix wins
+OPENAI_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+# Tokens per chat message beyond its content
+OPENAI_MESSAGE_OVERHEAD_TOKENS = 8
+
+PROMPT_VERSION = hashlib.sha256("\x00".join([
+    OPENAI_SYSTEM_PROMPT, OPENAI_PROMPT_TEMPLATE,
+    HUGGINGFACE_SYSTEM_PROMPT, HUGGINGFACE_PROMPT_TEMPLATE,
+    # Chunk boundaries change what the model sees
+    "speaker-turn-chunks", str(OPENAI_CONTEXT_TOKENS), str(OPENAI_RESPONSE_TOKENS), str(OPENAI_MAX_CHUNK_TOKENS),
+    str(HUGGINGFACE_CONTEXT_TOKENS), str(HUGGINGFACE_MAX_NEW_TOKENS), str(HUGGINGFACE_CONSTRAINED_JSON),
+    # Quantized weights give (slightly) different analyses than full precision
+    os.getenv("HUGGINGFACE_QUANTIZATION", "none").lower(),
+]).encode("utf-8")).hexdigest()[:12]
+
+def openai_context_window(model: str) -> int:
+    if OPENAI_CONTEXT_TOKENS:
+        return OPENAI_CONTEXT_TOKENS
+    matches = [prefix for prefix in OPENAI_CONTEXT_WINDOWS if model.startswith(prefix)]
+    return OPENAI_CONTEXT_WINDOWS[max(matches, key=len)] if matches else 8192
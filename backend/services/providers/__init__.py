@@ -0,0 +1,37 @@
+"""LLM provider plugins behind ConversationAnalyzer.
+
+A provider module (and whatever it needs: torch and transformers, the OpenAI SDK)
+is imported the first time an analyzer for it is created, not when the API boots,
+so startup and processes that never analyze stay light.
+"""
+import importlib
+from typing import Type
+
+from services.providers.base import ProviderBackend
+
+# LLM_PROVIDER value -> "module:class"
+PROVIDERS = {
+    "openai": "services.providers.openai:OpenAIProvider",
+    "huggingface": "services.providers.huggingface:HuggingFaceProvider",
+    "stub": "services.providers.stub:StubProvider",
+}
+
+INSTALL_HINTS = {
+    "openai": "pip install openai tiktoken",
+    "huggingface": "pip install transformers torch accelerate",
+}
+
+def load_provider(name: str) -> Type[ProviderBackend]:
+    """The provider class for an LLM_PROVIDER value, importing its module on first use"""
+    path = PROVIDERS.get(name)
+    if path is None:
+        raise ValueError(f"Invalid LLM_PROVIDER: {name}. Use one of: {', '.join(PROVIDERS)}")
+    module_name, class_name = path.split(":")
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        hint = INSTALL_HINTS.get(name)
+        raise ValueError(
+            f"The {name} provider is not available ({e})." + (f" Install with: {hint}" if hint else "")
+        ) from e
+    return getattr(module, class_name)
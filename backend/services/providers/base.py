@@ -0,0 +1,40 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from services.chunking import TokenCounter
+
+def extract_json_object(text: str) -> Optional[Dict]:
+    """Extract the first JSON object from text, handling cases where model adds extra text"""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            # raw_decode follows any nesting depth and ignores trailing text
+            value, _ = decoder.raw_decode(text, start)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+class ProviderBackend(ABC):
+    """One LLM backend: loads its model or client, and turns transcript chunks into analyses.
+
+    Caching, chunking and merging stay in ConversationAnalyzer; a provider only sets
+    model_name, token_counter and chunk_tokens (the transcript tokens that fit one
+    request) and implements run_batch.
+    """
+
+    name = ""
+    model_name: str
+    token_counter: TokenCounter
+    chunk_tokens: int
+    # Set by local-model providers, reported under "analyzers" by /api/config (AnalyzerPool.status)
+    generation_stats: Optional[Dict] = None
+    inference_report: Optional[Dict] = None
+
+    @abstractmethod
+    def run_batch(self, transcripts: List[str]) -> List:
+        """Raw output per transcript: a parsed dict, or the exception it raised"""
@@ -0,0 +1,269 @@
+import copy
+import json
+import time
+from typing import List, Optional
+
+import torch
+from transformers import DynamicCache, LogitsProcessorList, pipeline
+
+from services.chunking import HuggingFaceTokenCounter, chunk_budget
+from services.cpu_inference import (
+    HUGGINGFACE_QUANTIZATION, configure_threads, inference_report, load_dtype, quantize_model
+)
+from services.metrics import (
+    ANALYZER_JSON_PARSE_FAILURES, ANALYZER_MODEL_FALLBACKS, ANALYZER_STAGE_SECONDS, ANALYZER_TOKENS
+)
+from services.prompts import (
+    HUGGINGFACE_BATCH_SIZE, HUGGINGFACE_CONSTRAINED_JSON, HUGGINGFACE_CONTEXT_TOKENS, HUGGINGFACE_MAX_NEW_TOKENS,
+    HUGGINGFACE_PREFIX_CACHE, HUGGINGFACE_PROMPT_TEMPLATE, HUGGINGFACE_SYSTEM_PROMPT, PROMPT_TRANSCRIPT_MARKER
+)
+from services.providers.base import ProviderBackend, extract_json_object
+
+class _FirstTokenTimer:
+    """Logits processor that only records when generate() first asks for logits (end of prefill)"""
+
+    def __init__(self):
+        self.at = None
+
+    def __call__(self, input_ids, scores):
+        if self.at is None:
+            self.at = time.perf_counter()
+        return scores
+
+class HuggingFaceProvider(ProviderBackend):
+    name = "huggingface"
+
+    def __init__(self, model_name: str):
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        configure_threads()
+        load_start = time.perf_counter()
+
+        print(f"Loading Hugging Face model: {model_name} on {device}")
+
+        try:
+            # Use pipeline for easier text generation
+            self.pipeline = pipeline(
+                "text-generation",
+                model=model_name,
+                tokenizer=model_name,
+                device=0 if device == "cuda" else -1,
+                torch_dtype=torch.float16 if device == "cuda" else load_dtype(),
+                trust_remote_code=True,
+                model_kwargs={"attn_implementation": "eager"}  # Fix for compatibility
+            )
+            self.model_name = model_name
+            print(f"Model {model_name} loaded successfully!")
+        except Exception as e:
+            print(f"Error loading model {model_name}: {e}")
+            print("Falling back to GPT-2...")
+            ANALYZER_MODEL_FALLBACKS.inc(model=model_name)
+            # Fallback to a smaller, more stable model
+            try:
+                self.pipeline = pipeline(
+                    "text-generation",
+                    model="gpt2",
+                    device=-1,
+                    model_kwargs={"pad_token_id": 50256}
+                )
+                self.model_name = "gpt2"
+                print("Using GPT-2 as fallback")
+            except Exception as fallback_error:
+                raise ValueError(f"Could not load any Hugging Face model. Error: {fallback_error}")
+
+        quantization = HUGGINGFACE_QUANTIZATION if device == "cpu" else "none"
+        if quantization == "bf16" and self.pipeline.model.dtype != torch.bfloat16:
+            self.pipeline.model.to(torch.bfloat16)  # the GPT-2 fallback loads in float32
+        quantize_model(self.pipeline.model, quantization)
+        ANALYZER_STAGE_SECONDS.observe(time.perf_counter() - load_start, provider="huggingface", stage="model_load")
+
+        # Batched generation pads on the left so every prompt ends right before its new tokens
+        tokenizer = self.pipeline.tokenizer
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+        self.batch_size = HUGGINGFACE_BATCH_SIZE
+
+        # Context = prompt + transcript chunk + generated tokens. Short-context models
+        # generate less rather than leave almost no room for the transcript.
+        self.token_counter = HuggingFaceTokenCounter(tokenizer)
+        context_tokens = HUGGINGFACE_CONTEXT_TOKENS or self._context_window()
+        prompt_tokens = len(tokenizer(self.build_prompt(""))["input_ids"])
+        self.max_new_tokens = max(1, min(
+            HUGGINGFACE_MAX_NEW_TOKENS, context_tokens - prompt_tokens - context_tokens // 4
+        ))
+        self.chunk_tokens = chunk_budget(context_tokens, prompt_tokens, self.max_new_tokens)
+
+        # Everything before the transcript is the same for every conversation, so its
+        # past key/values are computed once and only the rest is prefilled per request
+        prompt_prefix, self.prompt_suffix = self.build_prompt(
+            PROMPT_TRANSCRIPT_MARKER
+        ).split(PROMPT_TRANSCRIPT_MARKER)
+        self.prefix_ids = tokenizer(prompt_prefix)["input_ids"]
+        self.prefix_cache_enabled = HUGGINGFACE_PREFIX_CACHE
+        self._prefix_cache = None
+
+        self.constrained_json = HUGGINGFACE_CONSTRAINED_JSON
+        if self.constrained_json:
+            from services.json_constraint import ANALYSIS_SCHEMA, SchemaAutomaton, get_vocabulary
+            self.json_automaton = SchemaAutomaton(ANALYSIS_SCHEMA)
+            self.json_vocabulary = get_vocabulary(tokenizer)
+        # New tokens actually generated (up to and including EOS), across all conversations
+        self.generation_stats = {"generations": 0, "generated_tokens": 0}
+
+        self.inference_report = inference_report(
+            self.pipeline.model, tokenizer, self.build_prompt("Customer: Hello."), quantization
+        )
+        print(
+            f"{self.model_name}: quantization={quantization}, threads={self.inference_report['threads']}, "
+            f"RSS {self.inference_report['rss_mb']} MB, {self.inference_report['tokens_per_second']} tokens/s"
+        )
+
+    def _context_window(self) -> int:
+        config = self.pipeline.model.config
+        for attribute in ("max_position_embeddings", "n_positions", "max_sequence_length"):
+            value = getattr(config, attribute, None)
+            if value:
+                return int(value)
+        model_max_length = self.pipeline.tokenizer.model_max_length
+        # Tokenizers without a limit report a huge sentinel value
+        return model_max_length if model_max_length < 1_000_000 else 2048
+
+    def build_prompt(self, transcript: str) -> str:
+        system_prompt = HUGGINGFACE_SYSTEM_PROMPT
+        user_prompt = HUGGINGFACE_PROMPT_TEMPLATE.format(transcript=transcript)
+
+        # Format prompt based on model type
+        if "chat" in self.model_name.lower() or "tinyllama" in self.model_name.lower():
+            # Chat-based models (TinyLlama, etc.)
+            return f"<|system|>\n{system_prompt}<|end|>\n<|user|>\n{user_prompt}<|end|>\n<|assistant|>\n"
+        elif "instruct" in self.model_name.lower() or "phi" in self.model_name.lower():
+            # Instruction-tuned models (Phi-3, etc.)
+            return f"<|system|>\n{system_prompt}<|end|>\n<|user|>\n{user_prompt}<|end|>\n<|assistant|>\n"
+        elif "mistral" in self.model_name.lower() or "mixtral" in self.model_name.lower():
+            return f"<s>[INST] {system_prompt}\n\n{user_prompt} [/INST]"
+        else:
+            # Generic format (GPT-2, etc.)
+            return f"{system_prompt}\n\n{user_prompt}\n\nJSON Response:\n"
+
+    def parse_output(self, generated_text: str):
+        """The analysis dict, or the JSONDecodeError to record when the output holds no JSON object"""
+        with ANALYZER_STAGE_SECONDS.time(provider="huggingface", stage="parse_json"):
+            result = extract_json_object(generated_text)
+        if result is None:
+            ANALYZER_JSON_PARSE_FAILURES.inc(provider="huggingface")
+            return json.JSONDecodeError("No JSON object in model output", generated_text, 0)
+        return result
+
+    def tokenize_prompts(self, transcripts: List[str]) -> List[List[int]]:
+        """Prompt token ids, tokenized as shared prefix + per-transcript rest so the prefix cache lines up"""
+        tokenizer = self.pipeline.tokenizer
+        rest = tokenizer(
+            [transcript + self.prompt_suffix for transcript in transcripts], add_special_tokens=False
+        )["input_ids"]
+        return [self.prefix_ids + ids for ids in rest]
+
+    def prefix_past_key_values(self, batch_size: int):
+        """A fresh copy of the prompt prefix's KV cache for batch_size rows, or None if unsupported"""
+        if self._prefix_cache is None:
+            model = self.pipeline.model
+            try:
+                cache = DynamicCache()
+                with torch.inference_mode():
+                    model(input_ids=torch.tensor([self.prefix_ids], device=model.device),
+                          past_key_values=cache, use_cache=True)
+                self._prefix_cache = cache
+            except Exception as e:
+                print(f"Prompt prefix cache unavailable for {self.model_name}: {e}")
+                self.prefix_cache_enabled = False
+                return None
+        # generate() appends to the cache it is given, so each call gets its own copy
+        past = copy.deepcopy(self._prefix_cache)
+        if batch_size > 1:
+            past.batch_repeat_interleave(batch_size)
+        return past
+
+    def generate_batch(self, input_ids: List[List[int]], max_new_tokens: Optional[int] = None,
+                       use_prefix_cache: Optional[bool] = None) -> List[str]:
+        """Generate for one micro-batch of tokenized prompts, returning only the new text"""
+        tokenizer = self.pipeline.tokenizer
+        model = self.pipeline.model
+        if use_prefix_cache is None:
+            use_prefix_cache = self.prefix_cache_enabled
+
+        prefix_length = len(self.prefix_ids)
+        past = None
+        if use_prefix_cache and all(ids[:prefix_length] == self.prefix_ids for ids in input_ids):
+            past = self.prefix_past_key_values(len(input_ids))
+
+        if past is not None:
+            # The cached prefix stays unpadded in front; padding goes between it and each
+            # row's transcript, and the attention mask hides it
+            suffixes = [ids[prefix_length:] for ids in input_ids]
+            width = max(len(ids) for ids in suffixes)
+            padded = [self.prefix_ids + [tokenizer.pad_token_id] * (width - len(ids)) + ids for ids in suffixes]
+            attention_mask = [[1] * prefix_length + [0] * (width - len(ids)) + [1] * len(ids) for ids in suffixes]
+            width += prefix_length
+        else:
+            # Left padding: every row's prompt ends at the same column
+            width = max(len(ids) for ids in input_ids)
+            padded = [[tokenizer.pad_token_id] * (width - len(ids)) + ids for ids in input_ids]
+            attention_mask = [[0] * (width - len(ids)) + [1] * len(ids) for ids in input_ids]
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        first_token = _FirstTokenTimer()
+        logits_processor = LogitsProcessorList([first_token])
+        if self.constrained_json:
+            from services.json_constraint import JsonSchemaLogitsProcessor
+            logits_processor.append(
+                JsonSchemaLogitsProcessor(self.json_automaton, self.json_vocabulary, max_new_tokens)
+            )
+        start = time.perf_counter()
+        with torch.inference_mode():
+            outputs = model.generate(
+                input_ids=torch.tensor(padded, device=model.device),
+                attention_mask=torch.tensor(attention_mask, device=model.device),
+                past_key_values=past,
+                max_new_tokens=max_new_tokens,
+                temperature=0.3,
+                do_sample=True,
+                top_p=0.95,
+                pad_token_id=tokenizer.pad_token_id,
+                logits_processor=logits_processor,
+            )
+        end = time.perf_counter()
+        new_tokens = outputs[:, width:]
+        # Logits of the first new token exist once the prompt is prefilled; the rest is decoding
+        prefilled = first_token.at or end
+        ANALYZER_STAGE_SECONDS.observe(prefilled - start, provider="huggingface", stage="prefill")
+        ANALYZER_STAGE_SECONDS.observe(end - prefilled, provider="huggingface", stage="decode")
+
+        eos_token_id = tokenizer.eos_token_id
+        batch_generated = 0
+        for row in new_tokens.tolist():
+            batch_generated += row.index(eos_token_id) + 1 if eos_token_id in row else len(row)
+        self.generation_stats["generated_tokens"] += batch_generated
+        self.generation_stats["generations"] += len(input_ids)
+        ANALYZER_TOKENS.inc(batch_generated, provider="huggingface", direction="out")
+        return tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+    def run_batch(self, transcripts: List[str]) -> List:
+        """Analyze using Hugging Face model, in padded micro-batches of similar prompt length"""
+        with ANALYZER_STAGE_SECONDS.time(provider="huggingface", stage="tokenize"):
+            input_ids = self.tokenize_prompts(transcripts)
+        ANALYZER_TOKENS.inc(sum(len(ids) for ids in input_ids), provider="huggingface", direction="in")
+
+        # Sorting by token length keeps padding (wasted compute) within a micro-batch small
+        order = sorted(range(len(transcripts)), key=lambda index: len(input_ids[index]))
+        results: List = [None] * len(transcripts)
+
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            try:
+                generated = self.generate_batch([input_ids[index] for index in batch])
+                for index, generated_text in zip(batch, generated):
+                    results[index] = self.parse_output(generated_text)
+            except Exception as e:
+                print(f"Error in Hugging Face generation: {e}")
+                for index in batch:
+                    results[index] = e
+
+        return results
@@ -0,0 +1,61 @@
+import json
+import os
+from typing import Dict, List
+
+from services.chunking import chunk_budget, openai_token_counter
+from services.metrics import ANALYZER_JSON_PARSE_FAILURES, ANALYZER_STAGE_SECONDS
+from services.openai_async import get_openai_backend
+from services.prompts import (
+    OPENAI_MAX_CHUNK_TOKENS, OPENAI_MESSAGE_OVERHEAD_TOKENS, OPENAI_PROMPT_TEMPLATE, OPENAI_RESPONSE_TOKENS,
+    OPENAI_SYSTEM_PROMPT, openai_context_window
+)
+from services.providers.base import ProviderBackend
+
+class OpenAIProvider(ProviderBackend):
+    name = "openai"
+
+    def __init__(self, model_name: str):
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables. Set LLM_PROVIDER=openai and provide OPENAI_API_KEY")
+        # Shared async client: concurrent, rate limited and retried
+        self.backend = get_openai_backend(api_key)
+        self.model_name = model_name
+
+        self.token_counter = openai_token_counter(model_name)
+        prompt_tokens = self.token_counter.count(
+            OPENAI_SYSTEM_PROMPT + OPENAI_PROMPT_TEMPLATE.format(transcript="")
+        ) + 2 * OPENAI_MESSAGE_OVERHEAD_TOKENS
+        self.chunk_tokens = chunk_budget(
+            openai_context_window(model_name), prompt_tokens, OPENAI_RESPONSE_TOKENS, OPENAI_MAX_CHUNK_TOKENS
+        )
+
+    def build_messages(self, transcript: str) -> List[Dict]:
+        prompt = OPENAI_PROMPT_TEMPLATE.format(transcript=transcript)
+
+        return [
+            {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def run_batch(self, transcripts: List[str]) -> List:
+        """Analyze using OpenAI, with all requests in flight concurrently"""
+        responses = self.backend.complete_many(
+            self.model_name,
+            [self.build_messages(transcript) for transcript in transcripts],
+            temperature=0.3,
+            max_tokens=OPENAI_RESPONSE_TOKENS,
+            response_format={"type": "json_object"}
+        )
+        results = []
+        for response in responses:
+            if isinstance(response, Exception):
+                results.append(response)
+                continue
+            try:
+                with ANALYZER_STAGE_SECONDS.time(provider="openai", stage="parse_json"):
+                    results.append(json.loads(response))
+            except json.JSONDecodeError as e:
+                ANALYZER_JSON_PARSE_FAILURES.inc(provider="openai")
+                results.append(e)
+        return results
@@ -0,0 +1,31 @@
+import json
+from typing import List
+
+from services.chunking import TokenCounter, chunk_budget
+from services.metrics import ANALYZER_JSON_PARSE_FAILURES, ANALYZER_STAGE_SECONDS
+from services.providers.base import ProviderBackend, extract_json_object
+from services.stub_llm import STUB_LLM_CONTEXT_TOKENS, STUB_LLM_RESPONSE_TOKENS, StubLLM
+
+class StubProvider(ProviderBackend):
+    """Deterministic local stand-in with configurable latency (benchmarks, development)"""
+
+    name = "stub"
+
+    def __init__(self, model_name: str):
+        self.backend = StubLLM()
+        self.model_name = model_name
+        self.token_counter = TokenCounter()
+        self.chunk_tokens = chunk_budget(STUB_LLM_CONTEXT_TOKENS, 0, STUB_LLM_RESPONSE_TOKENS)
+
+    def run_batch(self, transcripts: List[str]) -> List:
+        with ANALYZER_STAGE_SECONDS.time(provider="stub", stage="request"):
+            responses = self.backend.complete_many(transcripts)
+        results = []
+        for response in responses:
+            with ANALYZER_STAGE_SECONDS.time(provider="stub", stage="parse_json"):
+                result = extract_json_object(response)
+            if result is None:
+                ANALYZER_JSON_PARSE_FAILURES.inc(provider="stub")
+                result = json.JSONDecodeError("No JSON object in stub output", response, 0)
+            results.append(result)
+        return results
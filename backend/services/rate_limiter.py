@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` tokens per minute.
+
+    A bucket with no limit (None or 0) never waits.
+    """
+
+    def __init__(self, per_minute: Optional[float]):
+        self.capacity = float(per_minute) if per_minute else None
+        self.tokens = self.capacity or 0.0
+        self.rate = self.capacity / 60.0 if self.capacity else None
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        if self.capacity is None:
+            return
+        # A single request larger than the whole bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            async with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Charge (positive) or refund (negative) tokens once the real cost is known"""
+        if self.capacity is None:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits applied together"""
+
+    def __init__(self, requests_per_minute: Optional[float], tokens_per_minute: Optional[float]):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, estimated_tokens: int):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        if actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
@@ -0,0 +1,156 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from services.analyzer import ConversationAnalyzer, LLM_PROVIDER, resolve_model_name
+from services.inference_workers import INFERENCE_WORKERS, uses_inference_workers
+
+# Number of analyzer replicas per provider/model. Each replica owns its own
+# model instance, so on CPU this trades RAM for concurrent generations.
+ANALYZER_REPLICAS = max(1, int(os.getenv("ANALYZER_REPLICAS", "1")))
+ANALYZER_PRELOAD = os.getenv("ANALYZER_PRELOAD", "false").lower() == "true"
+ANALYZER_WARMUP = os.getenv("ANALYZER_WARMUP", "true").lower() == "true"
+# Seconds to wait for a free replica before giving up
+ANALYZER_ACQUIRE_TIMEOUT = float(os.getenv("ANALYZER_ACQUIRE_TIMEOUT", "300"))
+
+# Long enough to get past the "too short" guard in ConversationAnalyzer.analyze
+WARMUP_TRANSCRIPT = (
+    "Sales Rep: Thanks for joining. What is slowing your team down today? "
+    "Customer: Manual data entry on the shop floor, and we read about you on a podcast."
+)
+
+class AnalyzerPool:
+    """A fixed set of warm ConversationAnalyzer replicas for one provider/model"""
+
+    def __init__(self, provider: str, model_name: Optional[str], replicas: int = 1):
+        self.provider = provider
+        self.model_name = model_name
+        self.replicas = replicas
+        self.replica_models: List[Optional[str]] = []
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.loaded_at: Optional[datetime] = None
+        self.served = 0
+        self._analyzers: List[ConversationAnalyzer] = []
+        self._idle: "queue.Queue[ConversationAnalyzer]" = queue.Queue()
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Construct every replica (loads model weights once per replica)"""
+        start = time.perf_counter()
+        for _ in range(self.replicas):
+            analyzer = ConversationAnalyzer(provider=self.provider, model_name=self.model_name)
+            self.replica_models.append(getattr(analyzer, "model_name", None))
+            self._analyzers.append(analyzer)
+            self._idle.put(analyzer)
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = datetime.utcnow()
+        print(f"Loaded {self.replicas} {self.provider} analyzer replica(s) in {self.load_seconds:.2f}s")
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Check out a replica for exclusive use, returning it to the pool afterwards"""
+        try:
+            analyzer = self._idle.get(timeout=timeout or ANALYZER_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"No {self.provider} analyzer replica became free in time")
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield analyzer
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self.served += 1
+            self._idle.put(analyzer)
+
+    def warmup(self):
+        """Run one short analysis per replica so the first real request is not a cold start"""
+        start = time.perf_counter()
+        analyzers = [self._idle.get() for _ in range(self.replicas)]
+        try:
+            for analyzer in analyzers:
+                analyzer.analyze(WARMUP_TRANSCRIPT)
+        finally:
+            for analyzer in analyzers:
+                self._idle.put(analyzer)
+        self.warmup_seconds = time.perf_counter() - start
+
+    def status(self) -> Dict:
+        with self._lock:
+            in_use = self._in_use
+        workers = getattr(self._analyzers[0], "workers", None) if self._analyzers else None
+        # Local generation only: tokens decoded per conversation (lower with constrained JSON)
+        if workers is not None:
+            generations, generated_tokens = workers.generation_totals()
+            inference = workers.inference_report()
+        else:
+            generations = sum((getattr(a, "generation_stats", None) or {}).get("generations", 0) for a in self._analyzers)
+            generated_tokens = sum((getattr(a, "generation_stats", None) or {}).get("generated_tokens", 0) for a in self._analyzers)
+            inference = getattr(self._analyzers[0], "inference_report", None) if self._analyzers else None
+        return {
+            "provider": self.provider,
+            "model": self.model_name,
+            "loaded_models": self.replica_models,
+            "replicas": self.replicas,
+            "replicas_in_use": in_use,
+            "replicas_idle": self.replicas - in_use,
+            "requests_served": self.served,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "generated_tokens_per_conversation": round(generated_tokens / generations, 1) if generations else None,
+            # Quantization, threads, memory and decode speed measured when the first replica loaded
+            "inference": inference,
+            "inference_workers": workers.status() if workers is not None else None,
+        }
+
+class AnalyzerRegistry:
+    """Process-wide analyzer pools keyed by (provider, model)"""
+
+    def __init__(self, replicas: int = ANALYZER_REPLICAS):
+        self.replicas = replicas
+        self._pools: Dict[Tuple[str, Optional[str]], AnalyzerPool] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, provider: Optional[str] = None, model_name: Optional[str] = None,
+                 warmup: bool = False) -> AnalyzerPool:
+        """Return the pool for provider/model, loading it on first use"""
+        provider = provider or LLM_PROVIDER
+        model_name = model_name or resolve_model_name(provider)
+        key = (provider, model_name)
+
+        pool = self._pools.get(key)
+        if pool is not None:
+            return pool
+
+        # Loading holds the registry lock so concurrent first requests load the model once
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                # Replicas are thin clients when worker processes generate: at least one per worker
+                replicas = max(self.replicas, INFERENCE_WORKERS) if uses_inference_workers(provider) else self.replicas
+                pool = AnalyzerPool(provider, model_name, replicas)
+                pool.load()
+                if warmup:
+                    pool.warmup()
+                self._pools[key] = pool
+        return pool
+
+    def preload(self):
+        """Load (and optionally warm up) the default pool, e.g. at application startup"""
+        return self.get_pool(warmup=ANALYZER_WARMUP)
+
+    def status(self) -> List[Dict]:
+        return [pool.status() for pool in list(self._pools.values())]
+
+registry = AnalyzerRegistry()
+
+def get_analyzer_pool() -> AnalyzerPool:
+    """Return the default analyzer pool for the configured LLM provider"""
+    return registry.get_pool()
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_ITEMS = int(os.getenv("RESPONSE_CACHE_MAX_ITEMS", "512"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# GET endpoints the dashboard re-polls, and repeated searches; their bodies depend only on
+# path, query and stored data
+CACHED_PATHS = (
+    "/api/results/aggregate/summary",
+    "/api/results/list/all",
+    "/api/upload/stats",
+    "/api/search",
+)
+
+class DataVersion:
+    """Counter bumped whenever conversations or analysis results are committed in this process"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+data_version = DataVersion()
+
+def mark_data_changed(db: Session):
+    """Flag the session so its next successful commit invalidates cached responses"""
+    db.info["data_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    if session.info.pop("data_changed", False):
+        data_version.bump()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("data_changed", None)
+
+class _Entry:
+    __slots__ = ("version", "expires", "etag", "body", "content_type")
+
+    def __init__(self, version: int, expires: float, etag: str, body: bytes, content_type: Optional[bytes]):
+        self.version = version
+        self.expires = expires
+        self.etag = etag
+        self.body = body
+        self.content_type = content_type
+
+class ResponseCache:
+    """In-memory LRU of GET response bodies, keyed on path + query string.
+
+    Entries are valid while the data version they were computed at is current
+    and their TTL has not run out; the TTL also covers writes made by other
+    processes, which this process's version counter does not see.
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_items: int = RESPONSE_CACHE_MAX_ITEMS,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "stale": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry.version != data_version.value or entry.expires < time.monotonic():
+                self._remove(key)
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def set(self, key: str, version: int, body: bytes, content_type: Optional[bytes]) -> str:
+        etag = make_etag(body)
+        if len(body) > self.max_bytes:
+            return etag
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(version, time.monotonic() + self.ttl, etag, body, content_type)
+            self._bytes += len(body)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_items or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return etag
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def status(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "items": len(self._entries),
+                "bytes": self._bytes,
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "data_version": data_version.value
+            }
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def _etag_matches(if_none_match: Optional[bytes], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+    # Weak comparison, as for GET: W/"x" matches "x"
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+def _response_headers(etag: str, content_type: Optional[bytes], body: Optional[bytes]) -> Iterable[Tuple[bytes, bytes]]:
+    headers = [(b"etag", etag.encode("latin-1")), (b"cache-control", b"no-cache")]
+    if content_type:
+        headers.append((b"content-type", content_type))
+    if body is not None:
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    return headers
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving CACHED_PATHS from a ResponseCache, with ETag / If-None-Match 304s.
+
+    Cache-Control: no-cache makes browsers revalidate every time, so a repeat
+    poll of unchanged data costs a 304 with no body.
+    """
+
+    def __init__(self, app, cache: "ResponseCache", paths: Tuple[str, ...] = CACHED_PATHS):
+        self.app = app
+        self.cache = cache
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Same parameters in a different order are the same request
+        query = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        key = scope["path"] + "?" + urlencode(query)
+        if_none_match = _header(scope, b"if-none-match")
+        entry = self.cache.get(key)
+        if entry is not None:
+            scope["response_cache_hit"] = True
+            await self._send(send, entry.etag, entry.content_type, entry.body, if_none_match)
+            return
+
+        # The version is read before computing, so a write that lands meanwhile makes this entry stale
+        version = data_version.value
+        start_message = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        if start_message is None or start_message["status"] != 200:
+            # Errors pass through untouched and uncached
+            if start_message is not None:
+                await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        content_type = next((value for name, value in start_message["headers"] if name == b"content-type"), None)
+        etag = self.cache.set(key, version, body, content_type)
+        await self._send(send, etag, content_type, body, if_none_match)
+
+    async def _send(self, send, etag: str, content_type: Optional[bytes], body: bytes, if_none_match: Optional[bytes]):
+        if _etag_matches(if_none_match, etag):
+            self.cache.record_not_modified()
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": list(_response_headers(etag, None, None))})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": list(_response_headers(etag, content_type, body))})
+        await send({"type": "http.response.body", "body": body})
+
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
@@ -0,0 +1,375 @@
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+SEARCH_ENABLED = os.getenv("SEARCH_ENABLED", "true").lower() == "true"
+# Stemming language for PostgreSQL text search (SQLite uses the porter stemmer)
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+class SearchQueryError(ValueError):
+    pass
+
+# Text of every pain point, media item and compelling point of an analysis row
+# (items are objects or plain strings, as in services.insights.INSIGHT_FIELDS)
+_SQLITE_INSIGHTS_TEXT = """(
+    SELECT group_concat(CASE WHEN item.type = 'object' THEN coalesce(
+        json_extract(item.value, '$.point'), json_extract(item.value, '$.text'),
+        json_extract(item.value, '$.name'), json_extract(item.value, '$.source'), '')
+        ELSE item.value END, ' ')
+    FROM (
+        SELECT type, value FROM json_each({row}.pain_points)
+        UNION ALL SELECT type, value FROM json_each({row}.media_consumption)
+        UNION ALL SELECT type, value FROM json_each({row}.compelling_points)
+    ) AS item
+)"""
+
+# Text of a conversation row, kept in the row or in a compressed blob
+# (transcript_text() is registered on every connection, see services/transcript_store.py)
+_SQLITE_TRANSCRIPT_TEXT = """coalesce({row}.transcript, (
+    SELECT transcript_text(codec, dictionary_id, data) FROM transcript_blobs
+    WHERE content_hash = {row}.transcript_hash
+))"""
+
+# Transcripts and analyses live in separate FTS5 tables so saving an analysis
+# never re-tokenizes the (much longer) transcript. Triggers keep both in sync
+# with every writer: bulk uploads, job workers in other processes, deletes.
+# The transcript index stores no copy of the text: snippets read it back (and
+# decompress it) through a view, for the rows on the page being returned.
+_SQLITE_DDL = [
+    f"""CREATE VIEW IF NOT EXISTS conversation_search_content AS
+        SELECT conversations.id AS id, {_SQLITE_TRANSCRIPT_TEXT.format(row="conversations")} AS transcript,
+               conversations.source AS source
+        FROM conversations""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS conversation_search USING fts5(
+        transcript, source UNINDEXED, content = 'conversation_search_content', content_rowid = 'id',
+        tokenize = 'porter unicode61')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS result_search USING fts5(
+        summary, insights, conversation_id UNINDEXED, tokenize = 'porter unicode61')""",
+    # Skipped for rows inserted inside deferred_conversation_index(), which indexes them afterwards
+    f"""CREATE TRIGGER IF NOT EXISTS conversation_search_insert AFTER INSERT ON conversations
+        WHEN NOT search_index_deferred(NEW.id) BEGIN
+        INSERT INTO conversation_search (rowid, transcript, source)
+        VALUES (NEW.id, {_SQLITE_TRANSCRIPT_TEXT.format(row="NEW")}, NEW.source);
+    END""",
+    # Moving a transcript into a blob leaves its text, and so the index, unchanged
+    f"""CREATE TRIGGER IF NOT EXISTS conversation_search_update AFTER UPDATE OF transcript, transcript_hash, source
+        ON conversations
+        WHEN OLD.source IS NOT NEW.source
+          OR {_SQLITE_TRANSCRIPT_TEXT.format(row="OLD")} IS NOT {_SQLITE_TRANSCRIPT_TEXT.format(row="NEW")}
+        BEGIN
+        INSERT INTO conversation_search (conversation_search, rowid, transcript, source)
+        VALUES ('delete', OLD.id, {_SQLITE_TRANSCRIPT_TEXT.format(row="OLD")}, OLD.source);
+        INSERT INTO conversation_search (rowid, transcript, source)
+        VALUES (NEW.id, {_SQLITE_TRANSCRIPT_TEXT.format(row="NEW")}, NEW.source);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS conversation_search_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversation_search (conversation_search, rowid, transcript, source)
+        VALUES ('delete', OLD.id, {_SQLITE_TRANSCRIPT_TEXT.format(row="OLD")}, OLD.source);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS result_search_insert AFTER INSERT ON analysis_results BEGIN
+        INSERT INTO result_search (rowid, summary, insights, conversation_id)
+        VALUES (NEW.id, NEW.summary, {_SQLITE_INSIGHTS_TEXT.format(row="NEW")}, NEW.conversation_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS result_search_delete AFTER DELETE ON analysis_results BEGIN
+        DELETE FROM result_search WHERE rowid = OLD.id;
+    END""",
+]
+
+_SQLITE_INDEX_RANGE = """INSERT INTO conversation_search (rowid, transcript, source)
+    SELECT id, transcript, source FROM conversation_search_content WHERE id BETWEEN ? AND ?"""
+
+_SQLITE_BACKFILL = [
+    "INSERT INTO conversation_search (conversation_search) VALUES ('rebuild')",
+    f"""INSERT INTO result_search (rowid, summary, insights, conversation_id)
+        SELECT analysis_results.id, analysis_results.summary, {_SQLITE_INSIGHTS_TEXT.format(row="analysis_results")},
+               analysis_results.conversation_id
+        FROM analysis_results""",
+]
+
+def _postgres_ddl(language: str) -> List[str]:
+    # Generated columns are maintained by PostgreSQL itself on every insert and update
+    return [
+        f"""ALTER TABLE conversations ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('{language}', coalesce(transcript, ''))) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_conversations_search_vector ON conversations USING GIN (search_vector)",
+        f"""ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{language}', coalesce(summary, '')), 'B') ||
+                setweight(to_tsvector('{language}', coalesce(pain_points, '[]'::json)), 'A') ||
+                setweight(to_tsvector('{language}', coalesce(media_consumption, '[]'::json)), 'A') ||
+                setweight(to_tsvector('{language}', coalesce(compelling_points, '[]'::json)), 'A')
+            ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_analysis_results_search_vector ON analysis_results USING GIN (search_vector)",
+    ]
+
+class _DeferredIndex:
+    """search_index_deferred(row_id) of one connection: while active, records the
+    range of inserted conversation ids and tells the insert trigger to skip them"""
+
+    def __init__(self):
+        self.active = False
+        self.low: Optional[int] = None
+        self.high: Optional[int] = None
+
+    def __call__(self, row_id: int) -> int:
+        if not self.active:
+            return 0
+        if self.low is None or row_id < self.low:
+            self.low = row_id
+        if self.high is None or row_id > self.high:
+            self.high = row_id
+        return 1
+
+def register_sqlite_functions(engine: Engine):
+    """search_index_deferred(row_id) on every new connection, for the conversation insert trigger"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _register_search_index_deferred(dbapi_connection, connection_record):
+        deferred = _DeferredIndex()
+        connection_record.info["search_index_deferred"] = deferred
+        dbapi_connection.create_function("search_index_deferred", 1, deferred)
+
+@contextmanager
+def deferred_conversation_index(connection: Connection):
+    """Index the conversations inserted on this connection within the block with one
+    INSERT ... SELECT at the end, instead of one trigger-driven FTS5 insert per row.
+
+    The block's inserts hold SQLite's write lock until commit, so every row in the
+    recorded id range is one of them. Other connections keep indexing row by row.
+    """
+    deferred = connection.connection.info.get("search_index_deferred")
+    if deferred is None:
+        yield
+        return
+    deferred.active, deferred.low, deferred.high = True, None, None
+    try:
+        yield
+    finally:
+        deferred.active = False
+    if deferred.low is not None:
+        connection.exec_driver_sql(_SQLITE_INDEX_RANGE, (deferred.low, deferred.high))
+
+def _drop_outdated_sqlite_index(connection) -> bool:
+    """Drop the indexes if the transcript index keeps its own copy of the text (from
+    before the transcript blob store). Returns whether the indexes have to be built."""
+    definition = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE name = 'conversation_search'"
+    ).scalar()
+    if definition is None:
+        return True
+    if "content_rowid" in definition:
+        return False
+    for trigger in ("conversation_search_insert", "conversation_search_update", "conversation_search_delete"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    connection.exec_driver_sql("DROP TABLE conversation_search")
+    connection.exec_driver_sql("DROP TABLE IF EXISTS result_search")
+    for trigger in ("result_search_insert", "result_search_delete"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    return True
+
+def ensure_search_index(engine: Engine) -> bool:
+    """Create the search index (and fill it from existing rows) if missing. Returns whether search is available."""
+    if not SEARCH_ENABLED:
+        return False
+    dialect = engine.dialect.name
+    try:
+        return _create_search_index(engine, dialect)
+    except SQLAlchemyError as e:
+        # e.g. SQLite built without FTS5, or no rights to create the PostgreSQL functions
+        print(f"Full-text search is unavailable: {e}")
+        return False
+
+def _create_search_index(engine: Engine, dialect: str) -> bool:
+    if dialect == "sqlite":
+        with engine.begin() as connection:
+            created = _drop_outdated_sqlite_index(connection)
+            insert_trigger = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE name = 'conversation_search_insert'"
+            ).scalar()
+            if insert_trigger is not None and "search_index_deferred" not in insert_trigger:
+                # Recreated below with the bulk insert switch
+                connection.exec_driver_sql("DROP TRIGGER conversation_search_insert")
+            for statement in _SQLITE_DDL:
+                connection.exec_driver_sql(statement)
+            if created:
+                for statement in _SQLITE_BACKFILL:
+                    connection.exec_driver_sql(statement)
+        if created:
+            print("Built the full-text search index")
+        return True
+    if dialect == "postgresql":
+        with engine.begin() as connection:
+            for statement in _postgres_ddl(SEARCH_LANGUAGE):
+                connection.exec_driver_sql(statement)
+        return True
+    print(f"Full-text search is not supported on {dialect}")
+    return False
+
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+def fts5_query(query: str) -> str:
+    """User input as an FTS5 expression: every word or "quoted phrase" must match, word* is a prefix.
+
+    Terms are quoted so punctuation and FTS5 operators in the input cannot cause syntax errors.
+    """
+    terms = []
+    for phrase, word in _TERM.findall(query):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        parts = [f'"{part}"' for part in re.findall(r"\w+", word)]
+        if parts and word.endswith("*"):
+            parts[-1] += "*"
+        terms.extend(parts)
+    if not terms:
+        raise SearchQueryError("Search query has no searchable words")
+    return " ".join(terms)
+
+def _sqlite_search(db: Session, query: str, source: Optional[str], limit: int, offset: int,
+                   include_total: bool) -> Tuple[Optional[int], List[Dict]]:
+    match = fts5_query(query)
+    # bm25 is lower-is-better; analysis text is weighted over the raw transcript
+    hits = """
+        WITH hits AS (
+            SELECT id, sum(score) AS score FROM (
+                SELECT rowid AS id, bm25(conversation_search) AS score
+                FROM conversation_search WHERE conversation_search MATCH :match
+                UNION ALL
+                SELECT conversation_id AS id, 2.0 * bm25(result_search, 1.0, 1.5) AS score
+                FROM result_search WHERE result_search MATCH :match
+            ) GROUP BY id
+        )
+    """
+    source_filter = "WHERE conversations.source = :source" if source else ""
+    params = {"match": match, "source": source, "limit": limit, "offset": offset}
+    rows = db.execute(text(hits + f"""
+        SELECT conversations.id, conversations.conversation_id, conversations.source, hits.score
+        FROM hits JOIN conversations ON conversations.id = hits.id
+        {source_filter}
+        ORDER BY hits.score, conversations.id
+        LIMIT :limit OFFSET :offset
+    """), params).all()
+    total = None
+    if include_total:
+        total = db.execute(text(hits + f"""
+            SELECT count(*) FROM hits JOIN conversations ON conversations.id = hits.id {source_filter}
+        """), params).scalar()
+    if not rows:
+        return total, []
+
+    # Highlights only for the page being returned
+    ids = [row.id for row in rows]
+    id_params = {f"id_{index}": conversation_id for index, conversation_id in enumerate(ids)}
+    id_list = ", ".join(f":id_{index}" for index in range(len(ids)))
+    transcript_snippets = dict(db.execute(text(f"""
+        SELECT rowid, snippet(conversation_search, 0, :start, :end, '…', {SNIPPET_TOKENS})
+        FROM conversation_search WHERE conversation_search MATCH :match AND rowid IN ({id_list})
+    """), {"match": match, "start": HIGHLIGHT_START, "end": HIGHLIGHT_END, **id_params}).all())
+    analysis_snippets: Dict[int, Tuple[int, str]] = {}
+    for conversation_id, result_id, snippet in db.execute(text(f"""
+        SELECT conversation_id, rowid, snippet(result_search, -1, :start, :end, '…', {SNIPPET_TOKENS})
+        FROM result_search WHERE result_search MATCH :match AND conversation_id IN ({id_list})
+        ORDER BY rowid
+    """), {"match": match, "start": HIGHLIGHT_START, "end": HIGHLIGHT_END, **id_params}).all():
+        analysis_snippets[int(conversation_id)] = (result_id, snippet)
+    latest_results = dict(db.execute(text(f"""
+        SELECT conversation_id, max(id) FROM analysis_results WHERE conversation_id IN ({id_list})
+        GROUP BY conversation_id
+    """), id_params).all())
+
+    return total, [
+        {
+            "conversation_id": row.id,
+            "source_conversation_id": row.conversation_id,
+            "source": row.source,
+            "result_id": latest_results.get(row.id),
+            "score": round(-row.score, 4),
+            "transcript_snippet": transcript_snippets.get(row.id),
+            "analysis_snippet": analysis_snippets.get(row.id, (None, None))[1],
+        }
+        for row in rows
+    ]
+
+def _postgres_search(db: Session, query: str, source: Optional[str], limit: int, offset: int,
+                     include_total: bool) -> Tuple[Optional[int], List[Dict]]:
+    language = SEARCH_LANGUAGE
+    # websearch_to_tsquery accepts free text, "phrases", OR and -exclusions without syntax errors
+    hits = f"""
+        WITH search AS (SELECT websearch_to_tsquery('{language}', :query) AS query),
+        hits AS (
+            SELECT id, sum(score) AS score FROM (
+                SELECT conversations.id, ts_rank_cd(conversations.search_vector, search.query) AS score
+                FROM conversations, search WHERE conversations.search_vector @@ search.query
+                UNION ALL
+                SELECT analysis_results.conversation_id, 2 * ts_rank_cd(analysis_results.search_vector, search.query)
+                FROM analysis_results, search WHERE analysis_results.search_vector @@ search.query
+            ) AS matched GROUP BY id
+        )
+    """
+    source_filter = "WHERE conversations.source = :source" if source else ""
+    params = {"query": query, "source": source, "limit": limit, "offset": offset}
+    total = None
+    if include_total:
+        total = db.execute(text(hits + f"""
+            SELECT count(*) FROM hits JOIN conversations ON conversations.id = hits.id {source_filter}
+        """), params).scalar()
+    options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords={SNIPPET_TOKENS * 2}, MinWords={SNIPPET_TOKENS // 2}"
+    # ts_headline re-parses the document, so it only runs on the page of results
+    rows = db.execute(text(hits + f"""
+        , page AS (
+            SELECT conversations.id, conversations.conversation_id, conversations.source,
+                   conversations.transcript, hits.score
+            FROM hits JOIN conversations ON conversations.id = hits.id
+            {source_filter}
+            ORDER BY hits.score DESC, conversations.id
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT page.id, page.conversation_id, page.source, page.score, latest.id AS result_id,
+               CASE WHEN to_tsvector('{language}', coalesce(page.transcript, '')) @@ search.query
+                    THEN ts_headline('{language}', page.transcript, search.query, :options) END AS transcript_snippet,
+               CASE WHEN latest.search_vector @@ search.query
+                    THEN ts_headline('{language}', latest.summary, search.query, :options) END AS analysis_snippet
+        FROM page CROSS JOIN search
+        LEFT JOIN LATERAL (
+            SELECT analysis_results.id, analysis_results.summary, analysis_results.search_vector
+            FROM analysis_results WHERE analysis_results.conversation_id = page.id
+            ORDER BY analysis_results.id DESC LIMIT 1
+        ) AS latest ON true
+        ORDER BY page.score DESC, page.id
+    """), {**params, "options": options}).all()
+    return total, [
+        {
+            "conversation_id": row.id,
+            "source_conversation_id": row.conversation_id,
+            "source": row.source,
+            "result_id": row.result_id,
+            "score": round(float(row.score), 4),
+            "transcript_snippet": row.transcript_snippet,
+            "analysis_snippet": row.analysis_snippet,
+        }
+        for row in rows
+    ]
+
+def search_conversations(db: Session, query: str, source: Optional[str] = None, limit: int = 20,
+                         offset: int = 0, include_total: bool = False) -> Tuple[Optional[int], List[Dict]]:
+    """(total matches if asked for, one page of conversations ranked by relevance with highlighted snippets)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return _sqlite_search(db, query, source, limit, offset, include_total)
+    if dialect == "postgresql":
+        return _postgres_search(db, query, source, limit, offset, include_total)
+    raise SearchQueryError(f"Full-text search is not supported on {dialect}")
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Dict, List
+
+# LLM_PROVIDER=stub: a deterministic local stand-in for OpenAI / Hugging Face, for
+# benchmarks and development without a model or API key. The same transcript always
+# gives the same analysis; requests take STUB_LLM_LATENCY_MS each, with up to
+# STUB_LLM_CONCURRENCY of them in flight (as with the async OpenAI client).
+STUB_LLM_MODEL = os.getenv("STUB_LLM_MODEL", "stub-v1")
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+STUB_LLM_CONCURRENCY = max(1, int(os.getenv("STUB_LLM_CONCURRENCY", "64")))
+STUB_LLM_CONTEXT_TOKENS = int(os.getenv("STUB_LLM_CONTEXT_TOKENS", "8192"))
+STUB_LLM_RESPONSE_TOKENS = 600
+
+# Phrases the stub "extracts" when they occur in a transcript; benchmarks.corpus
+# plants them in synthetic conversations so aggregates look like real data.
+PAIN_POINTS = [
+    "manual data entry", "paper-based tracking", "no real-time visibility", "compliance documentation",
+    "slow onboarding", "quality escapes", "spreadsheet errors", "disconnected systems",
+    "unplanned downtime", "audit preparation", "training new operators", "inaccurate forecasts",
+]
+MEDIA = [
+    ("Industry 4.0 Podcast", "podcast"), ("Manufacturing Happy Hour", "podcast"),
+    ("Manufacturing Today", "magazine"), ("Harvard Business Review", "magazine"),
+    ("LinkedIn", "social"), ("The Lean Newsletter", "newsletter"), ("Gartner", "analyst"),
+    ("Reddit", "social"),
+]
+COMPELLING_POINTS = [
+    ("real-time dashboards", "feature"), ("no-code apps", "feature"), ("automated audit trails", "feature"),
+    ("machine monitoring", "feature"), ("faster onboarding", "benefit"), ("fewer data entry errors", "benefit"),
+    ("traceability", "use_case"), ("digital work instructions", "use_case"),
+]
+SEVERITIES = ("high", "medium", "low")
+
+def _digest(transcript: str) -> bytes:
+    return hashlib.sha256(transcript.encode("utf-8")).digest()
+
+def stub_analysis(transcript: str) -> Dict:
+    """The analysis the stub model returns for a transcript"""
+    text = transcript.lower()
+    digest = _digest(transcript)
+    pain_points = [
+        {"point": point, "severity": SEVERITIES[digest[index % len(digest)] % len(SEVERITIES)]}
+        for index, point in enumerate(PAIN_POINTS) if point in text
+    ]
+    media = [{"name": name, "type": kind} for name, kind in MEDIA if name.lower() in text]
+    compelling = [{"point": point, "category": category} for point, category in COMPELLING_POINTS if point in text]
+    topics = [item["point"] for item in pain_points[:2]] or ["their current process"]
+    return {
+        "pain_points": pain_points,
+        "media_consumption": media,
+        "compelling_points": compelling,
+        "summary": f"Customer discussed {' and '.join(topics)}. "
+                   f"They showed interest in {compelling[0]['point'] if compelling else 'a follow-up demo'}.",
+    }
+
+class StubLLM:
+    def __init__(self, latency_ms: float = STUB_LLM_LATENCY_MS, concurrency: int = STUB_LLM_CONCURRENCY):
+        self.latency_ms = latency_ms
+        self.concurrency = concurrency
+
+    def complete_many(self, transcripts: List[str]) -> List[str]:
+        """JSON text per transcript, after the latency of len(transcripts) requests run concurrently"""
+        if self.latency_ms and transcripts:
+            time.sleep(math.ceil(len(transcripts) / self.concurrency) * self.latency_ms / 1000)
+        return [json.dumps(stub_analysis(transcript)) for transcript in transcripts]
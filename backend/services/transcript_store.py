@@ -0,0 +1,419 @@
+"""Compressed, content-addressed transcript storage.
+
+Each distinct transcript is stored once in transcript_blobs, keyed by the SHA-256
+of its text and compressed with zstd (zlib when the zstandard package is not
+installed), optionally against a dictionary trained on stored transcripts.
+Conversations reference their blob by transcript_hash, so a transcript uploaded
+again under another conversation_id costs one more hash, not another copy.
+Conversation.transcript loads the compressed bytes on first access and
+decompresses them once per loaded blob.
+
+Conversations stored before the blob store keep their text in the row until
+
+    python -m services.transcript_store migrate [--train-dictionary] [--vacuum]
+
+moves them, printing the compression ratio and read latency before and after.
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+
+try:
+    import zstandard
+except ImportError:  # zlib fallback: a lower ratio, but no extra dependency
+    zstandard = None
+
+# "blobs" or "inline" (text in conversations.transcript, as before the store)
+TRANSCRIPT_STORE = os.getenv("TRANSCRIPT_STORE", "blobs").lower()
+TRANSCRIPT_ZSTD_LEVEL = int(os.getenv("TRANSCRIPT_ZSTD_LEVEL", "3"))
+TRANSCRIPT_ZLIB_LEVEL = int(os.getenv("TRANSCRIPT_ZLIB_LEVEL", "6"))
+# Compress new transcripts against the newest trained dictionary, if there is one
+TRANSCRIPT_USE_DICTIONARY = os.getenv("TRANSCRIPT_USE_DICTIONARY", "true").lower() == "true"
+
+# zstd's default dictionary size; training wants at least a few hundred samples
+DICTIONARY_SIZE = 112640
+DICTIONARY_SAMPLES = 10000
+MIN_DICTIONARY_SAMPLES = 200
+MIGRATION_BATCH_SIZE = 1000
+
+def content_hash(transcript: str) -> str:
+    return hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+
+def blob_store_enabled(dialect_name: str) -> bool:
+    """Blobs are SQLite-only: PostgreSQL already compresses long text values (TOAST)
+    and its search index is a column generated from the text in the row"""
+    return TRANSCRIPT_STORE == "blobs" and dialect_name == "sqlite"
+
+class _Codecs:
+    """Trained dictionaries, and per-thread zstd (de)compressors (which are not thread safe)"""
+
+    def __init__(self):
+        self._dictionaries: Dict[int, bytes] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.current_dictionary: Optional[int] = None
+
+    def add_dictionary(self, dictionary_id: int, data: bytes, current: bool = False):
+        with self._lock:
+            self._dictionaries[dictionary_id] = bytes(data)
+            if current and TRANSCRIPT_USE_DICTIONARY:
+                self.current_dictionary = dictionary_id
+
+    def _dictionary(self, dictionary_id: int):
+        data = self._dictionaries.get(dictionary_id)
+        if data is None:
+            # Trained (by the migration command) after this process loaded the dictionaries
+            from database import engine
+            with engine.connect() as connection:
+                data = connection.exec_driver_sql(
+                    "SELECT data FROM transcript_dictionaries WHERE id = ?", (dictionary_id,)
+                ).scalar()
+            if data is None:
+                raise ValueError(f"Transcript dictionary {dictionary_id} not found")
+            self.add_dictionary(dictionary_id, data)
+            data = self._dictionaries[dictionary_id]
+        return zstandard.ZstdCompressionDict(data)
+
+    def compressor(self, dictionary_id: Optional[int]):
+        compressors = self._local.__dict__.setdefault("compressors", {})
+        compressor = compressors.get(dictionary_id)
+        if compressor is None:
+            dictionary = self._dictionary(dictionary_id) if dictionary_id is not None else None
+            compressor = compressors[dictionary_id] = zstandard.ZstdCompressor(
+                level=TRANSCRIPT_ZSTD_LEVEL, dict_data=dictionary
+            )
+        return compressor
+
+    def decompressor(self, dictionary_id: Optional[int]):
+        decompressors = self._local.__dict__.setdefault("decompressors", {})
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            dictionary = self._dictionary(dictionary_id) if dictionary_id is not None else None
+            decompressor = decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor
+
+_codecs = _Codecs()
+
+def _encode(raw: bytes, digest: str) -> Dict:
+    """The transcript_blobs row for UTF-8 transcript bytes"""
+    if zstandard is not None:
+        dictionary_id = _codecs.current_dictionary
+        codec, data = "zstd", _codecs.compressor(dictionary_id).compress(raw)
+    else:
+        dictionary_id = None
+        codec, data = "zlib", zlib.compress(raw, TRANSCRIPT_ZLIB_LEVEL)
+    if len(data) >= len(raw):
+        # Very short transcripts grow under compression
+        codec, dictionary_id, data = "raw", None, raw
+    return {"content_hash": digest, "codec": codec, "dictionary_id": dictionary_id, "size": len(raw), "data": data}
+
+def encode_transcript(transcript: str) -> Dict:
+    raw = transcript.encode("utf-8")
+    return _encode(raw, hashlib.sha256(raw).hexdigest())
+
+def decode_transcript(codec: str, dictionary_id: Optional[int], data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Transcript is zstd-compressed. Install with: pip install zstandard")
+        raw = _codecs.decompressor(dictionary_id).decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    elif codec == "raw":
+        raw = data
+    else:
+        raise ValueError(f"Unknown transcript codec: {codec}")
+    return bytes(raw).decode("utf-8")
+
+def _sql_transcript_text(codec, dictionary_id, data):
+    if data is None:
+        return None
+    return decode_transcript(codec, dictionary_id, data)
+
+def register_sqlite_functions(engine: Engine):
+    """transcript_text(codec, dictionary_id, data) on every new connection, for SQL that
+    needs the text of a blob (the full-text search triggers and content view)"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _register_transcript_text(dbapi_connection, connection_record):
+        dbapi_connection.create_function("transcript_text", 3, _sql_transcript_text, deterministic=True)
+
+def load_dictionaries(engine: Engine):
+    """Cache the trained dictionaries; new transcripts are compressed with the newest"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT id, data FROM transcript_dictionaries ORDER BY id").all()
+    for dictionary_id, data in rows:
+        _codecs.add_dictionary(dictionary_id, data, current=True)
+
+def status(dialect_name: str) -> Dict:
+    enabled = blob_store_enabled(dialect_name)
+    return {
+        "store": "blobs" if enabled else "inline",
+        "codec": ("zstd" if zstandard is not None else "zlib") if enabled else None,
+        "dictionary_id": _codecs.current_dictionary if enabled and zstandard is not None else None,
+    }
+
+def encode_batch(batch: Dict[str, List]) -> Dict[str, List]:
+    """An upload batch with its transcripts moved out of the rows: transcript becomes None,
+    transcript_hash is set, and transcript_blob holds the blob of each text's first occurrence"""
+    hashes, blobs, seen = [], [], set()
+    for transcript in batch["transcript"]:
+        raw = transcript.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        hashes.append(digest)
+        if digest in seen:
+            blobs.append(None)
+        else:
+            seen.add(digest)
+            blobs.append(_encode(raw, digest))
+    return {**batch, "transcript": [None] * len(hashes), "transcript_hash": hashes, "transcript_blob": blobs}
+
+_INSERT_BLOB = """INSERT INTO transcript_blobs (content_hash, codec, dictionary_id, size, data)
+    VALUES (?, ?, ?, ?, ?) ON CONFLICT (content_hash) DO NOTHING"""
+
+def insert_blobs(connection: Connection, blobs: Sequence[Dict]) -> int:
+    """Store blobs not stored yet; returns how many were new"""
+    if not blobs:
+        return 0
+    result = connection.exec_driver_sql(_INSERT_BLOB, [
+        (blob["content_hash"], blob["codec"], blob["dictionary_id"], blob["size"], blob["data"]) for blob in blobs
+    ])
+    return max(result.rowcount, 0)
+
+# Maintenance: migration, dictionary training and the storage report
+
+def migrate_inline_transcripts(engine: Engine, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict:
+    """Move transcripts kept in conversation rows into blobs, one committed batch at a time"""
+    moved = new_blobs = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text("""
+                SELECT id, transcript FROM conversations
+                WHERE transcript IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit
+            """), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+            batch = encode_batch({"transcript": [row.transcript for row in rows]})
+            new_blobs += insert_blobs(connection, [blob for blob in batch["transcript_blob"] if blob])
+            # The text is unchanged, so the search trigger leaves the index alone
+            connection.execute(
+                text("UPDATE conversations SET transcript = NULL, transcript_hash = :content_hash WHERE id = :id"),
+                [{"id": row.id, "content_hash": digest} for row, digest in zip(rows, batch["transcript_hash"])]
+            )
+            last_id = rows[-1].id
+            moved += len(rows)
+    return {"moved": moved, "new_blobs": new_blobs}
+
+def recompress_blobs(engine: Engine, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Re-encode blobs written with another codec or dictionary than new transcripts get"""
+    target = ("zstd", _codecs.current_dictionary) if zstandard is not None else ("zlib", None)
+    rewritten = 0
+    last_hash = ""
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text("""
+                SELECT content_hash, codec, dictionary_id, data FROM transcript_blobs
+                WHERE content_hash > :last_hash ORDER BY content_hash LIMIT :limit
+            """), {"last_hash": last_hash, "limit": batch_size}).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                if (row.codec, row.dictionary_id) == target:
+                    continue
+                blob = encode_transcript(decode_transcript(row.codec, row.dictionary_id, row.data))
+                if (blob["codec"], blob["dictionary_id"]) != (row.codec, row.dictionary_id) \
+                        and len(blob["data"]) < len(row.data):
+                    updates.append(blob)
+            if updates:
+                connection.execute(text("""
+                    UPDATE transcript_blobs SET codec = :codec, dictionary_id = :dictionary_id, data = :data
+                    WHERE content_hash = :content_hash
+                """), updates)
+            last_hash = rows[-1].content_hash
+            rewritten += len(updates)
+    return rewritten
+
+def delete_unreferenced_blobs(engine: Engine) -> int:
+    """Blobs whose conversations were deleted, or whose upload row was skipped as a duplicate id"""
+    with engine.begin() as connection:
+        result = connection.execute(text("""
+            DELETE FROM transcript_blobs WHERE NOT EXISTS (
+                SELECT 1 FROM conversations WHERE conversations.transcript_hash = transcript_blobs.content_hash)
+        """))
+    return max(result.rowcount, 0)
+
+def train_dictionary(engine: Engine, samples: int = DICTIONARY_SAMPLES, size: int = DICTIONARY_SIZE) -> int:
+    """Train a zstd dictionary on a random sample of stored transcripts; returns its id"""
+    if zstandard is None:
+        raise RuntimeError("Dictionaries need zstd. Install with: pip install zstandard")
+    with engine.connect() as connection:
+        texts = connection.execute(text("""
+            SELECT coalesce(conversations.transcript,
+                            transcript_text(transcript_blobs.codec, transcript_blobs.dictionary_id, transcript_blobs.data))
+            FROM conversations
+            LEFT JOIN transcript_blobs ON transcript_blobs.content_hash = conversations.transcript_hash
+            ORDER BY random() LIMIT :samples
+        """), {"samples": samples}).scalars().all()
+    texts = [transcript.encode("utf-8") for transcript in texts if transcript]
+    if len(texts) < MIN_DICTIONARY_SAMPLES:
+        raise ValueError(f"Need at least {MIN_DICTIONARY_SAMPLES} transcripts to train a dictionary, found {len(texts)}")
+    data = zstandard.train_dictionary(size, texts, level=TRANSCRIPT_ZSTD_LEVEL).as_bytes()
+    from database import SessionLocal, TranscriptDictionary
+    db = SessionLocal()
+    try:
+        dictionary = TranscriptDictionary(data=data, samples=len(texts))
+        db.add(dictionary)
+        db.commit()
+        dictionary_id = dictionary.id
+    finally:
+        db.close()
+    _codecs.add_dictionary(dictionary_id, data, current=True)
+    return dictionary_id
+
+def _percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "p50_us": round(ordered[len(ordered) // 2], 1),
+        "p95_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        "mean_us": round(statistics.fmean(ordered), 1),
+    }
+
+def read_latency(ids: Sequence[int]) -> Dict:
+    """Time to load a conversation by id and read its transcript, each in a fresh session"""
+    from database import SessionLocal, Conversation
+    total, decompress = [], []
+    for conversation_id in ids:
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            conversation = db.get(Conversation, conversation_id)
+            if conversation is None:
+                continue
+            blob = conversation.blob if conversation.inline_transcript is None else None
+            loaded = time.perf_counter()
+            conversation.transcript  # decompresses
+            end = time.perf_counter()
+            total.append((end - start) * 1e6)
+            if blob is not None:
+                decompress.append((end - loaded) * 1e6)
+        finally:
+            db.close()
+    return {"reads": len(total), **_percentiles(total), "decompress": _percentiles(decompress)}
+
+def sample_ids(engine: Engine, count: int) -> List[int]:
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT id FROM conversations ORDER BY random() LIMIT :count"), {"count": count}
+        ).scalars().all()
+
+def storage_report(engine: Engine) -> Dict:
+    """Row counts and bytes of inline and blob-stored transcripts, and the database file size"""
+    with engine.connect() as connection:
+        conversations, inline_rows, inline_bytes = connection.exec_driver_sql(
+            "SELECT count(*), count(transcript), coalesce(sum(length(CAST(transcript AS BLOB))), 0) FROM conversations"
+        ).one()
+        referenced_rows, referenced_bytes = connection.exec_driver_sql("""
+            SELECT count(*), coalesce(sum(transcript_blobs.size), 0) FROM conversations
+            JOIN transcript_blobs ON transcript_blobs.content_hash = conversations.transcript_hash
+        """).one()
+        codecs = [
+            {"codec": codec, "dictionary_id": dictionary_id, "blobs": blobs, "raw_bytes": raw, "stored_bytes": stored}
+            for codec, dictionary_id, blobs, raw, stored in connection.exec_driver_sql("""
+                SELECT codec, dictionary_id, count(*), sum(size), sum(length(data))
+                FROM transcript_blobs GROUP BY codec, dictionary_id ORDER BY count(*) DESC
+            """).all()
+        ]
+        dictionary_bytes = connection.exec_driver_sql(
+            "SELECT coalesce(sum(length(data)), 0) FROM transcript_dictionaries"
+        ).scalar()
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        page_count = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+    blob_raw = sum(entry["raw_bytes"] for entry in codecs)
+    blob_stored = sum(entry["stored_bytes"] for entry in codecs)
+    logical = inline_bytes + referenced_bytes
+    stored = inline_bytes + blob_stored + dictionary_bytes
+    return {
+        "conversations": conversations,
+        "inline_transcripts": inline_rows,
+        "blob_transcripts": referenced_rows,
+        "blobs": sum(entry["blobs"] for entry in codecs),
+        "codecs": codecs,
+        # Transcript bytes as uploaded, and as stored (dictionaries included)
+        "logical_bytes": logical,
+        "stored_bytes": stored,
+        "compression_ratio": round(blob_raw / blob_stored, 2) if blob_stored else None,
+        "dedup_ratio": round(referenced_bytes / blob_raw, 2) if blob_raw else None,
+        "overall_ratio": round(logical / stored, 2) if stored else None,
+        "database_bytes": page_size * page_count,
+        "free_bytes": page_size * free_pages,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("migrate", "train-dictionary", "report"))
+    parser.add_argument("--train-dictionary", action="store_true",
+                        help="migrate: train a dictionary first and recompress existing blobs with it")
+    parser.add_argument("--samples", type=int, default=DICTIONARY_SAMPLES, help="transcripts to train a dictionary on")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--latency-samples", type=int, default=1000, help="conversations read to measure latency")
+    parser.add_argument("--vacuum", action="store_true", help="migrate: give freed pages back to the filesystem")
+    args = parser.parse_args()
+
+    from database import engine, init_db
+    from services.search import ensure_search_index
+    if not blob_store_enabled(engine.dialect.name):
+        print(f"The transcript blob store is off (TRANSCRIPT_STORE={TRANSCRIPT_STORE}, {engine.dialect.name})",
+              file=sys.stderr)
+        sys.exit(1)
+    init_db()
+    # Search triggers from before the blob store would index the NULLed rows as empty
+    ensure_search_index(engine)
+    load_dictionaries(engine)
+    ids = sample_ids(engine, args.latency_samples)
+
+    if args.command == "report":
+        print(json.dumps({**storage_report(engine), "read_latency": read_latency(ids)}, indent=2))
+        return
+    if args.command == "train-dictionary":
+        dictionary_id = train_dictionary(engine, args.samples)
+        print(json.dumps({"dictionary_id": dictionary_id, "recompress": "python -m services.transcript_store migrate"}))
+        return
+
+    before = {**storage_report(engine), "read_latency": read_latency(ids)}
+    start = time.perf_counter()
+    result: Dict = {}
+    if args.train_dictionary:
+        result["dictionary_id"] = train_dictionary(engine, args.samples)
+    result.update(migrate_inline_transcripts(engine, args.batch_size))
+    result["recompressed_blobs"] = recompress_blobs(engine, args.batch_size)
+    result["deleted_unreferenced_blobs"] = delete_unreferenced_blobs(engine)
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
+            # VACUUM rewrites every page through the WAL; shrink it back too
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    after = {**storage_report(engine), "read_latency": read_latency(ids)}
+    print(json.dumps({"migration": result, "before": before, "after": after}, indent=2))
+
+if __name__ == "__main__":
+    main()
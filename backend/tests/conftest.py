@@ -0,0 +1,14 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend modules import each other by top-level name (run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Configured before database is imported: a shared in-memory database, so the
+# blocking and async engines (and threadpool sessions) all see the same tables
+os.environ.setdefault("DATABASE_URL", "sqlite:///file:tests?mode=memory&cache=shared&uri=true")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+os.environ.setdefault("ANALYZER_PRELOAD", "false")
+os.environ.setdefault("ANALYSIS_CACHE_ENABLED", "false")
+os.environ.setdefault("INSIGHT_CLUSTERING_ENABLED", "false")
@@ -0,0 +1,46 @@
+"""Size accounting of the analysis cache's disk tier when several processes share the file"""
+import sqlite3
+
+from services.analysis_cache import AnalysisCache
+
+def _disk_sizes(path):
+    with sqlite3.connect(path) as conn:
+        stored = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()[0]
+        counted = conn.execute("SELECT bytes FROM analysis_cache_size WHERE id = 1").fetchone()[0]
+    return stored, counted
+
+def test_shared_file_stays_under_max_bytes(tmp_path):
+    path = str(tmp_path / "analysis_cache.db")
+    # Two caches on one file stand in for the API worker and a job pool process
+    caches = [AnalysisCache(path=path, memory_items=8, max_bytes=20_000) for _ in range(2)]
+    analysis = {"summary": "x" * 1000}
+
+    for number in range(100):
+        caches[number % 2].set(f"key-{number}", analysis)
+        stored, counted = _disk_sizes(path)
+        assert stored == counted
+        assert stored <= 20_000
+
+    assert sum(cache.stats["evictions"] for cache in caches) > 0
+    assert caches[0].status()["disk_bytes"] == caches[1].status()["disk_bytes"] == stored
+
+def test_replacing_an_entry_counts_the_size_difference(tmp_path):
+    path = str(tmp_path / "analysis_cache.db")
+    cache = AnalysisCache(path=path, memory_items=8, max_bytes=1 << 20)
+    cache.set("key", {"summary": "x" * 1000})
+    cache.set("key", {"summary": "x" * 10})
+
+    stored, counted = _disk_sizes(path)
+    assert stored == counted == len('{"summary": "' + "x" * 10 + '"}')
+    assert cache.get("key") == {"summary": "x" * 10}
+
+def test_size_of_a_file_from_before_the_size_table(tmp_path):
+    path = str(tmp_path / "analysis_cache.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO analysis_cache VALUES ('old', '{}', 2, 0)")
+
+    assert AnalysisCache(path=path).status()["disk_bytes"] == 2
@@ -0,0 +1,84 @@
+"""Speaker-turn chunking of long transcripts and the merge of their per-chunk analyses"""
+from services.chunking import TokenCounter, chunk_budget, chunk_transcript, merge_chunk_analyses, split_turns
+
+COUNTER = TokenCounter()  # 3 characters per token
+
+def _turns(count, words=12):
+    speakers = ("Customer", "Sales Rep")
+    return [f"{speakers[n % 2]}: " + " ".join(f"word{n}x{w}" for w in range(words)) + "." for n in range(count)]
+
+def test_split_turns_on_speaker_labels():
+    transcript = "Customer: Our reports are slow. Sales Rep: How slow? [00:42] Customer: Minutes.\nJane Doe: Noted."
+    assert split_turns(transcript) == [
+        "Customer: Our reports are slow.", "Sales Rep: How slow?", "[00:42] Customer: Minutes.", "Jane Doe: Noted."
+    ]
+
+def test_split_turns_without_labels_uses_paragraphs_then_lines():
+    assert split_turns("First paragraph\nstill first.\n\nSecond one.") == ["First paragraph\nstill first.", "Second one."]
+    assert split_turns("one line\nanother line\n") == ["one line", "another line"]
+
+def test_short_transcript_is_one_chunk():
+    transcript = "\n".join(_turns(2))
+    assert chunk_transcript(transcript, COUNTER, budget=1000) == [transcript]
+
+def test_chunks_break_only_between_turns():
+    turns = _turns(20)
+    chunks = chunk_transcript("\n".join(turns), COUNTER, budget=200)
+
+    assert len(chunks) > 1
+    assert all(COUNTER.count(chunk) <= 200 for chunk in chunks)
+    # Every turn lands whole in one chunk, in transcript order
+    assert [turn for chunk in chunks for turn in chunk.split("\n")] == turns
+
+def test_oversize_turn_is_split_between_sentences():
+    long_turn = "Customer: " + " ".join(f"Sentence number {n} is about billing." for n in range(40))
+    turns = _turns(2) + [long_turn] + _turns(1)
+    chunks = chunk_transcript("\n".join(turns), COUNTER, budget=120)
+
+    assert all(COUNTER.count(chunk) <= 120 for chunk in chunks)
+    pieces = [piece for chunk in chunks for piece in chunk.split("\n")]
+    assert pieces[:2] == turns[:2] and pieces[-1] == turns[-1]
+    assert all(piece.endswith(".") for piece in pieces)
+    assert " ".join(pieces[2:-1]) == long_turn
+
+def test_oversize_sentence_is_cut_to_the_budget():
+    sentence = "Customer: " + "x" * 1000
+    chunks = chunk_transcript(sentence + "\nSales Rep: Ok.", COUNTER, budget=50)
+
+    assert all(COUNTER.count(chunk) <= 50 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == sentence + "Sales Rep: Ok."
+
+def test_merge_deduplicates_across_chunks():
+    merged = merge_chunk_analyses([
+        {
+            "pain_points": [{"point": "Slow reports", "severity": "medium"}, {"point": "Pricing", "severity": "low"}],
+            "media_consumption": [{"name": "Lenny's Podcast", "type": "podcast"}],
+            "compelling_points": ["Dashboards"],
+            "summary": "Part one.",
+        },
+        {
+            "pain_points": [{"point": "slow reports!", "severity": "high"}, {"point": "pricing", "severity": "bogus"},
+                            {"point": "  ", "severity": "high"}],
+            "media_consumption": [{"name": "lenny's podcast", "type": "audio"}, {"source": "Hacker News"}],
+            "compelling_points": ["dashboards", "API access"],
+            "summary": "Part two.",
+        },
+        {"pain_points": None, "summary": ""},
+    ])
+
+    # First wording kept, highest severity any chunk gave it; unknown severities never win
+    assert merged["pain_points"] == [
+        {"point": "Slow reports", "severity": "high"}, {"point": "Pricing", "severity": "low"}
+    ]
+    assert merged["media_consumption"] == [{"name": "Lenny's Podcast", "type": "podcast"}, {"source": "Hacker News"}]
+    assert merged["compelling_points"] == ["Dashboards", "API access"]
+    assert merged["summary"] == "Part one. Part two."
+
+def test_merge_of_one_chunk_is_unchanged():
+    analysis = {"pain_points": [{"point": "A"}, {"point": "a"}], "summary": "Only."}
+    assert merge_chunk_analyses([analysis]) is analysis
+
+def test_chunk_budget():
+    assert chunk_budget(8192, prompt_tokens=300, response_tokens=1500) == 6392
+    assert chunk_budget(8192, prompt_tokens=300, response_tokens=1500, max_chunk_tokens=2000) == 2000
+    assert chunk_budget(1000, prompt_tokens=900, response_tokens=500) == 16
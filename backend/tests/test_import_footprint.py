@@ -0,0 +1,19 @@
+"""Booting the API imports no model runtime or provider SDK (see benchmarks/check_import_footprint.py)"""
+import pytest
+
+from benchmarks.check_import_footprint import check_provider
+from services.providers.base import ProviderBackend
+
+@pytest.mark.parametrize("with_rollups", [False, True])
+def test_stub_provider_boot_has_no_heavy_imports(with_rollups):
+    report = check_provider("stub", with_rollups=with_rollups)
+    assert report["heavy_imports"] == {}, report["heavy_imports"]
+    # Insights recorded earlier are already clustered, so the startup backfill has nothing to embed
+    assert not report["embedder_loaded"]
+
+def test_provider_without_run_batch_cannot_be_created():
+    class Incomplete(ProviderBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="run_batch"):
+        Incomplete()
@@ -0,0 +1,91 @@
+"""Streaming JSON decoding of uploads and the de-duplication of conversation ids on insert"""
+import io
+import json
+
+import pytest
+
+from database import Base, Conversation, SessionLocal, engine, init_db
+from services.ingest import IngestError, IngestStats, ingest_csv, ingest_json, iter_json_values
+
+RECORDS = [{"conversation_id": f"call-{n}", "transcript": f"Customer: issue number {n} " + "é" * n} for n in range(20)]
+
+def _values(text, **options):
+    # A read size this small splits nearly every value (and multi-byte characters) across reads
+    return list(iter_json_values(io.BytesIO(text.encode("utf-8")), read_size=options.pop("read_size", 7), **options))
+
+@pytest.mark.parametrize("text", [
+    json.dumps(RECORDS),
+    json.dumps(RECORDS, indent=2),
+    "\n".join(json.dumps(record) for record in RECORDS) + "\n",
+    "".join(json.dumps(record, indent=2) for record in RECORDS),  # concatenated, each over several lines
+])
+def test_values_split_across_reads(text):
+    assert _values(text) == RECORDS
+
+def test_single_value_and_empty_input():
+    assert _values(json.dumps(RECORDS[0])) == [RECORDS[0]]
+    assert _values(" \n") == []
+    assert _values("[]") == []
+
+def test_top_level_array_versus_json_lines():
+    # An array yields its elements, JSON Lines one value per line
+    assert _values('[{"a": 1}, [2]]') == [{"a": 1}, [2]]
+    assert _values('{"a": 1}\n[2]\n') == [{"a": 1}, [2]]
+    # A leading array is the whole upload: anything after it is an error, not ignored
+    with pytest.raises(IngestError, match="after the top-level array"):
+        _values('[{"a": 1}]\n{"a": 2}\n')
+
+@pytest.mark.parametrize("text", [
+    '[{"a": 1}, {"a": ',
+    '[{"a": 1} {"a": 2}',
+    '{"a": 1}\n{"a": 2',
+    '{"a": 1}\n{"a": nope}\n',
+    "[1, 2",
+])
+def test_malformed_input_raises(text):
+    with pytest.raises(IngestError):
+        _values(text)
+
+def test_bad_json_line_fails_without_reading_the_rest():
+    upload = io.BytesIO(('{"a": 1}\n{"a": oops}\n' + json.dumps(RECORDS[0]) * 200_000).encode("utf-8"))
+    values = iter_json_values(upload, read_size=1024)
+    assert next(values) == {"a": 1}
+    with pytest.raises(IngestError, match="Invalid JSON line"):
+        next(values)
+    assert upload.tell() < 64 * 1024
+
+def test_item_larger_than_the_cap_fails():
+    with pytest.raises(IngestError, match="longer than 100 characters"):
+        _values('[{"transcript": "' + "x" * 1000, read_size=16, max_item_chars=100)
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+def test_repeated_and_existing_ids_are_skipped(db):
+    upload = [
+        {"conversation_id": "call-1", "transcript": "first"},
+        {"conversation_id": "call-2", "transcript": "second"},
+        {"conversation_id": "call-1", "transcript": "repeated in the batch"},
+        {"transcript": "no id"},
+        {"conversation_id": "call-3", "text": "alternate field", "industry": "retail"},
+        {"conversation_id": "call-4"},
+    ]
+    stats = ingest_json(db, io.BytesIO(json.dumps(upload).encode("utf-8")), "gong", IngestStats())
+    assert (stats.uploaded, stats.skipped, stats.error_count) == (4, 1, 1)
+
+    stats = ingest_csv(db, io.BytesIO(b"conversation_id,transcript\ncall-2,again\ncall-5,new\n"), "gong", IngestStats())
+    assert (stats.uploaded, stats.skipped) == (1, 1)
+
+    rows = {conversation.conversation_id: conversation.transcript for conversation in db.query(Conversation).filter(
+        Conversation.conversation_id.in_(["call-1", "call-2", "call-3", "call-5"])
+    )}
+    # The first occurrence of an id wins
+    assert rows == {"call-1": "first", "call-2": "second", "call-3": "alternate field", "call-5": "new"}
+    assert db.query(Conversation).count() == 5
@@ -0,0 +1,83 @@
+"""Cluster rollups served by the aggregate summary, after the startup backfills recluster insight texts"""
+import pytest
+
+from database import AnalysisResult, Base, Conversation, SessionLocal, engine, init_db
+from services import insights
+from services.insights import backfill_cluster_rollups, backfill_insight_clusters, record_insights, top_insights
+
+class FakeClusterIndex:
+    """Clusters texts by a fixed mapping instead of embeddings"""
+
+    def __init__(self, clusters, created=False):
+        self.clusters = clusters
+        self.created = created
+
+    def assign(self, texts):
+        return [self.clusters[text] for text in texts]
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+def _seed(db, pain_points_per_conversation, source="gong"):
+    """One analysis per list of pain point texts, recorded with clustering off"""
+    for number, pain_points in enumerate(pain_points_per_conversation, start=1):
+        conversation = Conversation(source=source, conversation_id=f"conversation-{number}", transcript="...")
+        db.add(conversation)
+        db.flush()
+        result = AnalysisResult(
+            conversation_id=conversation.id, pain_points=[{"point": text} for text in pain_points],
+            media_consumption=[], compelling_points=[], summary="", confidence_score=0.5
+        )
+        db.add(result)
+        db.flush()
+        record_insights(db, result, source)
+    db.commit()
+
+def _backfill(db, monkeypatch, index):
+    """The startup backfills, with clustering on and the given index"""
+    monkeypatch.setattr(insights, "INSIGHT_CLUSTERING_ENABLED", True)
+    monkeypatch.setattr(insights, "get_cluster_index", lambda kind: index)
+    monkeypatch.setattr(insights, "index_is_current", lambda kind: not index.created)
+    backfill_cluster_rollups(db, backfill_insight_clusters(db))
+
+def _top(db, source=None):
+    total_unique, top = top_insights(db, "pain_point", source)
+    return total_unique, [(insight["label"], insight["count"], insight["variants"]) for insight in top]
+
+def test_clustering_turned_on_merges_existing_groups(db, monkeypatch):
+    _seed(db, [["slow onboarding", "pricing"], ["onboarding is slow"], ["slow onboarding"]])
+    assert _top(db) == (3, [("slow onboarding", 2, 1), ("pricing", 1, 1), ("onboarding is slow", 1, 1)])
+
+    _backfill(db, monkeypatch, FakeClusterIndex({"slow onboarding": 0, "onboarding is slow": 0, "pricing": 1}))
+
+    expected = (2, [("slow onboarding", 3, 2), ("pricing", 1, 1)])
+    assert _top(db) == expected
+    assert _top(db, "gong") == expected
+    assert [insight["cluster_id"] for insight in top_insights(db, "pain_point", None)[1]] == [0, 1]
+
+def test_new_cluster_index_replaces_stale_groups(db, monkeypatch):
+    _seed(db, [["slow onboarding", "pricing"], ["onboarding is slow"], ["slow onboarding"]])
+    _backfill(db, monkeypatch, FakeClusterIndex({"slow onboarding": 0, "onboarding is slow": 0, "pricing": 1}))
+
+    # A recreated index (new embedding model) starts from scratch and no longer merges the phrasings
+    _backfill(db, monkeypatch, FakeClusterIndex(
+        {"slow onboarding": 0, "onboarding is slow": 1, "pricing": 2}, created=True
+    ))
+
+    assert _top(db) == (3, [("slow onboarding", 2, 1), ("onboarding is slow", 1, 1), ("pricing", 1, 1)])
+    assert _top(db, "gong") == _top(db)
+
+def test_backfill_without_changes_keeps_groups(db, monkeypatch):
+    _seed(db, [["slow onboarding"], ["onboarding is slow"]])
+    index = FakeClusterIndex({"slow onboarding": 0, "onboarding is slow": 0})
+    _backfill(db, monkeypatch, index)
+
+    assert backfill_insight_clusters(db) == set()
+    assert _top(db) == (1, [("slow onboarding", 2, 2)])
@@ -0,0 +1,107 @@
+"""Batch analysis jobs: chunks that raise are retried, then failed, results stay one per conversation, and OpenAI chunks are sized to its concurrency"""
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from database import AnalysisJob, AnalysisJobItem, AnalysisResult, Base, Conversation, SessionLocal, engine, init_db
+from services import jobs
+from services.analysis_store import save_analysis
+from services.jobs import JobManager
+
+ANALYSIS = {"pain_points": [], "media_consumption": [], "compelling_points": [], "summary": "Fine.",
+            "confidence_score": 0.5}
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def manager():
+    manager = JobManager(mode="thread", workers=1, chunk_size=2)
+    try:
+        yield manager
+    finally:
+        manager.executor.shutdown(wait=True)
+
+def _conversations(db, count):
+    conversations = [Conversation(source="gong", conversation_id=f"conversation-{n}", transcript=f"Transcript {n}")
+                     for n in range(count)]
+    db.add_all(conversations)
+    db.commit()
+    return [conversation.id for conversation in conversations]
+
+def _wait_for_job(job_id, timeout=10):
+    """The finished job, polled from the test thread while a worker writes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with SessionLocal() as session:
+                job = session.query(AnalysisJob).filter(AnalysisJob.id == job_id).one()
+                if job.status == "completed":
+                    items = session.query(AnalysisJobItem).filter(AnalysisJobItem.job_id == job_id).all()
+                    return job, items
+        except OperationalError:
+            # The shared in-memory database locks a table while the worker writes to it
+            pass
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_chunk_that_raises_is_retried(db, manager, monkeypatch):
+    calls = []
+    def flaky_save(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("database went away")
+        return save_analysis(*args)
+    monkeypatch.setattr(jobs, "save_analysis", flaky_save)
+
+    job = manager.submit(db, _conversations(db, 3))
+    job, items = _wait_for_job(job.id)
+
+    assert (job.analyzed, job.failed) == (3, 0)
+    assert {item.status for item in items} == {"analyzed"}
+
+def test_chunk_that_keeps_raising_fails_its_items(db, manager, monkeypatch):
+    def broken_save(*args):
+        raise RuntimeError("database went away")
+    monkeypatch.setattr(jobs, "save_analysis", broken_save)
+
+    job = manager.submit(db, _conversations(db, 3))
+    job, items = _wait_for_job(job.id)
+
+    assert (job.analyzed, job.failed) == (0, 3)
+    assert {item.status for item in items} == {"failed"}
+    assert all("database went away" in item.error for item in items)
+
+def test_one_result_per_conversation(db):
+    conversation_id = _conversations(db, 1)[0]
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).one()
+
+    first = save_analysis(db, conversation, ANALYSIS)
+    db.commit()
+    assert first is not None
+    # A resumed chunk that overlaps a committed analysis stages nothing
+    assert save_analysis(db, conversation, {**ANALYSIS, "summary": "Again."}) is None
+    db.commit()
+
+    results = db.query(AnalysisResult).filter(AnalysisResult.conversation_id == conversation_id).all()
+    assert [(result.id, result.summary) for result in results] == [(first.id, "Fine.")]
+
+def test_openai_chunks_fill_the_concurrency_limit(monkeypatch):
+    monkeypatch.setattr(jobs, "OPENAI_MAX_CONCURRENCY", 64)
+    assert jobs.default_chunk_size("huggingface", "thread", workers=2, replicas=1) == 4
+    # One replica: a single chunk runs at a time and gets the whole limit
+    assert jobs.default_chunk_size("openai", "thread", workers=2, replicas=1) == 64
+    # Thread workers holding replicas at once share the API process's limit
+    assert jobs.default_chunk_size("openai", "thread", workers=2, replicas=4) == 32
+    # Each worker process has its own client and limit
+    assert jobs.default_chunk_size("openai", "process", workers=4, replicas=1) == 64
+    monkeypatch.setattr(jobs, "OPENAI_MAX_CONCURRENCY", 1)
+    assert jobs.default_chunk_size("openai", "thread", workers=8, replicas=8) == 1
@@ -0,0 +1,136 @@
+"""Schema-constrained JSON decoding: the automaton and the logits processor over a small fake vocabulary"""
+import json
+import string
+
+import pytest
+import torch
+
+from services.json_constraint import ANALYSIS_SCHEMA, JsonSchemaLogitsProcessor, SchemaAutomaton, TokenVocabulary
+from services.prompts import HUGGINGFACE_PROMPT_TEMPLATE
+
+DOCUMENT = {
+    "pain_points": [{"point": "slow onboarding", "severity": "high"}, {"point": "pricing", "severity": "low"}],
+    "media_consumption": [{"name": "Lenny's Podcast", "type": "podcast"}],
+    "compelling_points": [],
+    "summary": "Wants faster onboarding.",
+}
+
+class FakeTokenizer:
+    """Every printable character as a token, a few multi-character pieces, and EOS"""
+
+    eos_token_id = 0
+    all_special_ids = [0]
+    name_or_path = "fake"
+
+    def __init__(self, pieces=tuple(string.printable[:95]) + (
+        '{"pain_points": ', ', "media_consumption": ', ', "compelling_points": ', ', "summary": ',
+        '[]', '""', '"}', '"}]', 'onboarding', ' slow', '\n', '  ', '\\n'
+    )):
+        self.pieces = ["<eos>"] + list(dict.fromkeys(pieces))
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def encode(self, text, add_special_tokens=False):
+        return [self.pieces.index(char) for char in text]
+
+    def decode(self, token_ids):
+        return "".join("" if token_id == 0 else self.pieces[token_id] for token_id in token_ids)
+
+    def batch_decode(self, sequences):
+        return [self.decode(token_ids) for token_ids in sequences]
+
+@pytest.fixture(scope="module")
+def automaton():
+    return SchemaAutomaton(ANALYSIS_SCHEMA)
+
+def _token(vocabulary, text):
+    return vocabulary.texts.index(text)
+
+def test_compact_document_completes(automaton):
+    assert automaton.step_text(automaton.initial(), json.dumps(DOCUMENT)) == ()
+
+@pytest.mark.parametrize("text", [
+    json.dumps(DOCUMENT, indent=2),  # insignificant whitespace
+    json.dumps(DOCUMENT, separators=(",", ":")),
+    json.dumps({**DOCUMENT, "pain_points": [{"point": "slow", "severity": "urgent"}]}),  # not in the enum
+    json.dumps({**DOCUMENT, "summary": "line one\nline two"}),  # escapes
+    json.dumps({**DOCUMENT, "media_consumption": [{"name": "x", "type": "y"}] * 9}),  # maxItems
+    json.dumps({"summary": "properties out of order"}),
+])
+def test_invalid_documents_are_rejected(automaton, text):
+    assert automaton.step_text(automaton.initial(), text) is None
+
+@pytest.mark.parametrize("prefix", [
+    "", '{"pain_points": [{"point": "slo', '{"pain_points": [{"point": "slow", "severity": "me',
+    '{"pain_points": [], "media_consumption": [{"name": "x", "type": "y"}, ',
+])
+def test_closing_text_completes_a_valid_document(automaton, prefix):
+    state = automaton.step_text(automaton.initial(), prefix)
+    text = prefix + automaton.closing_text(state)
+    assert automaton.step_text(automaton.initial(), text) == ()
+    assert set(json.loads(text)) == set(ANALYSIS_SCHEMA["properties"])
+
+def test_prompt_example_has_the_accepted_layout(automaton):
+    example = HUGGINGFACE_PROMPT_TEMPLATE.format(transcript="").splitlines()[1]
+    assert json.dumps(json.loads(example)) == example
+
+def test_processor_allows_only_valid_tokens(automaton):
+    vocabulary = TokenVocabulary(FakeTokenizer())
+    processor = JsonSchemaLogitsProcessor(automaton, vocabulary, max_new_tokens=500)
+    allowed = processor._allowed(automaton.initial(), 500)
+    assert allowed[_token(vocabulary, "{")] and allowed[_token(vocabulary, '{"pain_points": ')]
+    assert not allowed[_token(vocabulary, "[")] and not allowed[_token(vocabulary, "\n")]
+    assert not allowed[vocabulary.eos_token_id]
+
+    inside = automaton.step_text(automaton.initial(), '{"pain_points": [{"point": "')
+    allowed = processor._allowed(inside, 500)
+    assert allowed[_token(vocabulary, "onboarding")] and allowed[_token(vocabulary, '"')]
+    assert not allowed[_token(vocabulary, "\\n")] and not allowed[_token(vocabulary, "\n")]
+
+    # A finished document allows nothing but EOS
+    allowed = processor._allowed(automaton.step_text(automaton.initial(), json.dumps(DOCUMENT)), 500)
+    assert allowed.nonzero().flatten().tolist() == [vocabulary.eos_token_id]
+
+def test_processor_closes_the_document_when_the_budget_runs_out(automaton):
+    vocabulary = TokenVocabulary(FakeTokenizer())
+    processor = JsonSchemaLogitsProcessor(automaton, vocabulary, max_new_tokens=500)
+    state = automaton.step_text(automaton.initial(), '{"pain_points": [{"point": "slow')
+    closing = automaton.closing_text(state)
+    allowed = [vocabulary.texts[token_id] for token_id in processor._allowed(state, len(closing)).nonzero().flatten()]
+    # Only tokens on the shortest closing path: the string's quote, not more text
+    assert '"' in allowed
+    assert all(closing.startswith(text) for text in allowed)
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_new_tokens", [100, 200])
+def test_generation_ends_in_a_complete_document(automaton, seed, max_new_tokens):
+    vocabulary = TokenVocabulary(FakeTokenizer())
+    processor = JsonSchemaLogitsProcessor(automaton, vocabulary, max_new_tokens=max_new_tokens)
+    generator = torch.Generator().manual_seed(seed)
+    input_ids = torch.zeros((1, 1), dtype=torch.long)
+    for _ in range(max_new_tokens):
+        scores = processor(input_ids, torch.randn((1, vocabulary.size), generator=generator))
+        token_id = int(scores[0].argmax())
+        if token_id == vocabulary.eos_token_id:
+            break
+        input_ids = torch.cat([input_ids, torch.tensor([[token_id]])], dim=1)
+    text = "".join(vocabulary.texts[token_id] for token_id in input_ids[0, 1:].tolist())
+    assert automaton.step_text(automaton.initial(), text) == (), text
+    json.loads(text)
+
+def test_never_empty_falls_back_to_eos(automaton):
+    # No token can close the string the model is inside
+    vocabulary = TokenVocabulary(FakeTokenizer(pieces=tuple(string.ascii_letters)))
+    processor = JsonSchemaLogitsProcessor(automaton, vocabulary, max_new_tokens=500)
+    state = automaton.step_text(automaton.initial(), '{"pain_points": [{"point": "slow')
+    allowed = processor._allowed(state, 1)
+    assert allowed.nonzero().flatten().tolist() == [vocabulary.eos_token_id]
+
+def test_never_empty_falls_back_to_the_next_closing_character(automaton):
+    vocabulary = TokenVocabulary(FakeTokenizer(pieces=tuple(string.ascii_letters) + ('"', '"}]')))
+    processor = JsonSchemaLogitsProcessor(automaton, vocabulary, max_new_tokens=500)
+    # A point at maxLength: only its closing quote continues, and '"}]' is not on that path
+    state = automaton.step_text(automaton.initial(), '{"pain_points": [{"point": "' + "x" * 200)
+    allowed = processor._never_empty(torch.zeros(vocabulary.size, dtype=torch.bool), automaton.closing_text(state))
+    assert allowed.nonzero().flatten().tolist() == [_token(vocabulary, '"')]
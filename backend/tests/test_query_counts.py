@@ -0,0 +1,94 @@
+"""Query counts of the result lookup and the batch analysis selection, guarded against N+1 regressions"""
+import asyncio
+
+import pytest
+
+from database import (
+    AnalysisResult, AsyncSessionLocal, Base, Conversation, SessionLocal, async_engine, count_queries, engine, init_db
+)
+from routers.analysis import analyze_batch
+from routers.results import get_result
+from services.jobs import job_manager
+
+def _run(coroutine):
+    """Run a coroutine on a fresh event loop, closing the async connections made on it"""
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(run())
+
+def _selects(queries):
+    return [statement for statement in queries.statements if statement.lstrip().upper().startswith("SELECT")]
+
+@pytest.fixture
+def db(monkeypatch):
+    init_db()
+    # Jobs are persisted but not run: only the selection is under test
+    monkeypatch.setattr(job_manager, "dispatch", lambda job_id: None)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+def _seed(db, conversations: int, analyzed: int):
+    """Conversations with ids 1..conversations, the first `analyzed` of them with a result"""
+    db.add_all([
+        Conversation(source="gong", conversation_id=f"conversation-{number}", transcript=f"Transcript {number}")
+        for number in range(1, conversations + 1)
+    ])
+    db.flush()
+    db.add_all([
+        AnalysisResult(conversation_id=number, pain_points=[], media_consumption=[], compelling_points=[],
+                       summary=f"Summary {number}", confidence_score=0.5)
+        for number in range(1, analyzed + 1)
+    ])
+    db.commit()
+
+def test_get_result_is_one_select(db):
+    _seed(db, conversations=3, analyzed=3)
+
+    async def fetch():
+        async with AsyncSessionLocal() as async_db:
+            with count_queries() as queries:
+                result = await get_result(2, async_db)
+        return result, queries
+
+    result, queries = _run(fetch())
+    assert result["conversation_source"] == "gong"
+    assert len(_selects(queries)) == 1, queries.statements
+    assert queries.count == 1, queries.statements
+
+def _analyze_batch_queries(db, **params):
+    with count_queries() as queries:
+        response = _run(analyze_batch(db=db, **params))
+    return response, queries
+
+@pytest.mark.parametrize("conversations", [10, 200])
+def test_analyze_batch_anti_join_is_constant(db, conversations):
+    _seed(db, conversations=conversations, analyzed=conversations // 2)
+    small, small_queries = _analyze_batch_queries(db, conversation_ids=None, source=None, limit=2)
+    large, large_queries = _analyze_batch_queries(db, conversation_ids=None, source="gong", limit=conversations)
+
+    assert small["total"] == 2
+    # The anti-join leaves out analyzed conversations before the limit applies
+    assert large["total"] == conversations - conversations // 2
+    assert large["already_analyzed"] == 0
+    assert small_queries.count == large_queries.count, large_queries.statements
+
+@pytest.mark.parametrize("conversations", [10, 200])
+def test_analyze_batch_pre_pass_is_constant(db, conversations):
+    _seed(db, conversations=conversations, analyzed=conversations // 2)
+    small, small_queries = _analyze_batch_queries(db, conversation_ids=[1, conversations], source=None, limit=2)
+    ids = list(range(1, conversations + 1))
+    large, large_queries = _analyze_batch_queries(db, conversation_ids=ids, source=None, limit=conversations)
+
+    assert (small["total"], small["already_analyzed"]) == (2, 1)
+    assert (large["total"], large["already_analyzed"]) == (conversations, conversations // 2)
+    # One SELECT finds every existing analysis among the candidates
+    pre_pass = [statement for statement in _selects(large_queries) if "FROM analysis_results" in statement]
+    assert len(pre_pass) == 1, pre_pass
+    assert small_queries.count == large_queries.count, large_queries.statements
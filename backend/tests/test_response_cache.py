@@ -0,0 +1,58 @@
+"""Response cache: ETags, 304s on If-None-Match, and a fresh response after a write commits"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from database import Base, engine
+from main import app
+from services.response_cache import response_cache
+
+CSV = """conversation_id,transcript
+call-1,"Customer: onboarding took three weeks."
+"""
+
+@pytest.fixture
+def client():
+    assert response_cache is not None, "RESPONSE_CACHE_ENABLED must be on for these tests"
+    with TestClient(app) as client:
+        yield client
+    with engine.begin() as connection:
+        for statement in ("DROP TABLE IF EXISTS conversation_search", "DROP TABLE IF EXISTS result_search",
+                          "DROP VIEW IF EXISTS conversation_search_content"):
+            connection.execute(text(statement))
+    Base.metadata.drop_all(bind=engine)
+
+def test_etag_revalidates_until_a_write_commits(client):
+    first = client.get("/api/upload/stats")
+    assert first.status_code == 200, first.text
+    etag = first.headers["etag"]
+    assert first.json()["by_source"].get("gong", 0) == 0
+
+    # A matching If-None-Match gets a 304 with no body, a weak tag too
+    hits = response_cache.stats["hits"]
+    for tag in (etag, "W/" + etag, '"other", ' + etag):
+        not_modified = client.get("/api/upload/stats", headers={"If-None-Match": tag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+    assert response_cache.stats["hits"] == hits + 3
+
+    # A different tag gets the cached body
+    cached = client.get("/api/upload/stats", headers={"If-None-Match": '"other"'})
+    assert cached.status_code == 200
+    assert cached.content == first.content
+
+    response = client.post("/api/upload/csv", params={"source": "gong"},
+                           files={"file": ("calls.csv", CSV.encode("utf-8"), "text/csv")})
+    assert response.status_code == 200, response.text
+
+    # The upload committed a flagged session, so the old tag no longer matches
+    fresh = client.get("/api/upload/stats", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+    assert fresh.json()["by_source"]["gong"] == 1
+
+def test_errors_are_not_cached(client):
+    response = client.get("/api/search", params={"q": ""})
+    assert response.status_code != 200
+    assert "etag" not in response.headers
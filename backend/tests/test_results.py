@@ -0,0 +1,68 @@
+"""Totals of the results list: exact for offset clients, cached per source for cursor pages"""
+import asyncio
+
+import pytest
+
+from database import AnalysisResult, AsyncSessionLocal, Base, Conversation, SessionLocal, async_engine, engine, init_db
+from routers import results
+from routers.results import list_all_results
+from services.response_cache import mark_data_changed
+
+def _run(coroutine):
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(run())
+
+@pytest.fixture
+def db():
+    init_db()
+    results._total_cache.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+def _add_results(db, count, source="gong"):
+    for _ in range(count):
+        conversation = Conversation(source=source, transcript="...")
+        db.add(conversation)
+        db.flush()
+        db.add(AnalysisResult(conversation_id=conversation.id, pain_points=[], media_consumption=[],
+                              compelling_points=[], summary="", confidence_score=0.5))
+    mark_data_changed(db)
+    db.commit()
+
+def _list(cursor=None, source=None, include_total=None, skip=None, limit=2):
+    async def fetch():
+        async with AsyncSessionLocal() as async_db:
+            return await list_all_results(cursor=cursor, limit=limit, source=source, include_total=include_total,
+                                          skip=skip, db=async_db)
+    return _run(fetch())
+
+def test_offset_total_is_exact_after_a_write(db):
+    _add_results(db, 3)
+    assert _list(skip=0)["total"] == 3
+    _add_results(db, 2)
+    assert _list(skip=2)["total"] == 5
+
+def test_cursor_total_is_recounted_after_a_write(db):
+    _add_results(db, 3)
+    cursor = _list()["next_cursor"]
+    assert _list(cursor=cursor)["total"] is None
+    assert _list(cursor=cursor, include_total=True)["total"] == 3
+    # Well within RESULTS_TOTAL_TTL, but the commit changed the data
+    _add_results(db, 1)
+    assert _list(cursor=cursor, include_total=True)["total"] == 4
+
+def test_cached_totals_are_bounded(db, monkeypatch):
+    monkeypatch.setattr(results, "RESULTS_TOTAL_CACHE_ITEMS", 2)
+    _add_results(db, 3)
+    cursor = _list()["next_cursor"]
+    for number in range(5):
+        assert _list(cursor=cursor, source=f"source-{number}", include_total=True)["total"] == 0
+    assert list(results._total_cache) == ["source-3", "source-4"]
@@ -0,0 +1,81 @@
+"""Full-text search on SQLite end to end: bulk uploads (deferred index), ORM inserts and saved analyses (triggers)"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from database import Base, Conversation, SessionLocal, engine
+from main import app
+from services.analysis_store import save_analysis
+from services.search import SearchQueryError, fts5_query
+
+CSV = """conversation_id,transcript
+call-1,"Customer: onboarding took three weeks and the invoices were wrong."
+call-2,"Customer: we love the dashboards but pricing went up again."
+"""
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+    # The search tables, view and triggers are not in the ORM metadata
+    with engine.begin() as connection:
+        for statement in ("DROP TABLE IF EXISTS conversation_search", "DROP TABLE IF EXISTS result_search",
+                          "DROP VIEW IF EXISTS conversation_search_content"):
+            connection.execute(text(statement))
+    Base.metadata.drop_all(bind=engine)
+
+def _search(client, q, **params):
+    response = client.get("/api/search", params={"q": q, "include_total": True, **params})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return body["total"], [result["source_conversation_id"] for result in body["results"]], body["results"]
+
+def test_search_finds_uploads_inserts_and_analyses(client):
+    response = client.post("/api/upload/csv", params={"source": "gong"},
+                           files={"file": ("calls.csv", CSV.encode("utf-8"), "text/csv")})
+    assert response.status_code == 200, response.text
+
+    # Rows from a bulk upload are indexed per batch, after the insert
+    total, ids, results = _search(client, "onboarding")
+    assert (total, ids) == (1, ["call-1"])
+    assert "<mark>onboarding</mark>" in results[0]["transcript_snippet"]
+    # Stemmed, prefix and phrase terms
+    assert _search(client, "invoice")[1] == ["call-1"]
+    assert _search(client, "dash*")[1] == ["call-2"]
+    assert _search(client, '"pricing went up"')[1] == ["call-2"]
+    assert _search(client, '"pricing went down"')[0] == 0
+
+    with SessionLocal() as db:
+        # Rows added one at a time are indexed by the insert trigger
+        db.add(Conversation(source="salesforce", conversation_id="call-3", transcript="Pricing is confusing."))
+        conversation = db.query(Conversation).filter(Conversation.conversation_id == "call-2").one()
+        save_analysis(db, conversation, {
+            "pain_points": [{"point": "renewal surprises", "severity": "high"}], "media_consumption": [],
+            "compelling_points": [], "summary": "Happy with reporting, unhappy with renewal price.",
+        })
+        db.commit()
+
+    assert sorted(_search(client, "pricing")[1]) == ["call-2", "call-3"]
+    assert _search(client, "pricing", source="salesforce")[1] == ["call-3"]
+    total, ids, results = _search(client, "renewal")
+    assert (total, ids) == (1, ["call-2"])
+    assert results[0]["result_id"] is not None
+    assert "<mark>renewal</mark>" in results[0]["analysis_snippet"]
+
+def test_query_without_words_is_rejected(client):
+    response = client.get("/api/search", params={"q": '"" * -'})
+    assert response.status_code == 400
+    assert "no searchable words" in response.json()["detail"]
+
+def test_search_unavailable_on_this_database(client):
+    app.state.search_available = False
+    try:
+        response = client.get("/api/search", params={"q": "pricing"})
+    finally:
+        app.state.search_available = True
+    assert response.status_code == 503
+
+def test_fts5_query_quotes_user_input():
+    assert fts5_query('slow onboard* "price  increase!" AND NEAR(') == '"slow" "onboard"* "price increase" "AND" "NEAR"'
+    with pytest.raises(SearchQueryError):
+        fts5_query("*** ---")
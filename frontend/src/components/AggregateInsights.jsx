@@ -118,7 +118,7 @@ function AggregateInsights() {
           <div style={{ maxHeight: '300px', overflowY: 'auto' }}>
             {insights.pain_points.top.map((item, idx) => (
               <div key={idx} className="insight-item">
-                <strong>{item.point}</strong> <span style={{ color: '#666' }}>({item.count} mentions)</span>
+                <strong>{item.point}</strong> <span style={{ color: '#666' }}>({item.count} mentions{item.variants > 1 ? `, ${item.variants} phrasings` : ''})</span>
               </div>
             ))}
           </div>
@@ -150,7 +150,7 @@ function AggregateInsights() {
           <div style={{ maxHeight: '300px', overflowY: 'auto' }}>
             {insights.media_consumption.top.map((item, idx) => (
               <div key={idx} className="insight-item">
-                <strong>{item.media}</strong> <span style={{ color: '#666' }}>({item.count} mentions)</span>
+                <strong>{item.media}</strong> <span style={{ color: '#666' }}>({item.count} mentions{item.variants > 1 ? `, ${item.variants} phrasings` : ''})</span>
               </div>
             ))}
           </div>
@@ -182,7 +182,7 @@ function AggregateInsights() {
           <div style={{ maxHeight: '300px', overflowY: 'auto' }}>
             {insights.compelling_points.top.map((item, idx) => (
               <div key={idx} className="insight-item">
-                <strong>{item.point}</strong> <span style={{ color: '#666' }}>({item.count} mentions)</span>
+                <strong>{item.point}</strong> <span style={{ color: '#666' }}>({item.count} mentions{item.variants > 1 ? `, ${item.variants} phrasings` : ''})</span>
               </div>
             ))}
           </div>
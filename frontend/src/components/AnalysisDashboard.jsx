@@ -2,6 +2,28 @@ import React, { useState } from 'react'
 import axios from 'axios'
 
 const API_BASE = '/api'
+const RECENT_ITEMS = 8
+
+// Follow a batch job over server-sent events until it finishes
+const watchJob = (jobId, onProgress, onItem) => new Promise((resolve, reject) => {
+  const events = new EventSource(`${API_BASE}/analysis/jobs/${jobId}/events`)
+  events.addEventListener('progress', (e) => onProgress(JSON.parse(e.data)))
+  events.addEventListener('item', (e) => {
+    const item = JSON.parse(e.data)
+    onProgress(item.job)
+    onItem(item)
+  })
+  events.addEventListener('done', (e) => {
+    events.close()
+    resolve(JSON.parse(e.data))
+  })
+  // EventSource reconnects on its own; CLOSED means it gave up
+  events.onerror = () => {
+    if (events.readyState === EventSource.CLOSED) {
+      reject(new Error('Lost connection to the analysis job'))
+    }
+  }
+})
 
 function AnalysisDashboard() {
   const [source, setSource] = useState('')
@@ -10,12 +32,15 @@ function AnalysisDashboard() {
   const [message, setMessage] = useState(null)
   const [error, setError] = useState(null)
   const [results, setResults] = useState(null)
+  const [jobId, setJobId] = useState(null)
+  const [recentItems, setRecentItems] = useState([])
 
   const handleAnalyze = async () => {
     setAnalyzing(true)
     setMessage(null)
     setError(null)
     setResults(null)
+    setRecentItems([])
 
     try {
       const params = { limit }
@@ -29,14 +54,35 @@ function AnalysisDashboard() {
         { params }
       )
 
+      // The batch runs as a background job; its events arrive as each conversation finishes
+      setJobId(response.data.job_id)
       setResults(response.data)
+      const job = await watchJob(
+        response.data.job_id,
+        setResults,
+        (item) => setRecentItems((items) => [item, ...items].slice(0, RECENT_ITEMS))
+      )
+      setResults(job)
+
       setMessage(
-        `Analysis complete! Analyzed ${response.data.analyzed} conversations.`
+        job.status === 'cancelled'
+          ? `Analysis cancelled after ${job.analyzed} conversations.`
+          : `Analysis complete! Analyzed ${job.analyzed} conversations.`
       )
     } catch (err) {
       setError(err.response?.data?.detail || err.message || 'Analysis failed')
     } finally {
       setAnalyzing(false)
+      setJobId(null)
+    }
+  }
+
+  const handleCancel = async () => {
+    if (!jobId) return
+    try {
+      await axios.post(`${API_BASE}/analysis/jobs/${jobId}/cancel`)
+    } catch (err) {
+      setError(err.response?.data?.detail || err.message || 'Cancel failed')
     }
   }
 
@@ -78,22 +124,51 @@ function AnalysisDashboard() {
           {analyzing ? 'Analyzing...' : 'Start Analysis'}
         </button>
 
+        {analyzing && jobId && (
+          <button
+            className="button"
+            onClick={handleCancel}
+            style={{ marginLeft: '1rem' }}
+          >
+            Cancel
+          </button>
+        )}
+
         {results && (
           <div style={{ marginTop: '2rem' }}>
             <h3>Analysis Results</h3>
             <div className="grid">
+              <div className="insight-item">
+                <strong>Progress:</strong> {Math.round((results.progress || 0) * 100)}% of {results.total}
+              </div>
               <div className="insight-item">
                 <strong>Analyzed:</strong> {results.analyzed}
               </div>
               <div className="insight-item">
                 <strong>Already Analyzed:</strong> {results.already_analyzed}
               </div>
-              {results.errors && results.errors.length > 0 && (
+              {results.failed > 0 && (
+                <div className="insight-item">
+                  <strong>Errors:</strong> {results.failed}
+                </div>
+              )}
+              {results.conversations_per_second != null && (
                 <div className="insight-item">
-                  <strong>Errors:</strong> {results.errors.length}
+                  <strong>Throughput:</strong> {results.conversations_per_second.toFixed(2)} conversations/s
                 </div>
               )}
             </div>
+            {recentItems.length > 0 && (
+              <ul style={{ marginTop: '1rem', lineHeight: '1.8' }}>
+                {recentItems.map((item) => (
+                  <li key={item.conversation_id}>
+                    Conversation {item.conversation_id}: {item.status}
+                    {item.latency_ms != null && ` in ${(item.latency_ms / 1000).toFixed(1)}s`}
+                    {item.error && ` (${item.error})`}
+                  </li>
+                ))}
+              </ul>
+            )}
           </div>
         )}
       </div>